@@ -0,0 +1 @@
+"""Local restxdb stand-in and benchmark harness (``python -m bench.run``)."""
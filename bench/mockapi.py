@@ -0,0 +1,311 @@
+"""A local stand-in for restxdb and its video CDN.
+
+Serves the shapes the service reads: ``/foryou``, ``/rank`` and ``/new``
+pages (``data.list``), ``/search``, ``/suggest`` (``data`` is a list of
+titles), ``/chapters`` and both ``/watch`` variants, over a deterministic
+synthetic catalog. Video URLs point back at ``/cdn``: progressive MP4s with
+Range support or, for a share of the dramas, HLS playlists with ``.ts``
+segments. Links carry an ``expires`` parameter and answer 403 once it has
+passed, like the real CDN. ``/bot<token>/<method>`` is just enough of the
+Telegram Bot API (``getMe``, webhooks, ``sendMessage``) for the service
+to start its bot and answer a command.
+
+Latency (with jitter), error rate and cold start are configurable, so
+benchmarks can reproduce a slow or flaky upstream without touching the
+real one::
+
+    python -m bench.mockapi --port 9000 --latency 0.08 --error-rate 0.02 --cold-start 5
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, fields
+from urllib.parse import parse_qsl
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+WORDS = ("Cinta", "Rahasia", "Pewaris", "Istri", "CEO", "Dendam", "Takdir", "Kembali", "Miliarder", "Terlarang",
+         "Pengantin", "Putri", "Naga", "Bayangan", "Musim", "Janji", "Hati", "Kaisar", "Tersembunyi", "Abadi")
+TAGS = ("Romansa", "Balas Dendam", "CEO", "Keluarga", "Fantasi", "Komedi", "Sejarah", "Misteri")
+CHUNK = 64 * 1024
+
+
+@dataclass
+class MockConfig:
+    port: int = 9000
+    dramas: int = 500
+    page_size: int = 20
+    min_episodes: int = 20
+    max_episodes: int = 80
+    episode_bytes: int = 2 * 1024 * 1024
+    segment_bytes: int = 256 * 1024
+    hls_rate: float = 0.2  # share of dramas served as HLS
+    post_only_rate: float = 0.1  # share of dramas whose GET /watch answers without a videoUrl
+    latency: float = 0.05  # mean seconds per API call, ±50% jitter
+    error_rate: float = 0.0  # share of API calls answered with HTTP 502
+    cold_start: float = 0.0  # seconds the first call after an idle period waits
+    idle_after: float = 900.0  # seconds without traffic before the next call is cold again
+    cdn_bandwidth: int = 0  # bytes/s per CDN response, 0 = unlimited
+    url_ttl: int = 1200
+    seed: int = 7
+
+
+def _png(width: int, height: int, rgb: tuple[int, int, int]) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+class MockRestxdb:
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self.calls: Counter[str] = Counter()
+        self.bot_calls: Counter[str] = Counter()
+        self.cdn_bytes = 0
+        self._last_call = 0.0
+        self._warming: asyncio.Event | None = None
+        rng = random.Random(cfg.seed)
+        self.dramas = []
+        for i in range(cfg.dramas):
+            book_id = str(41000000000 + i)
+            self.dramas.append({
+                "bookId": book_id,
+                "bookName": " ".join(rng.sample(WORDS, 3)) + f" {i}",
+                "introduction": " ".join(rng.choices(WORDS, k=24)).capitalize() + ".",
+                "chapterCount": rng.randint(cfg.min_episodes, cfg.max_episodes),
+                "tags": rng.sample(TAGS, 2),
+                "hls": rng.random() < cfg.hls_rate,
+                "postOnly": rng.random() < cfg.post_only_rate,
+            })
+        self.by_id = {d["bookId"]: d for d in self.dramas}
+        self.rank = sorted(self.dramas, key=lambda d: zlib.crc32(d["bookId"].encode()))
+        self.cover_png = _png(24, 36, (120, 60, 160))
+        # Deterministic filler; an MP4 ftyp box up front so the files sniff as video.
+        self.block = (b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+                      + bytes(range(256)) * (CHUNK // 256))[:CHUNK]
+
+    # ---- upstream behaviour
+
+    async def _behave(self, request: Request) -> Response | None:
+        """Apply cold start, latency and injected errors; a response means "answer with this"."""
+        cfg = self.cfg
+        self.calls[f"{request.method} /{request.url.path.split('/')[2]}"] += 1
+        now = time.monotonic()
+        if cfg.cold_start > 0 and (self._last_call == 0.0 or now - self._last_call > cfg.idle_after):
+            if self._warming is None:
+                self._warming = asyncio.Event()
+                await asyncio.sleep(cfg.cold_start)
+                self._warming.set()
+                self._warming = None
+            else:
+                await self._warming.wait()
+        self._last_call = time.monotonic()
+        if cfg.latency > 0:
+            await asyncio.sleep(cfg.latency * random.uniform(0.5, 1.5))
+        if cfg.error_rate > 0 and random.random() < cfg.error_rate:
+            return JSONResponse({"success": False, "message": "injected error"}, status_code=502)
+        return None
+
+    def _record(self, request: Request, d: dict, chapters: bool = False) -> dict:
+        record = {k: v for k, v in d.items() if k not in ("hls", "postOnly")}
+        record["cover"] = f"{str(request.base_url).rstrip('/')}/cdn/cover/{d['bookId']}.png"
+        if chapters:
+            record["chapterList"] = [{"chapterIndex": i, "chapterId": f"{d['bookId']}{i:04d}",
+                                      "duration": 90 + i % 30} for i in range(d["chapterCount"])]
+        return record
+
+    def _page(self, request: Request, items: list[dict], page: int, size: int) -> Response:
+        chunk = items[(page - 1) * size:page * size]
+        return JSONResponse({"success": True, "data": {"list": [self._record(request, d) for d in chunk],
+                                                       "isMore": page * size < len(items)}})
+
+    # ---- restxdb endpoints
+
+    async def listing(self, request: Request) -> Response:
+        if (failure := await self._behave(request)) is not None:
+            return failure
+        lists = {"foryou": self.dramas, "rank": self.rank, "new": self.dramas[::-1]}
+        items = lists.get(request.path_params["name"])
+        if items is None:
+            return JSONResponse({"success": False, "message": "not found"}, status_code=404)
+        size = int(request.query_params.get("pageSize") or self.cfg.page_size)
+        return self._page(request, items, request.path_params["page"], size)
+
+    async def search(self, request: Request) -> Response:
+        if (failure := await self._behave(request)) is not None:
+            return failure
+        query = request.path_params["query"].casefold()
+        found = [d for d in self.dramas if query in d["bookName"].casefold()]
+        return self._page(request, found, request.path_params["page"], self.cfg.page_size)
+
+    async def suggest(self, request: Request) -> Response:
+        if (failure := await self._behave(request)) is not None:
+            return failure
+        query = request.path_params["query"].casefold()
+        titles = [d["bookName"] for d in self.dramas if query in d["bookName"].casefold()][:10]
+        return JSONResponse({"success": True, "data": titles})
+
+    async def chapters(self, request: Request) -> Response:
+        if (failure := await self._behave(request)) is not None:
+            return failure
+        d = self.by_id.get(request.path_params["book_id"])
+        if d is None:
+            return JSONResponse({"success": False, "data": None}, status_code=404)
+        return JSONResponse({"success": True, "data": self._record(request, d, chapters=True)})
+
+    async def watch_get(self, request: Request) -> Response:
+        if (failure := await self._behave(request)) is not None:
+            return failure
+        d = self.by_id.get(request.path_params["book_id"])
+        if d is None or d["postOnly"]:
+            return JSONResponse({"success": False, "data": None})
+        return self._watch(request, d, request.path_params["chapter_index"])
+
+    async def watch_post(self, request: Request) -> Response:
+        if (failure := await self._behave(request)) is not None:
+            return failure
+        try:
+            payload = await request.json()
+            d, idx = self.by_id.get(str(payload["bookId"])), int(payload["chapterIndex"])
+        except (ValueError, KeyError, TypeError):
+            return JSONResponse({"success": False, "message": "bad request"}, status_code=400)
+        if d is None:
+            return JSONResponse({"success": False, "data": None})
+        return self._watch(request, d, idx)
+
+    def _watch(self, request: Request, d: dict, idx: int) -> Response:
+        if not 0 <= idx < d["chapterCount"]:
+            return JSONResponse({"success": False, "data": None})
+        base, expires = str(request.base_url).rstrip("/"), int(time.time()) + self.cfg.url_ttl
+        name = "index.m3u8" if d["hls"] else "video.mp4"
+        return JSONResponse({"success": True, "data": {
+            "videoUrl": f"{base}/cdn/{d['bookId']}/{idx}/{name}?expires={expires}"}})
+
+    # ---- CDN
+
+    def _expired(self, request: Request) -> bool:
+        expires = request.query_params.get("expires", "")
+        return expires.isdigit() and int(expires) < time.time()
+
+    async def cover(self, request: Request) -> Response:
+        return Response(self.cover_png, media_type="image/png")
+
+    async def video(self, request: Request) -> Response:
+        if self._expired(request):
+            return Response(status_code=403)
+        size = self.cfg.episode_bytes
+        start, end, status, headers = 0, size - 1, 200, {"Accept-Ranges": "bytes"}
+        spec = request.headers.get("range", "").removeprefix("bytes=")
+        if spec:
+            first, _, last = spec.partition("-")
+            start = int(first) if first else max(0, size - int(last))
+            end = min(int(last), size - 1) if first and last else size - 1
+            if start >= size:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+            status, headers["Content-Range"] = 206, f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(self._bytes(start, end + 1), status_code=status, media_type="video/mp4",
+                                 headers=headers)
+
+    async def playlist(self, request: Request) -> Response:
+        if self._expired(request):
+            return Response(status_code=403)
+        query = f"?{request.url.query}" if request.url.query else ""
+        count = -(-self.cfg.episode_bytes // self.cfg.segment_bytes)
+        seconds = 90 / count
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(seconds) + 1}"]
+        for n in range(count):
+            lines += [f"#EXTINF:{seconds:.3f},", f"seg{n}.ts{query}"]
+        lines.append("#EXT-X-ENDLIST")
+        return Response("\n".join(lines) + "\n", media_type="application/vnd.apple.mpegurl")
+
+    async def segment(self, request: Request) -> Response:
+        if self._expired(request):
+            return Response(status_code=403)
+        start = request.path_params["n"] * self.cfg.segment_bytes
+        end = min(start + self.cfg.segment_bytes, self.cfg.episode_bytes)
+        if start >= end:
+            return Response(status_code=404)
+        return StreamingResponse(self._bytes(start, end), media_type="video/mp2t",
+                                 headers={"Content-Length": str(end - start)})
+
+    async def _bytes(self, start: int, stop: int):
+        position = start
+        while position < stop:
+            offset = position % CHUNK
+            piece = self.block[offset:offset + min(CHUNK - offset, stop - position)]
+            position += len(piece)
+            self.cdn_bytes += len(piece)
+            yield piece
+            if self.cfg.cdn_bandwidth > 0:
+                await asyncio.sleep(len(piece) / self.cfg.cdn_bandwidth)
+
+    # ---- Telegram Bot API
+
+    async def bot_api(self, request: Request) -> Response:
+        method = request.path_params["method"]
+        self.bot_calls[method] += 1
+        form = dict(parse_qsl((await request.body()).decode()))  # python-telegram-bot posts urlencoded forms
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "sendMessage":
+            chat_id = int(form.get("chat_id", 0))
+            result = {"message_id": self.bot_calls[method], "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": form.get("text", "")}
+        elif method in ("setWebhook", "deleteWebhook", "setMyCommands"):
+            result = True
+        else:
+            return JSONResponse({"ok": False, "error_code": 400, "description": f"{method} not mocked"}, 400)
+        return JSONResponse({"ok": True, "result": result})
+
+    async def stats(self, request: Request) -> Response:
+        return JSONResponse({"calls": dict(self.calls), "api_calls": sum(self.calls.values()),
+                             "cdn_bytes": self.cdn_bytes, "bot_calls": dict(self.bot_calls)})
+
+
+def create_app(cfg: MockConfig | None = None) -> Starlette:
+    mock = MockRestxdb(cfg or MockConfig())
+    app = Starlette(routes=[
+        Route("/api/search/{query}/{page:int}", mock.search),
+        Route("/api/suggest/{query}", mock.suggest),
+        Route("/api/chapters/{book_id}", mock.chapters),
+        Route("/api/watch/player", mock.watch_post, methods=["POST"]),
+        Route("/api/watch/{book_id}/{chapter_index:int}", mock.watch_get),
+        Route("/api/{name}/{page:int}", mock.listing),
+        Route("/cdn/cover/{book_id}.png", mock.cover),
+        Route("/cdn/{book_id}/{chapter_index:int}/video.mp4", mock.video),
+        Route("/cdn/{book_id}/{chapter_index:int}/index.m3u8", mock.playlist),
+        Route("/cdn/{book_id}/{chapter_index:int}/seg{n:int}.ts", mock.segment),
+        Route("/bot{token}/{method}", mock.bot_api, methods=["POST"]),
+        Route("/_mock/stats", mock.stats),
+    ])
+    app.state.mock = mock
+    return app
+
+
+def parse_args(argv: list[str] | None = None) -> MockConfig:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    for f in fields(MockConfig):
+        parser.add_argument("--" + f.name.replace("_", "-"), type=type(f.default), default=f.default)
+    return MockConfig(**vars(parser.parse_args(argv)))
+
+
+def main() -> None:
+    cfg = parse_args()
+    uvicorn.run(create_app(cfg), host="127.0.0.1", port=cfg.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""Benchmark harness: the service against the local restxdb stand-in.
+
+Starts ``bench.mockapi`` and the service (``bot.py``) as subprocesses on
+free ports, drives them over HTTP and appends one JSON line per run to
+``--results``. Each run is compared with the last one recorded under the
+same workload parameters; a metric that got worse by more than
+``--threshold`` is reported as a regression (exit status 1 with
+``--fail-on-regression``).
+
+Every run also records the service's cold start: seconds until it first
+answers HTTP, until its lifespan is done (``ready``) and until the first
+Telegram update, posted to its webhook as soon as it is up, is answered.
+
+Scenarios:
+
+* ``pages``: the first (cold) home page, then p50/p95/p99 latency of a mix
+  of home, drama page, ``/api/chapters``, search and suggest requests at
+  ``--concurrency``, requests/s and restxdb calls per request;
+* ``download``: ``--zips`` concurrent ``/download/{id}.zip`` streams,
+  episodes/s, MB/s and the service's peak RSS while they run;
+* ``telegram``: the send scheduler against a simulated Bot API, sends/s
+  and how long interactive replies wait behind a bulk backlog.
+
+Example::
+
+    python -m bench.run --scenarios pages,download --latency 0.08
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+MB = 1024 * 1024
+SCENARIOS = ("pages", "download", "telegram")
+# Arguments that describe the run rather than the workload; runs are compared across them.
+NOT_WORKLOAD = ("scenarios", "results", "threshold", "fail_on_regression", "keep_data")
+SEARCH_WORDS = ("cinta", "ceo", "rahasia", "naga", "istri", "kaisar")
+BOT_TOKEN = "123456:bench"
+ADMIN_HEADERS = {"Authorization": "Bearer bench"}  # /stats is behind ADMIN_TOKEN
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+def rss_bytes(pid: int) -> int | None:
+    """Resident set size of ``pid`` (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 for informational values."""
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith(("_ms", "_mb", "_per_request", "errors")):
+        return -1
+    return 0
+
+
+@contextlib.contextmanager
+def process(args: list[str], env: dict[str, str], ready_url: str, log_path: Path,
+            timeout: float = 60.0, headers: dict[str, str] | None = None) -> Iterator[tuple[subprocess.Popen, float]]:
+    """Run ``args`` until the block exits; yields the process and its seconds to first answer."""
+    started = time.perf_counter()
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(args, env=env, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{args[-1]} exited with {proc.returncode}; see {log_path}")
+            try:
+                if httpx.get(ready_url, headers=headers, timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"{args[-1]} did not come up within {timeout}s; see {log_path}")
+            time.sleep(0.05)
+        yield proc, time.perf_counter() - started
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def first_update(service_url: str, mock_url: str, timeout: float = 60.0) -> float:
+    """Post ``/start`` to the webhook; seconds until the bot's reply reaches the mock Bot API."""
+    from dracin.tgbot import webhook_secret
+
+    started = time.perf_counter()
+    update = {"update_id": 1, "message": {"message_id": 1, "date": int(time.time()), "text": "/start",
+                                          "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+                                          "chat": {"id": 1000, "type": "private"},
+                                          "from": {"id": 1000, "is_bot": False, "first_name": "Bench"}}}
+    resp = httpx.post(f"{service_url}/telegram/webhook", json=update,
+                      headers={"X-Telegram-Bot-Api-Secret-Token": webhook_secret(BOT_TOKEN)})
+    resp.raise_for_status()
+    while httpx.get(f"{mock_url}/_mock/stats").json()["bot_calls"].get("sendMessage", 0) < 1:
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"no reply to the webhook update within {timeout}s")
+        time.sleep(0.01)
+    return time.perf_counter() - started
+
+
+# ---- scenarios
+
+async def bench_pages(client: httpx.AsyncClient, mock: httpx.AsyncClient, args) -> dict[str, float]:
+    out: dict[str, float] = {}
+    started = time.perf_counter()
+    await client.get("/")
+    out["pages.cold_home_ms"] = (time.perf_counter() - started) * 1000
+    ids = [d["bookId"] for d in (await mock.get("/api/rank/1")).json()["data"]["list"]]
+    ids += [d["bookId"] for d in (await mock.get("/api/rank/2")).json()["data"]["list"]]
+    rng = random.Random(args.seed)
+    popularity = [1 / (rank + 1) for rank in range(len(ids))]  # a few hot dramas, a long tail
+    kinds = {"home": 3, "drama": 3, "chapters": 2, "search": 1, "suggest": 1}
+    plan = []
+    for kind in rng.choices(list(kinds), weights=list(kinds.values()), k=args.requests):
+        book_id, word = rng.choices(ids, weights=popularity)[0], rng.choice(SEARCH_WORDS)
+        plan.append((kind, {"home": "/", "drama": f"/drama/{book_id}",
+                            "chapters": f"/api/chapters/{book_id}?lang=in",
+                            "search": f"/api/search/{word}/1?lang=in",
+                            "suggest": f"/api/suggest/{word}?lang=in"}[kind]))
+    latencies: dict[str, list[float]] = {kind: [] for kind in kinds}
+    errors = 0
+    calls_before = (await mock.get("/_mock/stats")).json()["api_calls"]
+    queue = iter(plan)
+
+    async def worker() -> None:
+        nonlocal errors
+        for kind, path in queue:
+            t0 = time.perf_counter()
+            try:
+                response = await client.get(path)
+                errors += response.status_code >= 400
+            except httpx.HTTPError:
+                errors += 1
+            latencies[kind].append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    calls = (await mock.get("/_mock/stats")).json()["api_calls"] - calls_before
+    everything = [v for values in latencies.values() for v in values]
+    for kind, values in [("all", everything), *latencies.items()]:
+        for p in (50, 95, 99):
+            out[f"pages.{kind}_p{p}_ms"] = percentile(values, p)
+    out["pages.requests_per_s"] = len(plan) / elapsed
+    out["pages.upstream_calls_per_request"] = calls / len(plan)
+    out["pages.errors"] = errors
+    return out
+
+
+async def bench_download(client: httpx.AsyncClient, mock: httpx.AsyncClient, pid: int, args) -> dict[str, float]:
+    ids = [d["bookId"] for d in (await mock.get("/api/new/1")).json()["data"]["list"]][:args.zips]
+    baseline = rss_bytes(pid)
+    peak = baseline or 0
+    received = 0
+    done = asyncio.Event()
+
+    async def sample() -> None:
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, rss_bytes(pid) or 0)
+            await asyncio.sleep(0.02)
+
+    async def one(book_id: str) -> None:
+        nonlocal received
+        async with client.stream("GET", f"/download/{book_id}.zip") as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                received += len(chunk)
+
+    sampler = asyncio.create_task(sample())
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(book_id) for book_id in ids))
+    finally:
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+    episodes = len(ids) * args.episodes
+    out = {"download.episodes_per_s": episodes / elapsed, "download.throughput_mb_per_s": received / MB / elapsed,
+           "download.incomplete_errors": float(received < episodes * args.episode_mb * MB)}
+    if baseline is not None:
+        out["download.peak_rss_mb"] = peak / MB
+        out["download.rss_growth_mb"] = (peak - baseline) / MB
+    return out
+
+
+async def bench_telegram(args) -> dict[str, float]:
+    from telegram.error import RetryAfter
+
+    from dracin.sendqueue import BULK, INTERACTIVE, SendScheduler
+
+    scheduler = SendScheduler()
+    await scheduler.initialize()
+    rng = random.Random(args.seed)
+
+    async def bot_api() -> None:
+        await asyncio.sleep(args.tg_latency * rng.uniform(0.5, 1.5))
+        if rng.random() < args.tg_flood_rate:
+            raise RetryAfter(1)
+
+    async def send(chat_id: int, lane: int) -> float:
+        t0 = time.perf_counter()
+        await scheduler.process_request(bot_api, (), {}, "sendVideo", {"chat_id": chat_id}, {"lane": lane})
+        return (time.perf_counter() - t0) * 1000
+
+    bulk = [send(chat, BULK) for chat in range(1, args.tg_chats + 1) for _ in range(args.tg_messages)]
+    started = time.perf_counter()
+    bulk_task = asyncio.gather(*bulk)
+    interactive = []
+    chat = 100000
+    while not bulk_task.done():
+        chat += 1
+        interactive.append(asyncio.create_task(send(chat, INTERACTIVE)))
+        await asyncio.sleep(0.2)
+    await bulk_task
+    waits = await asyncio.gather(*interactive)
+    elapsed = time.perf_counter() - started
+    await scheduler.shutdown()
+    return {"telegram.sends_per_s": (len(bulk) + len(waits)) / elapsed,
+            "telegram.interactive_p50_ms": percentile(waits, 50),
+            "telegram.interactive_p95_ms": percentile(waits, 95),
+            "telegram.throttled": scheduler.throttled}
+
+
+# ---- results
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(path: Path, profile: dict) -> dict | None:
+    if not path.exists():
+        return None
+    last = None
+    for line in path.read_text().splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("profile") == profile:
+            last = record
+    return last
+
+
+def compare(metrics: dict[str, float], previous: dict | None, threshold: float) -> list[str]:
+    """Print the run next to the previous one; returns the regressed metric names."""
+    before = (previous or {}).get("metrics", {})
+    regressions = []
+    print(f"{'metric':44} {'value':>12} {'previous':>12} {'change':>8}")
+    for name, value in metrics.items():
+        old = before.get(name)
+        change, flag = "", ""
+        if old:
+            delta = (value - old) / old
+            change = f"{delta:+.1%}"
+            if direction(name) and -direction(name) * delta > threshold:
+                flag = "  REGRESSION"
+                regressions.append(name)
+        previous_text = f"{old:12.2f}" if old is not None else f"{'-':>12}"
+        print(f"{name:44} {value:12.2f} {previous_text} {change:>8}{flag}")
+    return regressions
+
+
+async def run(args, service_url: str, mock_url: str, pid: int) -> dict[str, float]:
+    metrics: dict[str, float] = {}
+    limits = httpx.Limits(max_connections=args.concurrency + args.zips + 4)
+    async with httpx.AsyncClient(base_url=service_url, timeout=120, limits=limits) as client, \
+            httpx.AsyncClient(base_url=mock_url, timeout=30) as mock:
+        if "pages" in args.scenarios:
+            metrics.update(await bench_pages(client, mock, args))
+        if "download" in args.scenarios:
+            metrics.update(await bench_download(client, mock, pid, args))
+    if "telegram" in args.scenarios:
+        metrics.update(await bench_telegram(args))
+    return metrics
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--results", type=Path, default=ROOT / "bench" / "results.jsonl")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--keep-data", action="store_true", help="keep the service's DATA_DIR and logs")
+    workload = parser.add_argument_group("workload (runs are only compared when these match)")
+    workload.add_argument("--requests", type=int, default=400)
+    workload.add_argument("--concurrency", type=int, default=16)
+    workload.add_argument("--zips", type=int, default=2)
+    workload.add_argument("--episodes", type=int, default=12, help="episodes per drama")
+    workload.add_argument("--episode-mb", type=float, default=2.0)
+    workload.add_argument("--latency", type=float, default=0.05, help="mean restxdb latency (s)")
+    workload.add_argument("--error-rate", type=float, default=0.0)
+    workload.add_argument("--cold-start", type=float, default=0.0)
+    workload.add_argument("--hls-rate", type=float, default=0.2)
+    workload.add_argument("--cdn-bandwidth", type=int, default=0, help="bytes/s per CDN response, 0 = unlimited")
+    workload.add_argument("--tg-chats", type=int, default=40)
+    workload.add_argument("--tg-messages", type=int, default=3, help="bulk messages per chat")
+    workload.add_argument("--tg-latency", type=float, default=0.05, help="simulated Bot API latency (s)")
+    workload.add_argument("--tg-flood-rate", type=float, default=0.0, help="share of calls answered with 429")
+    workload.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    workdir = Path(tempfile.mkdtemp(prefix="dracin-bench-"))
+    mock_port, service_port = free_port(), free_port()
+    mock_url, service_url = f"http://127.0.0.1:{mock_port}", f"http://127.0.0.1:{service_port}"
+    mock_args = [sys.executable, "-m", "bench.mockapi", "--port", str(mock_port), "--latency", str(args.latency),
+                 "--error-rate", str(args.error_rate), "--cold-start", str(args.cold_start),
+                 "--min-episodes", str(args.episodes), "--max-episodes", str(args.episodes),
+                 "--episode-bytes", str(int(args.episode_mb * MB)), "--hls-rate", str(args.hls_rate),
+                 "--cdn-bandwidth", str(args.cdn_bandwidth), "--seed", str(args.seed)]
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    service_env = {**env, "PORT": str(service_port), "RESTXDB_API": f"{mock_url}/api", "DATA_DIR": str(workdir),
+                   "BOT_TOKEN": BOT_TOKEN, "TELEGRAM_API_URL": f"{mock_url}/bot", "WEBHOOK_URL": service_url,
+                   "WARM_INTERVAL": "0", "ADMIN_TOKEN": "bench"}
+    try:
+        with process(mock_args, env, f"{mock_url}/_mock/stats", workdir / "mock.log"), \
+                process([sys.executable, "bot.py"], service_env, f"{service_url}/stats",
+                        workdir / "service.log", headers=ADMIN_HEADERS) as (service, startup):
+            metrics = {"service.startup_ms": startup * 1000,
+                       "service.first_update_ms": (startup + first_update(service_url, mock_url)) * 1000}
+            phases = httpx.get(f"{service_url}/stats", headers=ADMIN_HEADERS).json()["startup"]
+            metrics["service.ready_ms"] = (phases["ready"] + phases.get("interpreter", 0.0)) * 1000
+            metrics.update(asyncio.run(run(args, service_url, mock_url, service.pid)))
+    finally:
+        if not args.keep_data:
+            subprocess.run(["rm", "-rf", str(workdir)], check=False)
+        else:
+            print(f"data and logs kept in {workdir}")
+    profile = {k: v for k, v in sorted(vars(args).items()) if k not in NOT_WORKLOAD}
+    previous = previous_run(args.results, profile)
+    regressions = compare(metrics, previous, args.threshold)
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, "a") as f:
+        f.write(json.dumps({"timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                            "commit": git_commit(), "scenarios": args.scenarios, "profile": profile,
+                            "metrics": {k: round(v, 3) for k, v in metrics.items()}}) + "\n")
+    if regressions:
+        print(f"{len(regressions)} regression(s) against {previous['commit']} ({previous['timestamp']})")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
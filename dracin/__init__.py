@@ -0,0 +1 @@
+"""DramaBox web UI, restxdb gateway and Telegram bot."""
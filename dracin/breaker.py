@@ -0,0 +1,210 @@
+"""Circuit breakers and adaptive concurrency for restxdb, per endpoint class.
+
+restxdb requests fall into three classes with very different costs and
+failure modes: ``catalog`` (foryou/rank/new/chapters/...), ``search``
+(search/suggest) and ``watch`` (video URL resolution). Each class gets:
+
+* a ``CircuitBreaker`` that opens after a run of failures or a high error
+  rate in its recent window, fails calls fast (``CircuitOpen``) while open,
+  and lets one probe through after a cool-down that doubles on each
+  re-trip; and
+* an ``AdaptiveConcurrency`` limit that grows by roughly one per limit's
+  worth of fast successes and shrinks multiplicatively on errors or when
+  latency rises well above its baseline (AIMD).
+
+A failure is a transport error or a 5xx; 4xx answers are the caller's
+problem and count as successes. While a breaker is open the gateway serves
+cached copies, even expired ones, instead of waiting on timeouts.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+import httpx
+
+from . import config
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+ENDPOINT_CLASSES = ("catalog", "search", "watch")
+SEARCH_PREFIXES = ("search", "suggest")
+WATCH_PREFIXES = ("watch",)
+
+
+def endpoint_class(path: str) -> str:
+    first = path.strip("/").split("/", 1)[0]
+    if first in WATCH_PREFIXES:
+        return "watch"
+    if first in SEARCH_PREFIXES:
+        return "search"
+    return "catalog"
+
+
+class CircuitOpen(httpx.RequestError):
+    """Raised instead of calling restxdb while the endpoint class's breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, consecutive: int = config.BREAKER_CONSECUTIVE_FAILURES,
+                 window: int = config.BREAKER_WINDOW, error_rate: float = config.BREAKER_ERROR_RATE,
+                 cooldown: float = config.BREAKER_COOLDOWN, max_cooldown: float = config.BREAKER_MAX_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.consecutive = consecutive
+        self.error_rate = error_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.trips = self.rejected = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._failures_in_row = 0
+        self._cooldown = cooldown
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> None:
+        """Raise ``CircuitOpen`` unless a call may go through now."""
+        if self.state == OPEN and self.clock() - self._opened_at >= self._cooldown:
+            self.state, self._probing = HALF_OPEN, False
+        if self.state == CLOSED:
+            return
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True  # exactly one probe at a time
+            return
+        self.rejected += 1
+        raise CircuitOpen(f"{self.name} circuit open")
+
+    def abandon(self) -> None:
+        """A permitted call was cancelled before it produced an outcome."""
+        self._probing = False
+
+    def record(self, ok: bool) -> None:
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self.state, self._cooldown = CLOSED, self.base_cooldown
+                self._outcomes.clear()
+                self._failures_in_row = 0
+            else:
+                self._trip(min(self.max_cooldown, self._cooldown * 2))
+            return
+        self._outcomes.append(ok)
+        self._failures_in_row = 0 if ok else self._failures_in_row + 1
+        if self.state == CLOSED and (self._failures_in_row >= self.consecutive or self._rate_exceeded()):
+            self._trip(self._cooldown)
+
+    def _rate_exceeded(self) -> bool:
+        samples = len(self._outcomes)
+        if samples < self._outcomes.maxlen // 2:
+            return False
+        return self._outcomes.count(False) / samples >= self.error_rate
+
+    def _trip(self, cooldown: float) -> None:
+        self.state, self._cooldown, self._opened_at = OPEN, cooldown, self.clock()
+        self.trips += 1
+        self._outcomes.clear()
+        self._failures_in_row = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "trips": self.trips, "rejected": self.rejected,
+                "cooldown": self._cooldown if self.state != CLOSED else 0.0}
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit adjusted by AIMD on errors and latency versus a slow-moving baseline."""
+
+    def __init__(self, initial: int = config.UPSTREAM_INITIAL_CONCURRENCY, min_limit: int = 1,
+                 max_limit: int = config.HTTP_MAX_PER_HOST, tolerance: float = config.UPSTREAM_LATENCY_TOLERANCE,
+                 decrease: float = 0.7):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.baseline: float | None = None  # EWMA of latency on healthy calls
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._wake()  # pass the wake-up we were given on to the next waiter
+                else:
+                    self._waiters.remove(fut)
+                raise
+        self.in_flight += 1
+
+    def release(self, ok: bool | None, latency: float = 0.0) -> None:
+        """Free a slot; ``ok=None`` (a cancelled call) leaves the limit alone."""
+        if ok is not None:
+            self._adjust(ok, latency)
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    def _adjust(self, ok: bool, latency: float) -> None:
+        slow = self.baseline is not None and latency > self.baseline * self.tolerance
+        if ok and not slow:
+            self.baseline = latency if self.baseline is None else 0.9 * self.baseline + 0.1 * latency
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+
+    def snapshot(self) -> dict:
+        return {"limit": round(self.limit, 2), "in_flight": self.in_flight,
+                "baseline_ms": round(self.baseline * 1000, 1) if self.baseline is not None else None}
+
+
+class EndpointGuard:
+    """Breaker + limiter for one endpoint class, wrapped around each upstream call."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.limiter = AdaptiveConcurrency()
+
+    async def call(self, fn: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        self.breaker.allow()
+        try:
+            await self.limiter.acquire()
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        started = time.monotonic()
+        try:
+            response = await fn()
+        except httpx.HTTPError:
+            self.breaker.record(False)
+            self.limiter.release(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            # Cancelled, or a bug rather than an upstream failure: free the slot without judging the endpoint.
+            self.breaker.abandon()
+            self.limiter.release(None)
+            raise
+        ok = response.status_code < 500
+        self.breaker.record(ok)
+        self.limiter.release(ok, time.monotonic() - started)
+        return response
+
+    def snapshot(self) -> dict:
+        return {"breaker": self.breaker.snapshot(), "concurrency": self.limiter.snapshot()}
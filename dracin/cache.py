@@ -0,0 +1,262 @@
+"""In-memory TTL + LRU cache with stale-while-revalidate for catalog responses.
+
+Entries are bounded by total byte size, not count: a ``/chapters`` payload
+for an 80-episode drama is far bigger than a ``/rank`` page. Upstream
+responses are also written through to the ``SharedState`` backend, which
+other instances read on a local miss, and saved to a snapshot file that a
+restarted process reads entries back from on demand.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlencode
+
+from . import config
+from .shared import SharedResponse, SharedState
+from .snapshot import Snapshot, write_snapshot
+
+log = logging.getLogger(__name__)
+
+# First path segment -> (fresh seconds, extra seconds a stale copy may still be served).
+CATALOG_TTLS: dict[str, tuple[float, float]] = {
+    "foryou": (300, 3600),
+    "rank": (600, 3600),
+    "new": (180, 1800),
+    "chapters": (900, 6 * 3600),
+}
+
+# Rough per-entry bookkeeping cost on top of the payload itself.
+ENTRY_OVERHEAD = 200
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    status: int
+    content: bytes
+    content_type: str = "application/json"
+
+
+@dataclass(slots=True)
+class Entry:
+    value: Any
+    size: int
+    fresh_until: float
+    stale_until: float
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    refreshes: int = 0
+    refresh_errors: int = 0
+    last_known_hits: int = 0
+    shared_hits: int = 0
+    snapshot_hits: int = 0
+
+
+def cache_key(path: str, params: Any = ()) -> str:
+    """Normalize ``path`` + query so parameter order does not split entries."""
+    items = params.items() if hasattr(params, "items") else params
+    query = urlencode(sorted((str(k), str(v)) for k, v in items))
+    return f"/{path.strip('/')}?{query}" if query else f"/{path.strip('/')}"
+
+
+def ttl_for(path: str) -> tuple[float, float] | None:
+    return CATALOG_TTLS.get(path.strip("/").split("/", 1)[0])
+
+
+class TTLCache:
+    """Byte-bounded LRU whose entries go fresh -> stale -> expired."""
+
+    def __init__(self, max_bytes: int = config.CACHE_MAX_BYTES, clock: Callable[[], float] = time.monotonic,
+                 shared: SharedState | None = None, snapshot_path: str | None = None):
+        self.max_bytes = max_bytes
+        self.shared = shared if shared is not None else SharedState()
+        self._snapshot = Snapshot(snapshot_path) if snapshot_path else None
+        self.stats = CacheStats()
+        self._clock = clock
+        self._data: OrderedDict[str, Entry] = OrderedDict()
+        self._bytes = 0
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def lookup(self, key: str) -> tuple[Entry | None, bool]:
+        """Return ``(entry, is_fresh)``; expired entries read as missing.
+
+        Expired entries stay until LRU eviction so ``last_known`` can still
+        serve them while upstream is down. Only this process's entries and
+        the snapshot are consulted; ``alookup`` also asks the shared backend.
+        """
+        return self._check(key, self._data.get(key) or self._from_snapshot(key))
+
+    async def alookup(self, key: str) -> tuple[Entry | None, bool]:
+        """``lookup`` that asks the shared backend before the snapshot on a local miss."""
+        return self._check(key, self._data.get(key) or await self._from_shared(key) or self._from_snapshot(key))
+
+    def _check(self, key: str, entry: Entry | None) -> tuple[Entry | None, bool]:
+        if entry is None:
+            return None, False
+        now = self._clock()
+        if now >= entry.stale_until:
+            return None, False
+        self._data.move_to_end(key)
+        return entry, now < entry.fresh_until
+
+    def get(self, key: str) -> Any:
+        entry, _ = self.lookup(key)
+        return entry.value if entry else None
+
+    async def last_known(self, key: str) -> Any:
+        """The value for ``key`` however old it is, or ``None``; for when upstream cannot answer."""
+        entry = self._data.get(key) or await self._from_shared(key) or self._from_snapshot(key)
+        if entry is None:
+            return None
+        self.stats.last_known_hits += 1
+        return entry.value
+
+    def set(self, key: str, value: Any, size: int, ttl: float, stale_ttl: float = 0.0) -> None:
+        current = self._data.get(key)
+        if current is not None and current.value is value:
+            return  # adopted from the shared backend with its own expiries
+        now = self._clock()
+        self._put(key, value, size, now + ttl, now + ttl + stale_ttl)
+        if isinstance(value, CachedResponse):
+            wall = time.time()
+            self.shared.put_response(key, value.status, value.content, value.content_type,
+                                     wall + ttl, wall + ttl + stale_ttl)
+
+    async def shared_fresh(self, key: str) -> CachedResponse | None:
+        """A fresh response another instance stored for ``key``, adopted locally; else ``None``."""
+        row = await self.shared.get_response(key)
+        if row is None or row[3] <= time.time():
+            return None
+        self.stats.shared_hits += 1
+        entry = self._adopt(key, row)
+        return entry.value if entry else CachedResponse(row[0], row[1], row[2])
+
+    async def _from_shared(self, key: str) -> Entry | None:
+        """``key`` from the shared backend, adopted locally."""
+        row = await self.shared.get_response(key)
+        if row is None:
+            return None
+        self.stats.shared_hits += 1
+        return self._adopt(key, row)
+
+    def _from_snapshot(self, key: str) -> Entry | None:
+        """``key`` from the snapshot, adopted locally."""
+        found = self._snapshot.get(key) if self._snapshot is not None else None
+        if found is None:
+            return None
+        content, (status, content_type, fresh_until, stale_until) = found
+        self.stats.snapshot_hits += 1
+        return self._adopt(key, (status, content, content_type, fresh_until, stale_until))
+
+    def _adopt(self, key: str, row: SharedResponse) -> Entry | None:
+        status, content, content_type, fresh_until, stale_until = row
+        offset = self._clock() - time.time()  # wall-clock expiries -> this cache's clock
+        self._put(key, CachedResponse(status, content, content_type), len(content),
+                  fresh_until + offset, stale_until + offset)
+        return self._data.get(key)
+
+    def _put(self, key: str, value: Any, size: int, fresh_until: float, stale_until: float) -> None:
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = Entry(value, size, fresh_until, stale_until)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def delete(self, key: str) -> None:
+        if key in self._data:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._data.pop(key).size
+
+    async def fetch(self, key: str, loader: Callable[[], Awaitable[tuple[Any, int]]],
+                    ttl: float, stale_ttl: float = 0.0) -> Any:
+        """Serve ``key`` from cache, refreshing stale entries in the background.
+
+        ``loader`` returns ``(value, size)``; it is only awaited inline on a miss.
+        """
+        entry, fresh = await self.alookup(key)
+        if entry is not None:
+            if fresh:
+                self.stats.hits += 1
+            else:
+                self.stats.stale_hits += 1
+                self._revalidate(key, loader, ttl, stale_ttl)
+            return entry.value
+        self.stats.misses += 1
+        value, size = await loader()
+        self.set(key, value, size, ttl, stale_ttl)
+        return value
+
+    def _revalidate(self, key: str, loader, ttl: float, stale_ttl: float) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                value, size = await loader()
+                self.set(key, value, size, ttl, stale_ttl)
+                self.stats.refreshes += 1
+            except Exception as e:
+                self.stats.refresh_errors += 1
+                log.info("background refresh of %s failed: %r", key, e)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def save_snapshot(self) -> int:
+        """Write the upstream responses held here to the snapshot file; returns how many.
+
+        Entries of the previous snapshot this process never read are carried
+        over until ``SNAPSHOT_KEEP_EXPIRED`` past their stale window.
+        """
+        if self._snapshot is None:
+            return 0
+        wall = time.time()
+        offset = wall - self._clock()
+        records: dict[str, tuple[bytes, list]] = {
+            key: (data, meta) for key, data, meta in self._snapshot.items()
+            if key not in self._data and meta[3] > wall - config.SNAPSHOT_KEEP_EXPIRED}
+        for key, entry in self._data.items():
+            if isinstance(entry.value, CachedResponse):
+                value = entry.value
+                records[key] = (value.content, [value.status, value.content_type,
+                                                entry.fresh_until + offset, entry.stale_until + offset])
+        path = self._snapshot.path
+        count = await asyncio.to_thread(write_snapshot, path, [(k, data, meta) for k, (data, meta) in records.items()])
+        previous, self._snapshot = self._snapshot, Snapshot(path)
+        previous.close()
+        return count
+
+    def snapshot(self) -> dict[str, Any]:
+        looked_up = self.stats.hits + self.stats.stale_hits + self.stats.misses
+        return {
+            **asdict(self.stats),
+            "hit_ratio": round((self.stats.hits + self.stats.stale_hits) / looked_up, 4) if looked_up else 0.0,
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
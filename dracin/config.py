@@ -0,0 +1,144 @@
+"""Runtime configuration, read once from the environment (see render.yaml)."""
+
+import os
+
+
+def _int(name: str, default: int) -> int:
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else default
+
+
+def _float(name: str, default: float) -> float:
+    value = os.environ.get(name, "").strip()
+    return float(value) if value else default
+
+
+# Service
+PORT = _int("PORT", 10000)
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
+ADMIN_IDS = {int(x) for x in os.environ.get("ADMIN_IDS", "").replace(",", " ").split() if x}
+DATABASE_CHANNEL = os.environ.get("DATABASE_CHANNEL", "")
+
+# restxdb upstream
+API_BASE = os.environ.get("RESTXDB_API", "https://restxdb.onrender.com/api").rstrip("/")
+LANG = os.environ.get("DRAMA_LANG", "in")
+
+# Shared HTTP client. restxdb cold-starts on Render, so the read timeout is generous.
+HTTP_MAX_CONNECTIONS = _int("HTTP_MAX_CONNECTIONS", 64)
+HTTP_MAX_KEEPALIVE = _int("HTTP_MAX_KEEPALIVE", 32)
+HTTP_KEEPALIVE_EXPIRY = _float("HTTP_KEEPALIVE_EXPIRY", 90.0)
+HTTP_MAX_PER_HOST = _int("HTTP_MAX_PER_HOST", 16)
+HTTP_CONNECT_TIMEOUT = _float("HTTP_CONNECT_TIMEOUT", 10.0)
+HTTP_READ_TIMEOUT = _float("HTTP_READ_TIMEOUT", 45.0)
+HTTP_POOL_TIMEOUT = _float("HTTP_POOL_TIMEOUT", 15.0)
+
+# Catalog response cache (foryou/rank/new/chapters)
+CACHE_MAX_BYTES = _int("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# Resolved video URLs (/watch GET or POST)
+VIDEO_URL_CACHE_SIZE = _int("VIDEO_URL_CACHE_SIZE", 20000)
+VIDEO_URL_DEFAULT_TTL = _float("VIDEO_URL_DEFAULT_TTL", 1200.0)
+VIDEO_URL_EXPIRY_MARGIN = _float("VIDEO_URL_EXPIRY_MARGIN", 120.0)
+VIDEO_VARIANT_CACHE_SIZE = _int("VIDEO_VARIANT_CACHE_SIZE", 5000)  # books whose working /watch variant is known
+RESOLVE_CONCURRENCY = _int("RESOLVE_CONCURRENCY", 8)
+
+# Server-side episode downloads
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", os.path.join(DATA_DIR, "downloads"))
+DOWNLOAD_RESOLVE_CONCURRENCY = _int("DOWNLOAD_RESOLVE_CONCURRENCY", 6)
+DOWNLOAD_TRANSFER_CONCURRENCY = _int("DOWNLOAD_TRANSFER_CONCURRENCY", 4)
+DOWNLOAD_MAX_ATTEMPTS = _int("DOWNLOAD_MAX_ATTEMPTS", 4)
+DOWNLOAD_START_RATE = _float("DOWNLOAD_START_RATE", 4.0)
+DOWNLOAD_CHUNK_SIZE = _int("DOWNLOAD_CHUNK_SIZE", 256 * 1024)
+
+# Persistent download jobs
+JOBS_DB = os.environ.get("JOBS_DB", os.path.join(DATA_DIR, "jobs.sqlite3"))
+DOWNLOAD_MAX_JOBS = _int("DOWNLOAD_MAX_JOBS", 2)
+DOWNLOAD_GLOBAL_TRANSFERS = _int("DOWNLOAD_GLOBAL_TRANSFERS", 8)
+JOB_CHECKPOINT_BYTES = _int("JOB_CHECKPOINT_BYTES", 4 * 1024 * 1024)
+JOB_RETENTION_HOURS = _float("JOB_RETENTION_HOURS", 48.0)
+JOB_MEMORY_SECONDS = _float("JOB_MEMORY_SECONDS", 600.0)  # finished jobs kept in memory for status polls
+
+# HLS episodes
+HLS_SEGMENT_CONCURRENCY = _int("HLS_SEGMENT_CONCURRENCY", 6)
+HLS_MAX_HEIGHT = _int("HLS_MAX_HEIGHT", 1080)
+
+# Telegram file_id index
+FILE_INDEX_DB = os.environ.get("FILE_INDEX_DB", os.path.join(DATA_DIR, "files.sqlite3"))
+
+# Telegram send scheduler (Bot API flood limits)
+TG_CONCURRENT_UPDATES = _int("TG_CONCURRENT_UPDATES", 64)
+TG_GLOBAL_RATE = _float("TG_GLOBAL_RATE", 30.0)
+TG_GLOBAL_BURST = _float("TG_GLOBAL_BURST", 3.0)
+TG_CHAT_RATE = _float("TG_CHAT_RATE", 1.0)
+TG_GROUP_RATE = _float("TG_GROUP_RATE", 20 / 60)
+TG_MAX_RETRIES = _int("TG_MAX_RETRIES", 5)
+TG_BULK_PREFETCH = _int("TG_BULK_PREFETCH", 3)
+
+# Telegram updates: a webhook at {WEBHOOK_URL}/telegram/webhook when set (Render provides
+# RENDER_EXTERNAL_URL), else long polling. WEBHOOK_SECRET defaults to one derived from the token.
+WEBHOOK_URL = (os.environ.get("WEBHOOK_URL") or os.environ.get("RENDER_EXTERNAL_URL", "")).rstrip("/")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+# Webhook updates waiting for a handler; past this (or before the bot has started) Telegram is told to retry.
+WEBHOOK_BACKLOG = _int("WEBHOOK_BACKLOG", 1000)
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+
+# Server-rendered pages
+PAGE_TTL = _float("PAGE_TTL", 60.0)
+PAGE_STALE_TTL = _float("PAGE_STALE_TTL", 600.0)
+
+# Background catalog warmer (WARM_INTERVAL=0 disables it)
+WARM_INTERVAL = _float("WARM_INTERVAL", 240.0)
+WARM_PAGES = _int("WARM_PAGES", 3)
+WARM_TOP_DRAMAS = _int("WARM_TOP_DRAMAS", 30)
+WARM_EPISODES = _int("WARM_EPISODES", 3)
+WARM_CONCURRENCY = _int("WARM_CONCURRENCY", 3)
+WARM_SLOW_SECONDS = _float("WARM_SLOW_SECONDS", 8.0)
+
+# restxdb circuit breakers and adaptive concurrency (per endpoint class)
+BREAKER_CONSECUTIVE_FAILURES = _int("BREAKER_CONSECUTIVE_FAILURES", 5)
+BREAKER_WINDOW = _int("BREAKER_WINDOW", 20)
+BREAKER_ERROR_RATE = _float("BREAKER_ERROR_RATE", 0.5)
+BREAKER_COOLDOWN = _float("BREAKER_COOLDOWN", 15.0)
+BREAKER_MAX_COOLDOWN = _float("BREAKER_MAX_COOLDOWN", 120.0)
+UPSTREAM_INITIAL_CONCURRENCY = _int("UPSTREAM_INITIAL_CONCURRENCY", 8)
+UPSTREAM_LATENCY_TOLERANCE = _float("UPSTREAM_LATENCY_TOLERANCE", 3.0)
+
+# Cover thumbnail proxy (IMAGE_HOSTS: extra comma-separated source hosts)
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(DATA_DIR, "images"))
+IMAGE_CACHE_BYTES = _int("IMAGE_CACHE_BYTES", 512 * 1024 * 1024)
+IMAGE_HOSTS = os.environ.get("IMAGE_HOSTS", "")
+
+# Playback relay: episode bytes and HLS segments shared by every viewer
+RELAY_CACHE_DIR = os.environ.get("RELAY_CACHE_DIR", os.path.join(DATA_DIR, "relay"))
+RELAY_CACHE_BYTES = _int("RELAY_CACHE_BYTES", 2 * 1024 * 1024 * 1024)
+RELAY_BLOCK_BYTES = _int("RELAY_BLOCK_BYTES", 1024 * 1024)
+RELAY_READAHEAD = _int("RELAY_READAHEAD", 3)
+RELAY_PREFETCH_BYTES = _int("RELAY_PREFETCH_BYTES", 3 * 1024 * 1024)
+RELAY_PREFETCH_SEGMENTS = _int("RELAY_PREFETCH_SEGMENTS", 3)
+RELAY_PREFETCH_CONCURRENCY = _int("RELAY_PREFETCH_CONCURRENCY", 2)
+
+# Metrics and tracing (TRACE_SAMPLE_RATE: fraction of web requests traced, 0 disables). /stats, /metrics
+# and /traces answer only "Authorization: Bearer <ADMIN_TOKEN>", and are off while it is unset.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+TRACE_SAMPLE_RATE = _float("TRACE_SAMPLE_RATE", 0.0)
+TRACE_KEEP = _int("TRACE_KEEP", 200)
+
+# Several instances (SHARED_BACKEND=sqlite shares the catalog cache, video URLs, single-flight,
+# the warmer and Telegram polling through SHARED_DB; all instances need DATA_DIR on the same storage)
+SHARED_BACKEND = os.environ.get("SHARED_BACKEND", "local")
+SHARED_DB = os.environ.get("SHARED_DB", os.path.join(DATA_DIR, "shared.sqlite3"))
+INSTANCE_ID = os.environ.get("INSTANCE_ID", "")
+LEASE_SECONDS = _float("LEASE_SECONDS", 30.0)
+SHARED_LOCK_SECONDS = _float("SHARED_LOCK_SECONDS", 60.0)
+SHARED_POLL_INTERVAL = _float("SHARED_POLL_INTERVAL", 0.05)
+SHARED_PRUNE_INTERVAL = _float("SHARED_PRUNE_INTERVAL", 300.0)
+SHARED_KEEP_EXPIRED = _float("SHARED_KEEP_EXPIRED", 24 * 3600.0)
+SQLITE_BUSY_TIMEOUT = _float("SQLITE_BUSY_TIMEOUT", 5.0)
+
+# Cold start: snapshots reloaded after a restart, and subsystems started on first use
+# (or LAZY_START_DELAY seconds after startup, whichever comes first)
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(DATA_DIR, "snapshots"))
+SNAPSHOT_INTERVAL = _float("SNAPSHOT_INTERVAL", 300.0)
+SNAPSHOT_KEEP_EXPIRED = _float("SNAPSHOT_KEEP_EXPIRED", 24 * 3600.0)
+LAZY_START_DELAY = _float("LAZY_START_DELAY", 10.0)
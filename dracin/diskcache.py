@@ -0,0 +1,131 @@
+"""Size-bounded file cache with LRU eviction.
+
+Used for cover thumbnails and relayed video. Recency survives restarts
+through file mtimes: the directory is scanned oldest-first on first use
+(not at startup: a full thumbnail cache is tens of thousands of files)
+and every hit bumps the file's mtime.
+
+The plain methods block on the disk and are safe to call from worker
+threads; code on the event loop uses the ``a``-prefixed wrappers. Writes
+never evict inline: once the cache is over budget, a background task
+trims it back, so the budget can be overshot briefly by in-flight writes.
+"""
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+
+class DiskCache:
+    """Files under ``root`` with LRU eviction by total size."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.bytes = 0  # 0 until the first use scans the directory
+        self.evictions = 0
+        self._files: OrderedDict[str, int] | None = None
+        self._lock = threading.Lock()
+        self._evicting: asyncio.Task | None = None
+
+    def _scan(self) -> OrderedDict[str, int]:
+        """The file index, built on first use; call with ``_lock`` held."""
+        if self._files is not None:
+            return self._files
+        self._files = OrderedDict()
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                if name.endswith(".tmp"):
+                    os.unlink(path)
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self.bytes += size
+        return self._files
+
+    def path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def touch(self, path: str) -> bool:
+        with self._lock:
+            files = self._scan()
+            if path not in files:
+                return False
+            files.move_to_end(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.bytes -= files.pop(path, 0)
+            return False
+        return True
+
+    def read(self, path: str) -> bytes | None:
+        if not self.touch(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:  # evicted between touch and open
+            return None
+
+    def put(self, path: str, data: bytes) -> None:
+        with self._lock:
+            self._scan()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"  # two threads may write the same key
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.bytes += len(data) - self._files.pop(path, 0)
+            self._files[path] = len(data)
+
+    def evict(self) -> int:
+        """Delete least recently used files until the cache fits its budget; returns how many."""
+        doomed = []
+        with self._lock:
+            files = self._scan()
+            while self.bytes > self.max_bytes and len(files) > 1:
+                oldest, size = files.popitem(last=False)
+                self.bytes -= size
+                doomed.append(oldest)
+            self.evictions += len(doomed)
+        for path in doomed:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        return len(doomed)
+
+    def evict_soon(self) -> None:
+        """Start a background eviction if the cache is over budget and none is running."""
+        if self.bytes <= self.max_bytes or (self._evicting is not None and not self._evicting.done()):
+            return
+        self._evicting = asyncio.create_task(asyncio.to_thread(self.evict))
+
+    async def atouch(self, path: str) -> bool:
+        return await asyncio.to_thread(self.touch, path)
+
+    async def aread(self, path: str) -> bytes | None:
+        return await asyncio.to_thread(self.read, path)
+
+    async def aput(self, path: str, data: bytes) -> None:
+        await asyncio.to_thread(self.put, path, data)
+        self.evict_soon()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._scan())
+
+    def snapshot(self) -> dict:
+        if self._files is None:
+            return {"scanned": False, "max_bytes": self.max_bytes}
+        return {"files": len(self._files), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "evictions": self.evictions, "evicting": self._evicting is not None and not self._evicting.done()}
@@ -0,0 +1,737 @@
+"""Server-side episode downloads.
+
+A download runs as two pipeline stages with separate concurrency limits:
+link resolution (restxdb ``/watch``) and byte transfer (video CDN). Each
+stage has an adaptive rate limiter instead of a fixed sleep, and every
+episode is retried with exponential backoff on its own.
+
+Jobs queued through ``DownloadManager.enqueue`` are persisted in a
+``JobStore`` and resume after a restart; partially written episodes
+continue with an HTTP Range request instead of starting over. Instances
+sharing the store take queued jobs from each other, each job run by the
+instance holding its lease.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import httpx
+
+from . import config
+from .gateway import Gateway
+from .hls import HLSError, HLSFetcher, MediaPlaylist, is_hls_response, is_hls_url
+from .jobs import UNFINISHED, JobStore
+from .metrics import DOWNLOAD_BYTES
+from .models import Drama
+from .resolver import VideoResolver
+from .shared import INSTANCE_ID
+from .upstream import Upstream
+from .zipstream import ZipStream
+
+log = logging.getLogger(__name__)
+
+# HTTP statuses from the CDN that mean the signed URL is no longer valid.
+EXPIRED_URL_STATUSES = (401, 403, 404, 410)
+
+
+def drama_title(drama: Drama | None) -> str:
+    return drama.title if drama is not None and drama.title else "Untitled"
+
+
+def safe_title(title: str) -> str:
+    """Same rule as the page: keep ASCII letters, digits and spaces, then spaces -> ``_``."""
+    return re.sub(r"\s+", "_", re.sub(r"[^a-zA-Z0-9\s]", "", title)).strip("_") or "drama"
+
+
+@dataclass(slots=True)
+class Episode:
+    position: int
+    chapter_index: int
+    filename: str
+
+
+def episodes_from_chapters(drama: Drama | None, ext: str = "mp4") -> list[Episode]:
+    if drama is None or drama.chapters is None:
+        return []
+    prefix = safe_title(drama_title(drama))
+    return [Episode(i, idx, f"{prefix}_EP{i + 1:02d}.{ext}") for i, idx in enumerate(drama.chapters)]
+
+
+class AdaptiveRateLimiter:
+    """Spaces out request starts, speeding up on success and backing off on errors (AIMD)."""
+
+    def __init__(self, rate: float = config.DOWNLOAD_START_RATE, min_rate: float = 0.5,
+                 max_rate: float = 50.0, increase: float = 0.5, decrease: float = 0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failure(self, retry_after: float | None = None) -> None:
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        if retry_after:
+            self._next = max(self._next, time.monotonic() + retry_after)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+@dataclass(slots=True)
+class StageProgress:
+    active: int = 0
+    done: int = 0
+    failed: int = 0
+    retries: int = 0
+
+
+@dataclass(slots=True)
+class EpisodeState:
+    status: str = "queued"  # queued, resolving, resolved, downloading, done, failed
+    attempts: int = 0
+    bytes: int = 0
+    size: int | None = None
+    error: str | None = None
+
+
+@dataclass
+class DownloadProgress:
+    total: int
+    resolve: StageProgress = field(default_factory=StageProgress)
+    transfer: StageProgress = field(default_factory=StageProgress)
+    episodes: dict[int, EpisodeState] = field(default_factory=dict)
+    bytes: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    # Called with (position, state) whenever an episode changes status or checkpoints.
+    listener: Callable[[int, EpisodeState], None] | None = field(default=None, repr=False)
+
+    def episode(self, position: int) -> EpisodeState:
+        state = self.episodes.get(position)
+        if state is None:
+            state = self.episodes[position] = EpisodeState()
+        return state
+
+    def notify(self, position: int) -> None:
+        if self.listener is not None:
+            self.listener(position, self.episodes[position])
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "total": self.total,
+            "resolve": {k: getattr(self.resolve, k) for k in StageProgress.__slots__},
+            "transfer": {k: getattr(self.transfer, k) for k in StageProgress.__slots__},
+            "bytes": self.bytes,
+            "bytes_per_second": round(self.bytes / elapsed) if elapsed > 0 else 0,
+            "finished": self.finished_at is not None,
+            "episodes": {
+                pos: {k: getattr(s, k) for k in EpisodeState.__slots__}
+                for pos, s in sorted(self.episodes.items())
+            },
+        }
+
+
+# sink(episode, chunks, offset) consumes one episode's bytes, appending after ``offset``
+# bytes already stored, and returns the byte count written. The concrete sinks below
+# also have ``offset(episode)`` (bytes that can be resumed), ``discard(episode)`` and ``aclose()``.
+Sink = Callable[[Episode, AsyncIterator[bytes], int], Awaitable[int]]
+
+
+class FileSink:
+    """Writes each episode to ``directory/filename`` via a ``.part`` file."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, episode: Episode) -> str:
+        return os.path.join(self.directory, episode.filename)
+
+    def offset(self, episode: Episode) -> int:
+        try:
+            return os.path.getsize(self.path(episode) + ".part")
+        except OSError:
+            return 0
+
+    def discard(self, episode: Episode) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path(episode) + ".part")
+
+    async def __call__(self, episode: Episode, chunks: AsyncIterator[bytes], offset: int = 0) -> int:
+        final = self.path(episode)
+        part = final + ".part"
+        written = 0
+        f = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+                written += len(chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        os.replace(part, final)
+        return written
+
+    async def aclose(self) -> None:
+        pass
+
+
+class ZipSink:
+    """Assembles finished episodes into one STORE'd ZIP stream.
+
+    Transfers run in parallel but archive entries must be written one after
+    another, and a transfer that fails half way cannot take back bytes
+    already sent. So each episode is spooled to a temp file and handed to
+    ``stream()`` as soon as it completes; memory use stays at a few chunks
+    no matter how many episodes there are.
+    """
+
+    def __init__(self, spool_dir: str | None = None, chunk_size: int = config.DOWNLOAD_CHUNK_SIZE):
+        os.makedirs(spool_dir or config.DOWNLOAD_DIR, exist_ok=True)
+        self.spool_dir = tempfile.mkdtemp(prefix="zip-", dir=spool_dir or config.DOWNLOAD_DIR)
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+        self._ready: asyncio.Queue[tuple[Episode, str] | None] = asyncio.Queue()
+
+    def offset(self, episode: Episode) -> int:
+        return 0
+
+    def discard(self, episode: Episode) -> None:
+        pass
+
+    async def __call__(self, episode: Episode, chunks: AsyncIterator[bytes], offset: int = 0) -> int:
+        path = os.path.join(self.spool_dir, f"{episode.position:05d}")
+        written = await FileSink(self.spool_dir)(Episode(episode.position, episode.chapter_index,
+                                                          os.path.basename(path)), chunks)
+        self._ready.put_nowait((episode, path))
+        return written
+
+    async def aclose(self) -> None:
+        """Signal that no more episodes will arrive."""
+        self._ready.put_nowait(None)
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Archive bytes, in episode completion order, ending with the central directory."""
+        zf = ZipStream()
+        try:
+            while (item := await self._ready.get()) is not None:
+                episode, path = item
+                yield zf.start(episode.filename)
+                with open(path, "rb") as f:
+                    while chunk := await asyncio.to_thread(f.read, self.chunk_size):
+                        self.bytes_sent += len(chunk)
+                        yield zf.feed(chunk)
+                yield zf.end()
+                os.remove(path)
+            yield zf.finish()
+        finally:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+
+class _Retry(Exception):
+    def __init__(self, message: str, retry_after: float | None = None, expired: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.expired = expired
+
+
+class DownloadPipeline:
+    def __init__(self, resolver: VideoResolver, upstream: Upstream, *,
+                 resolve_concurrency: int = config.DOWNLOAD_RESOLVE_CONCURRENCY,
+                 transfer_concurrency: int = config.DOWNLOAD_TRANSFER_CONCURRENCY,
+                 max_attempts: int = config.DOWNLOAD_MAX_ATTEMPTS,
+                 chunk_size: int = config.DOWNLOAD_CHUNK_SIZE):
+        self.resolver = resolver
+        self.upstream = upstream
+        self.resolve_concurrency = resolve_concurrency
+        self.transfer_concurrency = transfer_concurrency
+        self.max_attempts = max_attempts
+        self.chunk_size = chunk_size
+        self.resolve_limiter = AdaptiveRateLimiter()
+        self.transfer_limiter = AdaptiveRateLimiter()
+        # Shared by every job, so concurrent jobs cannot multiply CDN connections.
+        self.transfer_slots = asyncio.Semaphore(config.DOWNLOAD_GLOBAL_TRANSFERS)
+        self.hls = HLSFetcher(upstream)
+
+    async def run(self, book_id: str, episodes: list[Episode], sink: Sink,
+                  progress: DownloadProgress | None = None, lang: str | None = None) -> DownloadProgress:
+        progress = progress or DownloadProgress(total=len(episodes))
+        pending: asyncio.Queue[Episode] = asyncio.Queue()
+        for ep in episodes:
+            pending.put_nowait(ep)
+            progress.episode(ep.position)
+        # Bounded so links are not resolved so far ahead that they expire before use.
+        ready: asyncio.Queue[tuple[Episode, str] | None] = asyncio.Queue(maxsize=self.transfer_concurrency * 2)
+
+        async def resolve_worker():
+            while not pending.empty():
+                ep = pending.get_nowait()
+                url = await self._resolve(book_id, ep, lang, progress)
+                if url:
+                    await ready.put((ep, url))
+
+        async def transfer_worker():
+            while (item := await ready.get()) is not None:
+                await self._transfer(book_id, item[0], item[1], sink, lang, progress)
+
+        async def feed(n_transfer: int):
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(self.resolve_concurrency):
+                    tg.create_task(resolve_worker())
+            for _ in range(n_transfer):
+                await ready.put(None)
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(self.transfer_concurrency):
+                    tg.create_task(transfer_worker())
+                tg.create_task(feed(self.transfer_concurrency))
+        finally:
+            progress.finished_at = time.time()
+        return progress
+
+    async def _resolve(self, book_id: str, ep: Episode, lang: str | None,
+                       progress: DownloadProgress) -> str | None:
+        state = progress.episode(ep.position)
+        state.status = "resolving"
+        progress.notify(ep.position)
+        progress.resolve.active += 1
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                await self.resolve_limiter.acquire()
+                url = await self.resolver.resolve(book_id, ep.chapter_index, lang)
+                if url:
+                    self.resolve_limiter.success()
+                    state.status = "resolved"
+                    progress.resolve.done += 1
+                    progress.notify(ep.position)
+                    return url
+                self.resolve_limiter.failure()
+                if attempt < self.max_attempts:
+                    progress.resolve.retries += 1
+                    await asyncio.sleep(backoff_delay(attempt))
+            state.status, state.error = "failed", "no video link"
+            progress.resolve.failed += 1
+            progress.notify(ep.position)
+            return None
+        finally:
+            progress.resolve.active -= 1
+
+    async def _transfer(self, book_id: str, ep: Episode, url: str, sink: Sink, lang: str | None,
+                        progress: DownloadProgress) -> None:
+        state = progress.episode(ep.position)
+        progress.transfer.active += 1
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                state.status, state.attempts = "downloading", attempt
+                progress.bytes -= state.bytes
+                state.bytes = 0
+                progress.notify(ep.position)
+                await self.transfer_limiter.acquire()
+                try:
+                    async with self.transfer_slots:
+                        await self._fetch(url, ep, sink, state, progress)
+                except (_Retry, HLSError, httpx.HTTPError, OSError) as e:
+                    retry_after = getattr(e, "retry_after", None)
+                    self.transfer_limiter.failure(retry_after)
+                    state.error = str(e) or type(e).__name__
+                    log.info("episode %s/%s attempt %d failed: %s", book_id, ep.chapter_index, attempt, state.error)
+                    if attempt == self.max_attempts:
+                        break
+                    progress.transfer.retries += 1
+                    await asyncio.sleep(retry_after or backoff_delay(attempt))
+                    if getattr(e, "expired", False):
+                        self.resolver.invalidate(book_id, ep.chapter_index, lang)
+                        url = await self.resolver.resolve(book_id, ep.chapter_index, lang) or url
+                    continue
+                self.transfer_limiter.success()
+                state.status, state.error = "done", None
+                progress.transfer.done += 1
+                progress.notify(ep.position)
+                return
+            state.status = "failed"
+            progress.transfer.failed += 1
+            progress.notify(ep.position)
+        finally:
+            progress.transfer.active -= 1
+
+    async def _fetch(self, url: str, ep: Episode, sink: Sink, state: EpisodeState,
+                     progress: DownloadProgress) -> None:
+        if is_hls_url(url):
+            return await self._fetch_hls(await self.hls.load(url), ep, sink, state, progress)
+        offset = sink.offset(ep)
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        async with self.upstream.stream(url, headers=headers) as resp:
+            if resp.status_code == 416 and offset:
+                # The partial file does not fit this episode any more: start it over.
+                sink.discard(ep)
+                raise _Retry("HTTP 416 on resume", retry_after=0.01)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                retry_after = resp.headers.get("retry-after", "")
+                raise _Retry(f"HTTP {resp.status_code}", float(retry_after) if retry_after.isdigit() else None)
+            if resp.status_code in EXPIRED_URL_STATUSES:
+                raise _Retry(f"HTTP {resp.status_code}", expired=True)
+            resp.raise_for_status()
+            if is_hls_response(resp):
+                text = (await resp.aread()).decode("utf-8", "replace")
+                return await self._fetch_hls(await self.hls.load(str(resp.url), text), ep, sink, state, progress)
+            if resp.status_code != 206:
+                offset = 0  # server ignored the Range header
+            length = resp.headers.get("content-length", "")
+            state.size = offset + int(length) if length.isdigit() else None
+            state.bytes = offset
+            progress.bytes += offset
+            checkpoint = offset + config.JOB_CHECKPOINT_BYTES
+
+            async def chunks() -> AsyncIterator[bytes]:
+                nonlocal checkpoint
+                async for chunk in resp.aiter_bytes(self.chunk_size):
+                    state.bytes += len(chunk)
+                    progress.bytes += len(chunk)
+                    DOWNLOAD_BYTES.inc(amount=len(chunk))
+                    yield chunk
+                    if state.bytes >= checkpoint:
+                        checkpoint = state.bytes + config.JOB_CHECKPOINT_BYTES
+                        progress.notify(ep.position)
+                # Raised inside the sink so it never commits a truncated episode.
+                if state.size is not None and state.bytes != state.size:
+                    raise _Retry(f"short read: {state.bytes}/{state.size} bytes")
+
+            await sink(ep, chunks(), offset)
+
+    async def _fetch_hls(self, playlist: MediaPlaylist, ep: Episode, sink: Sink, state: EpisodeState,
+                         progress: DownloadProgress) -> None:
+        """Download an HLS episode as one ``.ts``/``.mp4`` stream (always from the first segment)."""
+        sink.discard(ep)
+        stem, ext = os.path.splitext(ep.filename)
+        if ext != "." + playlist.extension:
+            ep.filename = f"{stem}.{playlist.extension}"
+        state.size = None
+        checkpoint = config.JOB_CHECKPOINT_BYTES
+
+        async def chunks() -> AsyncIterator[bytes]:
+            nonlocal checkpoint
+            async for data in self.hls.stream(playlist):
+                state.bytes += len(data)
+                progress.bytes += len(data)
+                DOWNLOAD_BYTES.inc(amount=len(data))
+                yield data
+                if state.bytes >= checkpoint:
+                    checkpoint = state.bytes + config.JOB_CHECKPOINT_BYTES
+                    progress.notify(ep.position)
+
+        await sink(ep, chunks(), 0)
+
+
+@dataclass
+class DownloadJob:
+    id: str
+    book_id: str
+    lang: str | None = None
+    title: str = ""
+    status: str = "queued"  # queued, running, done, partial, failed, cancelled
+    progress: DownloadProgress = field(default_factory=lambda: DownloadProgress(total=0))
+    episodes: list[Episode] = field(default_factory=list)
+    persistent: bool = True
+    task: asyncio.Task | None = None
+    error: str | None = None
+    ended_at: float | None = None
+    version: int = 0
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in UNFINISHED
+
+    def touch(self) -> None:
+        self.version += 1
+        self._changed.set()
+
+    async def wait_changed(self, timeout: float) -> bool:
+        """Wait until the job changes; ``False`` on timeout."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"id": self.id, "bookId": self.book_id, "title": self.title, "status": self.status,
+                "error": self.error, **self.progress.snapshot()}
+
+
+class DownloadManager:
+    """Queue of download jobs worked by a fixed pool.
+
+    ``enqueue`` jobs go to ``root/<job id>/`` and are recorded in the
+    ``JobStore``. Nothing runs until ``start`` (first use or
+    ``start_later``). Every ``lease / 3`` seconds the manager renews the leases
+    of the jobs it runs and queues unfinished jobs nobody holds: on
+    startup, ones another instance queued, or ones whose instance died.
+    ``stream`` jobs feed a live ZIP response and are not persisted, since
+    nothing could resume the closed response. Finished jobs are dropped
+    from memory after ``JOB_MEMORY_SECONDS`` (persistent ones can still be
+    read back from the store) and from the store after
+    ``JOB_RETENTION_HOURS``.
+    """
+
+    def __init__(self, gateway: Gateway, pipeline: DownloadPipeline, store: JobStore,
+                 root: str = config.DOWNLOAD_DIR, workers: int = config.DOWNLOAD_MAX_JOBS,
+                 instance_id: str = INSTANCE_ID, lease: float = config.LEASE_SECONDS):
+        self.gateway = gateway
+        self.pipeline = pipeline
+        self.store = store
+        self.root = root
+        self.n_workers = workers
+        self.instance_id = instance_id
+        self.lease = lease
+        self.jobs: dict[str, DownloadJob] = {}
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._local: set[str] = set()  # queued or running here
+        self._workers: list[asyncio.Task] = []
+        self._leases: asyncio.Task | None = None
+        self._started = self._closing = False
+
+    def start(self) -> None:
+        """Prune old jobs, resume unfinished ones and start the workers; later calls do nothing."""
+        if self._started:
+            return
+        self._started = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.n_workers)]
+        self._leases = asyncio.create_task(self._keep_leases())
+
+    def start_later(self, delay: float) -> None:
+        """``start`` after ``delay`` seconds unless a request needs the manager first."""
+        asyncio.get_running_loop().call_later(delay, lambda: None if self._closing else self.start())
+
+    def enqueue(self, book_id: str, lang: str | None = None) -> DownloadJob:
+        self.start()
+        job = DownloadJob(uuid.uuid4().hex[:12], str(book_id), lang)
+        self.store.create_job(job.id, job.book_id, lang)
+        self.jobs[job.id] = job
+        self._put(job.id)
+        return job
+
+    def _put(self, job_id: str) -> None:
+        self._local.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _adopt_unclaimed(self) -> None:
+        for row in await self.store.claimable():
+            if row["id"] in self._local:
+                continue
+            job = await self._restore(row)
+            log.info("resuming download job %s (%s)", job.id, job.title or job.book_id)
+            self._put(job.id)
+
+    async def _keep_leases(self) -> None:
+        try:
+            await self._prune()
+            await self._adopt_unclaimed()
+        except Exception:
+            log.exception("resuming download jobs failed")
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                self.store.renew(self.instance_id, self.lease)
+                for job in list(self.jobs.values()):
+                    # Cancelled through another instance, which only sees the store.
+                    if job.task is not None and not job.task.done() and job.persistent:
+                        row = await self.store.job(job.id)
+                        if row is not None and row["status"] == "cancelled":
+                            job.task.cancel()
+                await self._adopt_unclaimed()
+                await self._prune()
+            except Exception:
+                log.exception("renewing download job leases failed")
+
+    async def _prune(self) -> None:
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if (job.finished and job.ended_at is not None and job.ended_at < now - config.JOB_MEMORY_SECONDS
+                    and (job.task is None or job.task.done()) and job_id not in self._local):
+                del self.jobs[job_id]
+        for job_id in await self.store.prune(now - config.JOB_RETENTION_HOURS * 3600):
+            shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+
+    def stream(self, book_id: str, drama: Drama, sink: ZipSink, lang: str | None = None,
+               job_id: str | None = None) -> DownloadJob:
+        """Run a job straight into ``sink`` right away, outside the queue."""
+        self.start()
+        job = DownloadJob(job_id or uuid.uuid4().hex[:12], str(book_id), lang, persistent=False)
+        self._prepare(job, drama)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, sink))
+        return job
+
+    async def get(self, job_id: str) -> DownloadJob | None:
+        """The job, re-read from the store when another instance may be running it."""
+        self.start()
+        job = self.jobs.get(job_id)
+        if job is None or (job.persistent and not job.finished and job_id not in self._local):
+            row = await self.store.job(job_id)
+            job = await self._restore(row) if row else job
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        job = await self.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        else:
+            self._set_status(job, "cancelled")
+        return True
+
+    async def _restore(self, row) -> DownloadJob:
+        job = DownloadJob(row["id"], row["book_id"], row["lang"], row["title"], row["status"], error=row["error"])
+        rows = await self.store.episodes(job.id)
+        job.episodes = [Episode(r["position"], r["chapter_index"], r["filename"]) for r in rows]
+        job.progress = DownloadProgress(total=len(rows))
+        if job.finished:
+            job.progress.finished_at = job.ended_at = row["updated_at"]
+        sink = FileSink(os.path.join(self.root, job.id))
+        for r, ep in zip(rows, job.episodes):
+            state = job.progress.episode(ep.position)
+            state.attempts, state.size, state.error = r["attempts"], r["size"], r["error"]
+            if r["status"] == "done":
+                state.status, state.bytes = "done", r["bytes"]
+                job.progress.resolve.done += 1
+                job.progress.transfer.done += 1
+            elif r["status"] == "failed" and job.finished:
+                state.status = "failed"
+                job.progress.transfer.failed += 1
+            else:
+                state.bytes = await asyncio.to_thread(sink.offset, ep)
+            job.progress.bytes += state.bytes
+        self.jobs[job.id] = job
+        return job
+
+    def _prepare(self, job: DownloadJob, drama: Drama | None) -> None:
+        job.title = drama_title(drama)
+        job.episodes = episodes_from_chapters(drama)
+        job.progress = DownloadProgress(total=len(job.episodes))
+        if job.persistent:
+            self.store.update_job(job.id, title=job.title)
+            self.store.add_episodes(job.id, [(e.position, e.chapter_index, e.filename) for e in job.episodes])
+
+    def _set_status(self, job: DownloadJob, status: str, error: str | None = None) -> None:
+        job.status, job.error = status, error
+        if job.finished:
+            job.ended_at = time.time()
+        if job.persistent:
+            self.store.update_job(job.id, status=status, error=error)
+        job.touch()
+
+    def _on_episode(self, job: DownloadJob, position: int, state: EpisodeState) -> None:
+        if job.persistent:
+            self.store.save_episode(job.id, position, job.episodes[position].filename, state.status,
+                                    state.bytes, state.size, state.attempts, state.error)
+        job.touch()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.finished or not await self.store.claim(job_id, self.instance_id, self.lease):
+                self._local.discard(job_id)  # done, or another instance took it first
+                continue
+            job.task = asyncio.create_task(self._run(job, FileSink(os.path.join(self.root, job.id))))
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise  # the worker itself is stopping, not just this job
+            finally:
+                if job.task.done():
+                    self.store.release(self.instance_id, job_id)
+                    self._local.discard(job_id)
+
+    async def _run(self, job: DownloadJob, sink: FileSink | ZipSink) -> None:
+        try:
+            if not job.episodes:
+                drama = await self.gateway.chapters(job.book_id, job.lang)
+                self._prepare(job, drama)
+            if not job.episodes:
+                self._set_status(job, "failed", "no episodes")
+                return
+            self._set_status(job, "running")
+            job.progress.listener = lambda pos, state: self._on_episode(job, pos, state)
+            pending = [ep for ep in job.episodes if job.progress.episode(ep.position).status != "done"]
+            await self.pipeline.run(job.book_id, pending, sink, job.progress, job.lang)
+            done, total = job.progress.transfer.done, len(job.episodes)
+            if done == total:
+                self._set_status(job, "done")
+            else:
+                # Some episodes may still be worth the archive, but the job did not succeed.
+                self._set_status(job, "partial" if done else "failed", f"{total - done} of {total} episodes failed")
+        except asyncio.CancelledError:
+            if not (self._closing and job.persistent):
+                self._set_status(job, "cancelled")
+            raise
+        except Exception as e:
+            log.exception("download job %s failed", job.id)
+            self._set_status(job, "failed", repr(e))
+        finally:
+            await sink.aclose()
+
+    async def archive(self, job: DownloadJob) -> AsyncIterator[bytes]:
+        """ZIP of the episodes this job has finished, read back from disk in order."""
+        zf = ZipStream()
+        directory = os.path.join(self.root, job.id)
+        for ep in job.episodes:
+            if job.progress.episode(ep.position).status != "done":
+                continue
+            path = os.path.join(directory, ep.filename)
+            f = await asyncio.to_thread(open, path, "rb")
+            try:
+                yield zf.start(ep.filename, await asyncio.to_thread(os.path.getmtime, path))
+                while chunk := await asyncio.to_thread(f.read, config.DOWNLOAD_CHUNK_SIZE):
+                    yield zf.feed(chunk)
+                yield zf.end()
+            finally:
+                await asyncio.to_thread(f.close)
+        yield zf.finish()
+
+    def snapshot(self) -> dict[str, Any]:
+        running = [j for j in self.jobs.values() if j.task is not None and not j.task.done()]
+        return {"queued": self._queue.qsize(), "running": len(running),
+                "resolving": sum(j.progress.resolve.active for j in running),
+                "transferring": sum(j.progress.transfer.active for j in running)}
+
+    async def aclose(self) -> None:
+        """Stop workers; persistent jobs stay ``running`` in the store and resume next start."""
+        self._closing = True
+        tasks = self._workers + [j.task for j in self.jobs.values() if j.task and not j.task.done()]
+        if self._leases is not None:
+            tasks.append(self._leases)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.store.release(self.instance_id)  # another instance may resume them right away
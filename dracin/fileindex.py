@@ -0,0 +1,143 @@
+"""Index of episodes already uploaded to Telegram.
+
+Every episode the bot uploads is posted once to ``DATABASE_CHANNEL`` with a
+machine-readable tag in its caption. The resulting ``file_id`` is stored
+here, keyed on (bookId, chapterIndex, lang, quality), so later requests
+for that episode are a single ``send_video(file_id)`` with no CDN download
+and no re-upload. The tags also let the index be rebuilt from the channel.
+
+Lookups are coroutines run on the index's own database thread; ``put`` and
+``forget`` are queued there without waiting, in order, like the shared state.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    book_id        TEXT NOT NULL,
+    chapter_index  INTEGER NOT NULL,
+    lang           TEXT NOT NULL,
+    quality        TEXT NOT NULL,
+    file_id        TEXT NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    message_id     INTEGER,
+    size           INTEGER,
+    created_at     REAL NOT NULL,
+    PRIMARY KEY (book_id, chapter_index, lang, quality)
+);
+CREATE INDEX IF NOT EXISTS files_unique ON files(file_unique_id);
+"""
+
+DEFAULT_QUALITY = "default"
+
+_TAG_RE = re.compile(r"#dracin book=(\S+) ep=(\d+) lang=(\S+) q=(\S+)")
+_QUALITY_RE = re.compile(r"(?<![0-9])(\d{3,4})p(?![a-z])", re.IGNORECASE)
+
+
+def caption_tag(book_id: str, chapter_index: int, lang: str, quality: str) -> str:
+    return f"#dracin book={book_id} ep={chapter_index} lang={lang} q={quality}"
+
+
+def parse_caption(caption: str | None) -> tuple[str, int, str, str] | None:
+    match = _TAG_RE.search(caption or "")
+    if match is None:
+        return None
+    book_id, ep, lang, quality = match.groups()
+    return book_id, int(ep), lang, quality
+
+
+def quality_from_url(url: str) -> str:
+    """``720p``-style marker in a CDN URL, else ``default``."""
+    match = _QUALITY_RE.search(url)
+    return f"{match.group(1)}p" if match else DEFAULT_QUALITY
+
+
+@dataclass(slots=True)
+class IndexedFile:
+    book_id: str
+    chapter_index: int
+    lang: str
+    quality: str
+    file_id: str
+    file_unique_id: str
+    message_id: int | None = None
+    size: int | None = None
+
+
+class FileIndex:
+    def __init__(self, path: str = config.FILE_INDEX_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.hits = self.misses = 0
+        self.entries = 0  # row count as of the last write
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fileindex-db")
+        self._db: sqlite3.Connection = self._executor.submit(self._connect).result()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, timeout=config.SQLITE_BUSY_TIMEOUT)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        self.entries = db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return db
+
+    def _write(self, sql: str, args: tuple) -> None:
+        """Queue a write and the row count after it; failures are logged."""
+        def run() -> None:
+            self._db.execute(sql, args)
+            self.entries = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        self._executor.submit(run).add_done_callback(self._report)
+
+    @staticmethod
+    def _report(done: Future) -> None:
+        if not done.cancelled() and done.exception() is not None:
+            log.error("file index write failed: %r", done.exception())
+
+    async def _run(self, fn: Callable[[], Any]) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    async def get(self, book_id: str, chapter_index: int, lang: str,
+                  quality: str | None = None) -> IndexedFile | None:
+        """Exact ``quality`` match, or the most recent upload of any quality when ``None``."""
+        sql = ("SELECT book_id, chapter_index, lang, quality, file_id, file_unique_id, message_id, size "
+               "FROM files WHERE book_id = ? AND chapter_index = ? AND lang = ?")
+        args: tuple = (str(book_id), int(chapter_index), lang)
+        if quality is not None:
+            sql += " AND quality = ?"
+            args += (quality,)
+        row = await self._run(lambda: self._db.execute(sql + " ORDER BY created_at DESC LIMIT 1", args).fetchone())
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return IndexedFile(*row)
+
+    def put(self, f: IndexedFile) -> None:
+        self._write("INSERT OR REPLACE INTO files (book_id, chapter_index, lang, quality, file_id, file_unique_id, "
+                    "message_id, size, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (f.book_id, f.chapter_index, f.lang, f.quality, f.file_id, f.file_unique_id,
+                     f.message_id, f.size, time.time()))
+
+    def forget(self, file_id: str) -> None:
+        """Drop an entry Telegram no longer accepts."""
+        self._write("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+    def snapshot(self) -> dict:
+        return {"entries": self.entries, "hits": self.hits, "misses": self.misses}
+
+    async def aclose(self) -> None:
+        """Close once the queued writes are done."""
+        await self._run(self._db.close)
+        self._executor.shutdown()
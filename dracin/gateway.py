@@ -0,0 +1,145 @@
+"""restxdb access shared by the HTTP proxy, downloads and the bot.
+
+Every GET goes through the catalog cache (when the endpoint has a TTL) and
+single-flight, so a warm ``/chapters`` list is reused no matter who asks.
+When restxdb fails or its circuit is open, an expired cached copy is served
+rather than an error. With a shared backend, a cacheable miss takes a
+cross-instance lock, so only one instance asks restxdb and the others
+read its answer from the shared cache.
+Drama records in fresh upstream answers are fed to the local search index.
+``chapters`` parses a ``/chapters`` answer into a ``Drama`` once per cached
+response, not on every call.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable
+from urllib.parse import quote
+
+import httpx
+
+from . import config
+from .cache import CachedResponse, TTLCache, cache_key, ttl_for
+from .models import ID_KEYS, Drama, dramas_in, first
+from .search import SearchIndex
+from .singleflight import SingleFlight, flight_key
+from .upstream import Upstream, UpstreamError
+
+# Parsed /chapters answers kept next to the catalog cache.
+PARSED_CHAPTERS = 512
+
+
+class _Uncacheable(Exception):
+    """Carries a non-200 upstream answer out of a cache loader untouched."""
+
+    def __init__(self, response: CachedResponse):
+        self.response = response
+
+
+class Gateway:
+    def __init__(self, upstream: Upstream, cache: TTLCache, flight: SingleFlight,
+                 search_index: SearchIndex | None = None):
+        self.upstream = upstream
+        self.cache = cache
+        self.flight = flight
+        self.search_index = search_index
+        self._chapters: OrderedDict[str, tuple[CachedResponse, Drama | None]] = OrderedDict()
+
+    async def forward(self, method: str, path: str, params: Any = (), body: bytes | None = None,
+                      headers: dict[str, str] | None = None) -> CachedResponse:
+        """Send one request upstream (raises ``httpx.HTTPError`` on transport failure)."""
+        params = list(params.items() if hasattr(params, "items") else params)
+        ttl = ttl_for(path) if method == "GET" else None
+        key = cache_key(path, params)
+
+        async def fetch() -> tuple[CachedResponse, int]:
+            resp = await self.upstream.request(method, path, params=params, content=body, headers=headers)
+            cached = CachedResponse(resp.status_code, resp.content,
+                                    resp.headers.get("content-type", "application/json"))
+            if resp.status_code != 200:
+                raise _Uncacheable(cached)
+            self._ingest(path, params, cached)
+            return cached, len(cached.content)
+
+        async def call() -> tuple[CachedResponse, int]:
+            if ttl is None:
+                return await fetch()
+            async with self.cache.shared.lock(f"GET {key}"):
+                shared = await self.cache.shared_fresh(key)  # another instance may have just fetched it
+                if shared is not None:
+                    self._ingest(path, params, shared)
+                    return shared, len(shared.content)
+                return await fetch()
+
+        def load() -> Awaitable[tuple[CachedResponse, int]]:
+            return self.flight.do(flight_key(method, path, params, body), call)
+
+        try:
+            if ttl is None:
+                return (await load())[0]
+            return await self.cache.fetch(key, load, *ttl)
+        except _Uncacheable as e:
+            if e.response.status >= 500 and ttl is not None:
+                return await self.cache.last_known(key) or e.response
+            return e.response
+        except httpx.HTTPError:
+            # Includes CircuitOpen: an old answer beats an error while restxdb is struggling.
+            last = await self.cache.last_known(key) if ttl is not None else None
+            if last is None:
+                raise
+            return last
+
+    def _ingest(self, path: str, params: list, response: CachedResponse) -> None:
+        if self.search_index is not None:
+            self.search_index.ingest(path, dict(params).get("lang", config.LANG), response.content)
+
+    async def _get(self, path: str, params: Any = ()) -> CachedResponse:
+        try:
+            resp = await self.forward("GET", path, params)
+        except httpx.HTTPError as e:
+            raise UpstreamError(f"GET {path}: {e!r}") from e
+        if resp.status != 200:
+            raise UpstreamError(f"GET {path}: HTTP {resp.status}", resp.status)
+        return resp
+
+    async def get_json(self, path: str, params: Any = ()) -> Any:
+        resp = await self._get(path, params)
+        try:
+            return json.loads(resp.content)
+        except ValueError as e:
+            raise UpstreamError(f"GET {path}: invalid JSON", resp.status) from e
+
+    async def chapters(self, book_id: str, lang: str | None = None) -> Drama | None:
+        """The drama with its ``ChapterTable`` from ``/chapters``, or ``None``."""
+        path, params = f"/chapters/{book_id}", {"lang": lang or config.LANG}
+        resp = await self._get(path, params)
+        key = cache_key(path, params)
+        parsed = self._chapters.get(key)
+        if parsed is not None and parsed[0] is resp:  # the same cached answer as last time
+            self._chapters.move_to_end(key)
+            return parsed[1]
+        try:
+            data = json.loads(resp.content)
+        except ValueError as e:
+            raise UpstreamError(f"GET {path}: invalid JSON", resp.status) from e
+        record = data.get("data") if isinstance(data, dict) else None
+        if isinstance(record, dict) and not first(record, ID_KEYS):
+            record = {**record, "bookId": str(book_id)}  # the payload need not repeat the id asked for
+        drama = Drama.from_record(record)
+        if drama is not None and drama.chapters is None:
+            drama = None
+        self._chapters[key] = (resp, drama)
+        self._chapters.move_to_end(key)
+        while len(self._chapters) > PARSED_CHAPTERS:
+            self._chapters.popitem(last=False)
+        return drama
+
+    async def search(self, query: str, lang: str | None = None) -> list[Drama]:
+        """First page of results: the local index, else upstream ``/search``."""
+        lang = lang or config.LANG
+        if self.search_index is not None:
+            await self.search_index.load()
+            found = self.search_index.search(query, lang)
+            if found is not None:
+                return found
+        return list(dramas_in(await self.get_json(f"/search/{quote(query, safe='')}/1", {"lang": lang})))
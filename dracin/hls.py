@@ -0,0 +1,208 @@
+"""HLS (``.m3u8``) playlists -> one continuous media stream.
+
+Segments are fetched in parallel inside a sliding window and emitted in
+playlist order, so memory holds at most ``concurrency`` segments. MPEG-TS
+segments concatenate into a valid ``.ts`` file; fMP4 segments behind an
+``EXT-X-MAP`` init section concatenate into a fragmented ``.mp4``. Either
+way no remux (and no ffmpeg) is needed.
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from . import config
+from .upstream import Upstream
+
+log = logging.getLogger(__name__)
+
+PLAYLIST_CONTENT_TYPES = ("application/vnd.apple.mpegurl", "application/x-mpegurl", "audio/mpegurl",
+                          "audio/x-mpegurl")
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class HLSError(Exception):
+    """The playlist cannot be turned into a plain media stream."""
+
+
+@dataclass(slots=True)
+class Variant:
+    uri: str
+    bandwidth: int = 0
+    height: int = 0
+
+
+@dataclass(slots=True)
+class Segment:
+    uri: str
+    duration: float = 0.0
+    byterange: tuple[int, int] | None = None  # (offset, length)
+
+    def headers(self) -> dict[str, str] | None:
+        if self.byterange is None:
+            return None
+        start, length = self.byterange
+        return {"Range": f"bytes={start}-{start + length - 1}"}
+
+
+@dataclass
+class MediaPlaylist:
+    url: str
+    segments: list[Segment] = field(default_factory=list)
+    init: Segment | None = None
+    encrypted: bool = False
+
+    @property
+    def extension(self) -> str:
+        return "mp4" if self.init is not None else "ts"
+
+    @property
+    def duration(self) -> float:
+        return sum(s.duration for s in self.segments)
+
+
+def is_hls_url(url: str) -> bool:
+    return urlsplit(url).path.lower().endswith(".m3u8")
+
+
+def is_hls_response(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").split(";")[0].strip().lower() in PLAYLIST_CONTENT_TYPES
+
+
+def parse_attributes(text: str) -> dict[str, str]:
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(text)}
+
+
+def _byterange(value: str, next_offset: int) -> tuple[int, int]:
+    length, _, offset = value.partition("@")
+    return (int(offset) if offset else next_offset), int(length)
+
+
+def parse_playlist(text: str, url: str) -> list[Variant] | MediaPlaylist:
+    """Variants of a master playlist, or the segments of a media playlist."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise HLSError("not an M3U8 playlist")
+    try:
+        return _parse_lines(lines, url)
+    except (KeyError, ValueError) as e:  # a bad number, or a tag without its required attribute
+        raise HLSError(f"malformed playlist: {e!r}") from e
+
+
+def _parse_lines(lines: list[str], url: str) -> list[Variant] | MediaPlaylist:
+    if any(line.startswith("#EXT-X-STREAM-INF") for line in lines):
+        variants, pending = [], None
+        for line in lines:
+            if line.startswith("#EXT-X-STREAM-INF:"):
+                pending = parse_attributes(line.split(":", 1)[1])
+            elif pending is not None and not line.startswith("#"):
+                height = pending.get("RESOLUTION", "x0").partition("x")[2]
+                variants.append(Variant(urljoin(url, line), int(pending.get("BANDWIDTH", 0) or 0),
+                                        int(height) if height.isdigit() else 0))
+                pending = None
+        return variants
+
+    playlist = MediaPlaylist(url)
+    duration, byterange, next_offset = 0.0, None, 0
+    for line in lines:
+        if line.startswith("#EXTINF:"):
+            duration = float(line[8:].split(",", 1)[0] or 0)
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            byterange = _byterange(line.split(":", 1)[1], next_offset)
+        elif line.startswith("#EXT-X-MAP:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            init_range = _byterange(attrs["BYTERANGE"], 0) if "BYTERANGE" in attrs else None
+            playlist.init = Segment(urljoin(url, attrs["URI"]), byterange=init_range)
+        elif line.startswith("#EXT-X-KEY:"):
+            method = parse_attributes(line.split(":", 1)[1]).get("METHOD", "NONE")
+            playlist.encrypted = playlist.encrypted or method != "NONE"
+        elif not line.startswith("#"):
+            playlist.segments.append(Segment(urljoin(url, line), duration, byterange))
+            if byterange:
+                next_offset = byterange[0] + byterange[1]
+            duration, byterange = 0.0, None
+    return playlist
+
+
+class HLSFetcher:
+    def __init__(self, upstream: Upstream, concurrency: int = config.HLS_SEGMENT_CONCURRENCY,
+                 max_height: int = config.HLS_MAX_HEIGHT, attempts: int = 3):
+        self.upstream = upstream
+        self.concurrency = concurrency
+        self.max_height = max_height
+        self.attempts = attempts
+
+    async def load(self, url: str, text: str | None = None) -> MediaPlaylist:
+        """Fetch ``url`` (unless ``text`` is given) and follow a master playlist to one variant."""
+        for _ in range(3):  # master -> media, with room for one redirecting master
+            if text is None:
+                text = (await self._get(url)).decode("utf-8", "replace")
+            parsed = parse_playlist(text, url)
+            if isinstance(parsed, MediaPlaylist):
+                if parsed.encrypted:
+                    raise HLSError("encrypted HLS streams are not supported")
+                if not parsed.segments:
+                    raise HLSError("media playlist has no segments")
+                return parsed
+            url, text = self.pick(parsed).uri, None
+        raise HLSError("too many nested master playlists")
+
+    def pick(self, variants: list[Variant]) -> Variant:
+        if not variants:
+            raise HLSError("master playlist has no variants")
+        allowed = [v for v in variants if not v.height or v.height <= self.max_height] or variants
+        return max(allowed, key=lambda v: (v.height, v.bandwidth))
+
+    async def stream(self, playlist: MediaPlaylist) -> AsyncIterator[bytes]:
+        """Init section and segments in order, at most ``concurrency`` fetched ahead."""
+        parts = ([playlist.init] if playlist.init else []) + playlist.segments
+        window: list[asyncio.Task] = []
+        try:
+            for seg in parts[:self.concurrency]:
+                window.append(asyncio.create_task(self.fetch_segment(seg)))
+            for i in range(len(parts)):
+                data = await window[0]
+                window.pop(0)
+                ahead = i + self.concurrency
+                if ahead < len(parts):
+                    window.append(asyncio.create_task(self.fetch_segment(parts[ahead])))
+                yield data
+        finally:
+            for task in window:
+                task.cancel()
+            await asyncio.gather(*window, return_exceptions=True)
+
+    async def fetch_segment(self, seg: Segment) -> bytes:
+        for attempt in range(1, self.attempts):
+            try:
+                return await self._get_segment(seg)
+            except httpx.HTTPError as e:
+                log.info("segment %s attempt %d failed: %r", seg.uri, attempt, e)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        return await self._get_segment(seg)
+
+    async def _get_segment(self, seg: Segment) -> bytes:
+        """The segment's bytes; a ``BYTERANGE`` answered with the whole file is cut down to the range."""
+        status, data = await self._fetch(seg.uri, seg.headers())
+        if seg.byterange is None:
+            return data
+        start, length = seg.byterange
+        if status != 206:
+            data = data[start:start + length]
+        if len(data) != length:
+            raise HLSError(f"segment {seg.uri}: {len(data)} bytes for a {length} byte range")
+        return data
+
+    async def _get(self, url: str, headers: dict[str, str] | None = None) -> bytes:
+        return (await self._fetch(url, headers))[1]
+
+    async def _fetch(self, url: str, headers: dict[str, str] | None = None) -> tuple[int, bytes]:
+        async with self.upstream.stream(url, headers=headers) as resp:
+            resp.raise_for_status()
+            return resp.status_code, await resp.aread()
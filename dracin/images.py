@@ -0,0 +1,167 @@
+"""Cover thumbnail proxy with a size-bounded disk cache.
+
+``/img/{size}?src=<cover url>`` fetches a cover once, renders every
+thumbnail size in WebP and JPEG from that one download, and stores them
+under ``IMAGE_CACHE_DIR``. Files are evicted least-recently-used once the
+directory passes ``IMAGE_CACHE_BYTES``; recency survives restarts through
+file mtimes. The URL embeds the source, so responses are immutable.
+
+Only covers from hosts seen in catalog records (or listed in
+``IMAGE_HOSTS``) are fetched, so this is not an open proxy. Pillow is
+optional: without it the original image is cached and served as-is.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import config
+from .diskcache import DiskCache
+from .singleflight import SingleFlight
+from .upstream import Upstream
+
+try:
+    from PIL import Image
+except ImportError:  # optional: serve originals
+    Image = None
+
+log = logging.getLogger(__name__)
+
+# name -> (width, height) box; 2x the CSS size of the grid tile and the detail cover.
+SIZES: dict[str, tuple[int, int]] = {"grid": (240, 360), "detail": (320, 480)}
+FORMATS = {"webp": "image/webp", "jpg": "image/jpeg"}
+WEBP_QUALITY = 75
+JPEG_QUALITY = 80
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="200" height="300" viewBox="0 0 200 300">'
+    '<rect width="200" height="300" fill="#374151"/>'
+    '<text x="100" y="155" fill="#666" font-family="sans-serif" font-size="16" text-anchor="middle">No Image</text>'
+    "</svg>"
+).encode()
+
+
+class ImageUnavailable(Exception):
+    """The source is not allowed or could not be fetched or decoded."""
+
+    def __init__(self, message: str, status: int = 404):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(slots=True)
+class Thumbnail:
+    body: bytes  # read into memory, so eviction cannot pull the file out from under the response
+    content_type: str
+    etag: str
+
+
+def render_variants(data: bytes) -> dict[tuple[str, str], bytes]:
+    """``(size, format) -> bytes`` for every thumbnail of one source image (CPU bound)."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        out = {}
+        for size, box in SIZES.items():
+            thumb = img.copy()
+            thumb.thumbnail(box, Image.LANCZOS)
+            for fmt in FORMATS:
+                buf = io.BytesIO()
+                if fmt == "webp":
+                    thumb.save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+                else:
+                    thumb.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                out[size, fmt] = buf.getvalue()
+        return out
+
+
+class ImageProxy:
+    def __init__(self, upstream: Upstream, allowed_hosts: set[str], cache: DiskCache | None = None):
+        self.upstream = upstream
+        # Shared with the catalog, which adds each cover's host as records arrive.
+        self.allowed_hosts = allowed_hosts
+        self.allowed_hosts.update(h.strip().lower() for h in config.IMAGE_HOSTS.split(",") if h.strip())
+        self.cache = cache if cache is not None else DiskCache(config.IMAGE_CACHE_DIR, config.IMAGE_CACHE_BYTES)
+        self.flight = SingleFlight()
+        self.hits = self.misses = 0
+
+    def allowed(self, src: str) -> bool:
+        parts = urlsplit(src)
+        return parts.scheme in ("http", "https") and (parts.hostname or "").lower() in self.allowed_hosts
+
+    async def thumbnail(self, src: str, size: str, accept: str) -> Thumbnail:
+        if size not in SIZES:
+            raise ImageUnavailable(f"unknown size {size!r}")
+        if not self.allowed(src):
+            raise ImageUnavailable("source host not allowed", 403)
+        key = hashlib.sha1(src.encode()).hexdigest()
+        if Image is None:
+            return await self._original(src, key)
+        fmt = "webp" if "image/webp" in accept else "jpg"
+        body = await self.cache.aread(self.cache.path(f"{key}-{size}", fmt))
+        if body is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            variants = await self.flight.do(f"img {key}", lambda: self._render_all(src, key))
+            body = variants[size, fmt]
+        return Thumbnail(body, FORMATS[fmt], f'"{key}-{size}-{fmt}"')
+
+    async def _render_all(self, src: str, key: str) -> dict[tuple[str, str], bytes]:
+        data, _ = await self._download(src)
+        variants = await asyncio.to_thread(self._render_and_store, src, data, key)
+        self.cache.evict_soon()
+        return variants
+
+    def _render_and_store(self, src: str, data: bytes, key: str) -> dict[tuple[str, str], bytes]:
+        # Runs in a worker thread, so the cache writes stay off the event loop along with the render.
+        try:
+            variants = render_variants(data)
+        except Exception as e:  # Pillow raises a zoo of decoder errors
+            raise ImageUnavailable(f"cannot decode {src}: {e!r}", 502) from e
+        for (size, fmt), body in variants.items():
+            self.cache.put(self.cache.path(f"{key}-{size}", fmt), body)
+        return variants
+
+    async def _original(self, src: str, key: str) -> Thumbnail:
+        for fmt, content_type in (("webp", "image/webp"), ("jpg", "image/jpeg"), ("png", "image/png")):
+            body = await self.cache.aread(self.cache.path(key, fmt))
+            if body is not None:
+                self.hits += 1
+                return Thumbnail(body, content_type, f'"{key}"')
+        self.misses += 1
+        data, content_type = await self.flight.do(f"img {key}", lambda: self._store_original(src, key))
+        return Thumbnail(data, content_type, f'"{key}"')
+
+    async def _store_original(self, src: str, key: str) -> tuple[bytes, str]:
+        data, content_type = await self._download(src)
+        fmt = {"image/webp": "webp", "image/png": "png"}.get(content_type, "jpg")
+        await self.cache.aput(self.cache.path(key, fmt), data)
+        return data, FORMATS.get(fmt, content_type)
+
+    async def _download(self, src: str) -> tuple[bytes, str]:
+        try:
+            async with self.upstream.stream(src) as resp:
+                if resp.status_code != 200:
+                    raise ImageUnavailable(f"{src}: HTTP {resp.status_code}", 502)
+                content_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+                if not content_type.startswith("image/"):
+                    raise ImageUnavailable(f"{src}: not an image ({content_type})", 502)
+                buf = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    buf += chunk
+                    if len(buf) > MAX_SOURCE_BYTES:
+                        raise ImageUnavailable(f"{src}: image too large", 502)
+                return bytes(buf), content_type
+        except httpx.HTTPError as e:
+            raise ImageUnavailable(f"{src}: {e!r}", 502) from e
+
+    def snapshot(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, **self.cache.snapshot(), "resizing": Image is not None}
@@ -0,0 +1,175 @@
+"""SQLite persistence for download jobs and per-episode progress.
+
+Rows are small and written on state changes plus every few MB of transfer.
+As in ``shared.SQLiteState``, one thread owns the connection: reads and
+claims are coroutines, writes nobody waits for are queued fire-and-forget,
+and statements run in the order they were issued, so the event loop never
+waits on the disk or on another instance holding the write lock.
+
+Several instances can share the file. An instance works on a job only
+while it holds the job's lease (``owner`` plus ``lease_until``) and renews
+it periodically. A job whose owner stopped renewing can be claimed by any
+other instance.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    book_id     TEXT NOT NULL,
+    lang        TEXT,
+    title       TEXT NOT NULL DEFAULT '',
+    status      TEXT NOT NULL,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    owner       TEXT,
+    lease_until REAL
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    job_id        TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    position      INTEGER NOT NULL,
+    chapter_index INTEGER NOT NULL,
+    filename      TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    bytes         INTEGER NOT NULL DEFAULT 0,
+    size          INTEGER,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+"""
+
+UNFINISHED = ("queued", "running")
+_UNFINISHED_SQL = f"status IN ({', '.join(repr(s) for s in UNFINISHED)})"
+
+# Columns added after the first release, for files created before them.
+MIGRATIONS = (("owner", "TEXT"), ("lease_until", "REAL"))
+
+
+class JobStore:
+    def __init__(self, path: str = config.JOBS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-db")
+        self._db: sqlite3.Connection = self._executor.submit(self._connect).result()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, timeout=config.SQLITE_BUSY_TIMEOUT)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        db.executescript(SCHEMA)
+        columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+        for name, kind in MIGRATIONS:
+            if name not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        return db
+
+    async def _run(self, fn: Callable[[], Any]) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    async def _fetchone(self, sql: str, args: Iterable = ()) -> sqlite3.Row | None:
+        return await self._run(lambda: self._db.execute(sql, tuple(args)).fetchone())
+
+    async def _fetchall(self, sql: str, args: Iterable = ()) -> list[sqlite3.Row]:
+        return await self._run(lambda: self._db.execute(sql, tuple(args)).fetchall())
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        """Queue a write without waiting for it; failures are logged."""
+        self._executor.submit(fn, *args).add_done_callback(self._report)
+
+    @staticmethod
+    def _report(done: Future) -> None:
+        if not done.cancelled() and done.exception() is not None:
+            log.error("download job write failed: %r", done.exception())
+
+    def _execute(self, sql: str, args: Iterable = ()) -> None:
+        self._submit(self._db.execute, sql, tuple(args))
+
+    def create_job(self, job_id: str, book_id: str, lang: str | None, status: str = "queued") -> None:
+        now = time.time()
+        self._execute("INSERT INTO jobs (id, book_id, lang, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                      (job_id, book_id, lang, status, now, now))
+
+    def update_job(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self._execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def add_episodes(self, job_id: str, episodes: Iterable[tuple[int, int, str]]) -> None:
+        rows = [(job_id, *ep) for ep in episodes]
+
+        def run() -> None:
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO episodes (job_id, position, chapter_index, filename) VALUES (?, ?, ?, ?)",
+                    rows)
+        self._submit(run)
+
+    def save_episode(self, job_id: str, position: int, filename: str, status: str, bytes_: int,
+                     size: int | None, attempts: int, error: str | None) -> None:
+        self._execute("UPDATE episodes SET filename = ?, status = ?, bytes = ?, size = ?, attempts = ?, error = ? "
+                      "WHERE job_id = ? AND position = ?",
+                      (filename, status, bytes_, size, attempts, error, job_id, position))
+
+    async def job(self, job_id: str) -> sqlite3.Row | None:
+        return await self._fetchone("SELECT * FROM jobs WHERE id = ?", (job_id,))
+
+    async def episodes(self, job_id: str) -> list[sqlite3.Row]:
+        return await self._fetchall("SELECT * FROM episodes WHERE job_id = ? ORDER BY position", (job_id,))
+
+    async def claimable(self) -> list[sqlite3.Row]:
+        """Unfinished jobs no live instance holds, oldest first."""
+        return await self._fetchall(f"SELECT * FROM jobs WHERE {_UNFINISHED_SQL} "
+                                    "AND (owner IS NULL OR lease_until < ?) ORDER BY created_at", (time.time(),))
+
+    async def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """Take (or keep) an unfinished job for ``lease`` seconds; ``False`` if another instance holds it."""
+        now = time.time()
+        sql = (f"UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ? AND {_UNFINISHED_SQL} "
+               "AND (owner IS NULL OR owner = ? OR lease_until < ?)")
+        args = (owner, now + lease, job_id, owner, now)
+        return await self._run(lambda: self._db.execute(sql, args).rowcount) == 1
+
+    def renew(self, owner: str, lease: float) -> None:
+        self._execute(f"UPDATE jobs SET lease_until = ? WHERE owner = ? AND {_UNFINISHED_SQL}",
+                      (time.time() + lease, owner))
+
+    def release(self, owner: str, job_id: str | None = None) -> None:
+        """Give up one job, or every job ``owner`` holds."""
+        if job_id is None:
+            self._execute("UPDATE jobs SET owner = NULL, lease_until = NULL WHERE owner = ?", (owner,))
+        else:
+            self._execute("UPDATE jobs SET owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                          (job_id, owner))
+
+    async def prune(self, older_than: float) -> list[str]:
+        """Delete finished jobs last touched before ``older_than``; returns their ids."""
+        def run() -> list[str]:
+            rows = self._db.execute(f"SELECT id FROM jobs WHERE updated_at < ? AND NOT {_UNFINISHED_SQL}",
+                                    (older_than,)).fetchall()
+            ids = [r["id"] for r in rows]
+            for job_id in ids:
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            return ids
+        return await self._run(run)
+
+    async def aclose(self) -> None:
+        """Close once the queued writes are done."""
+        await self._run(self._db.close)
+        self._executor.shutdown()
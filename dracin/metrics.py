@@ -0,0 +1,241 @@
+"""Prometheus metrics and optional request traces.
+
+Hot-path metrics are module-level objects updated where the work happens
+(``UPSTREAM_SECONDS.observe(...)``). Counters that components already
+keep for their ``snapshot()`` are read at scrape time through
+``collected()`` callbacks instead of being counted twice. ``render()``
+writes the Prometheus text format, so no client library is needed.
+
+Tracing is off unless ``TRACE_SAMPLE_RATE`` > 0. A sampled web request
+carries a trace in a context variable; ``span()`` blocks run inside it
+(upstream calls, CDN fetches, video resolution) are recorded with their
+offsets and durations, and the last ``TRACE_KEEP`` traces are kept for
+``/traces``.
+"""
+
+import contextlib
+import logging
+import random
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator
+
+from . import config, startup
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY: dict[str, "Metric"] = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        REGISTRY[name] = self
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        """``(name suffix, rendered labels, value)`` per sample line."""
+        return ()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{suffix}{labels} {_number(value)}" for suffix, labels, value in self.samples()]
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        for labels, value in list(self._values.items()):
+            yield "", _labels(self.labelnames, labels), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                yield "_bucket", _labels(self.labelnames, labels, (("le", _number(bound)),)), cumulative
+            yield "_sum", _labels(self.labelnames, labels), series[-1]
+            yield "_count", _labels(self.labelnames, labels), cumulative
+
+
+class Collected(Metric):
+    """Values read at scrape time: ``collect()`` yields ``(label values, value)`` pairs."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: tuple[str, ...],
+                 collect: Callable[[], Iterable[tuple[tuple, float]]]):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        try:
+            values = list(self.collect())
+        except Exception:
+            log.exception("metric collector %s failed", self.name)
+            return
+        for labels, value in values:
+            yield "", _labels(self.labelnames, tuple(labels)), value
+
+
+def collected(name: str, documentation: str, kind: str, labelnames: tuple[str, ...],
+              collect: Callable[[], Iterable[tuple[tuple, float]]]) -> Collected:
+    """Register (or replace) a scrape-time metric."""
+    return Collected(name, documentation, kind, labelnames, collect)
+
+
+def render() -> str:
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ---- metrics updated on the hot paths
+
+HTTP_SECONDS = Histogram("dracin_http_request_seconds", "Web request latency by route and status class.",
+                         ("route", "status"))
+UPSTREAM_SECONDS = Histogram("dracin_upstream_request_seconds", "restxdb call latency by endpoint.",
+                             ("endpoint", "method", "status"))
+DOWNLOAD_BYTES = Counter("dracin_download_bytes_total", "Episode bytes downloaded from the video CDN.")
+TELEGRAM_SEND_SECONDS = Histogram("dracin_telegram_send_seconds",
+                                  "Bot API call latency, including scheduler wait and flood-limit retries.",
+                                  ("method", "lane"))
+TELEGRAM_RETRY_AFTER = Counter("dracin_telegram_retry_after_total", "Bot API 429 (RetryAfter) answers.",
+                               ("method",))
+
+
+# ---- traces
+
+_current: ContextVar["Trace | None"] = ContextVar("dracin_trace", default=None)
+TRACES: deque[dict] = deque(maxlen=config.TRACE_KEEP)
+
+
+class Trace:
+    __slots__ = ("id", "name", "started_at", "t0", "spans", "finished")
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: list[dict] = []
+        self.finished = False  # background tasks started by the request inherit it; their late spans are dropped
+
+
+def begin_trace(name: str, sample_rate: float = config.TRACE_SAMPLE_RATE) -> Any:
+    """Start a trace for this request if it is sampled; returns a token for ``end_trace``."""
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    trace = Trace(name)
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Any, **attrs: Any) -> None:
+    if token is None:
+        return
+    trace, reset = token
+    _current.reset(reset)
+    trace.finished = True
+    TRACES.append({"id": trace.id, "name": trace.name, "started_at": trace.started_at,
+                   "duration_ms": round((time.perf_counter() - trace.t0) * 1000, 2), **attrs,
+                   "spans": trace.spans})
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Time a block as a span of the current trace; a no-op outside sampled requests."""
+    trace = _current.get()
+    if trace is None or trace.finished:
+        yield
+        return
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        trace.spans.append({"name": name, "offset_ms": round((started - trace.t0) * 1000, 2),
+                            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                            **attrs, **({"error": error} if error else {})})
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route latency histogram and, when sampled, a trace per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        token = begin_trace(f"{scope['method']} {scope['path']}")
+        status = 500
+
+        async def send_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The router leaves the matched endpoint in the scope; its name keeps label cardinality fixed.
+            route = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            HTTP_SECONDS.observe(time.perf_counter() - started, route, f"{status // 100}xx")
+            end_trace(token, route=route, status=status)
+            startup.mark("first_request")
@@ -0,0 +1,138 @@
+"""Normalized drama records.
+
+restxdb names the same field differently depending on the endpoint
+(``bookName``/``name``/``title``, ``cover``/``coverWap``, ``bookId``/``id``,
+``chapterCount``/``seriesCount``). ``Drama.from_record`` resolves those
+aliases once, when a response is ingested, into a slotted object; a
+``chapterList`` becomes a ``ChapterTable`` of parallel typed arrays instead
+of one dict per episode. ``to_record`` gives back the canonical JSON shape.
+"""
+
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+ID_KEYS = ("bookId", "id")
+TITLE_KEYS = ("bookName", "name", "title")
+COVER_KEYS = ("cover", "coverWap")
+COUNT_KEYS = ("chapterCount", "seriesCount")
+CHAPTER_INDEX_KEYS = ("chapterIndex", "index")
+CHAPTER_ID_KEYS = ("chapterId", "id")
+DURATION_KEYS = ("duration", "videoDuration", "playTime")
+
+
+def first(record: dict, keys: tuple[str, ...], default: Any = None) -> Any:
+    """The first truthy value among ``keys`` (alias resolution)."""
+    for key in keys:
+        value = record.get(key)
+        if value:
+            return value
+    return default
+
+
+def _number(value: Any, default: float = 0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ChapterTable:
+    """Episodes of one drama as columns: ``chapterIndex``, duration (s) and chapter id.
+
+    Ids are kept in a signed 64-bit array when they are all numeric (the
+    usual case) and as a tuple of strings otherwise.
+    """
+
+    __slots__ = ("index", "duration", "ids")
+
+    def __init__(self, index: array, duration: array, ids: array | tuple[str, ...]):
+        self.index = index
+        self.duration = duration
+        self.ids = ids
+
+    @classmethod
+    def from_list(cls, chapters: Any) -> "ChapterTable":
+        chapters = chapters if isinstance(chapters, list) else []
+        index, duration, ids = array("i"), array("f"), []
+        for position, ch in enumerate(chapters):
+            ch = ch if isinstance(ch, dict) else {}
+            index.append(int(_number(first(ch, CHAPTER_INDEX_KEYS, position), position)))
+            duration.append(_number(first(ch, DURATION_KEYS, 0)))
+            ids.append(str(first(ch, CHAPTER_ID_KEYS, "")))
+        try:
+            packed: array | tuple[str, ...] = array("q", (int(i) for i in ids))
+        except (ValueError, OverflowError):
+            packed = tuple(ids)
+        return cls(index, duration, packed)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index)
+
+    def to_list(self) -> list[dict]:
+        return [{"chapterIndex": idx, "chapterId": str(cid), "duration": dur}
+                for idx, cid, dur in zip(self.index, self.ids, self.duration)]
+
+
+@dataclass(slots=True)
+class Drama:
+    book_id: str
+    title: str = ""
+    cover: str = ""
+    introduction: str = ""
+    chapter_count: int = 0
+    tags: tuple[str, ...] = ()
+    chapters: ChapterTable | None = None
+
+    @classmethod
+    def from_record(cls, record: Any) -> "Drama | None":
+        """Resolve a raw restxdb record; ``None`` when it has no id."""
+        if not isinstance(record, dict):
+            return None
+        book_id = first(record, ID_KEYS)
+        if not book_id:
+            return None
+        chapters = ChapterTable.from_list(record["chapterList"]) if "chapterList" in record else None
+        tags = record.get("tags") or ()
+        return cls(
+            book_id=str(book_id),
+            title=str(first(record, TITLE_KEYS, "")),
+            cover=str(first(record, COVER_KEYS, "")),
+            introduction=str(record.get("introduction") or ""),
+            chapter_count=int(_number(first(record, COUNT_KEYS, 0))) or (len(chapters) if chapters else 0),
+            # Tag vocabularies are tiny and shared by thousands of dramas.
+            tags=tuple(sys.intern(t) for t in tags if isinstance(t, str)) if isinstance(tags, list) else (),
+            chapters=chapters,
+        )
+
+    def merge(self, other: "Drama") -> None:
+        """Take every non-empty field of a newer record for the same drama."""
+        for name in ("title", "cover", "introduction", "chapter_count", "tags", "chapters"):
+            value = getattr(other, name)
+            if value:
+                setattr(self, name, value)
+
+    def to_record(self, chapters: bool = False) -> dict:
+        """Canonical JSON, in the field names the page reads first."""
+        record = {"bookId": self.book_id, "bookName": self.title, "cover": self.cover,
+                  "introduction": self.introduction, "chapterCount": self.chapter_count}
+        if self.tags:
+            record["tags"] = list(self.tags)
+        if chapters and self.chapters is not None:
+            record["chapterList"] = self.chapters.to_list()
+        return record
+
+
+def dramas_in(payload: Any) -> Iterator[Drama]:
+    """Dramas in a restxdb envelope: ``data.list[]``, ``data[]`` or ``data`` itself."""
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if isinstance(data, dict) and isinstance(data.get("list"), list):
+        data = data["list"]
+    for item in data if isinstance(data, list) else [data]:
+        drama = Drama.from_record(item)
+        if drama is not None and drama.title:
+            yield drama
@@ -0,0 +1,189 @@
+"""Server-rendered home and drama pages, precompressed, with ETags.
+
+The page shell (``static/index.html``) has two placeholders: ``<!--APP-->``
+inside ``<main id="app">`` and ``/*PRELOAD*/null`` in the script. The home
+page is filled with the Rekomendasi/Populer/Terbaru grids and a drama page
+with its detail view, using the same markup the page's ``grid()`` and
+``openDrama()`` produce, so the browser paints without any API round trip
+and only hydrates ``state`` from the preload JSON.
+
+A rendered page keeps identity, gzip and brotli bodies in memory under
+one strong ETag. ``brotli`` is in requirements.txt; where its wheel is
+missing, pages are served with gzip only.
+"""
+
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from html import escape
+from urllib.parse import quote
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .models import Drama
+
+try:
+    import brotli
+except ImportError:  # no wheel for this platform: gzip only
+    brotli = None
+
+APP_PLACEHOLDER = "<!--APP-->"
+PRELOAD_PLACEHOLDER = "/*PRELOAD*/null"
+
+# Characters JavaScript's encodeURIComponent leaves alone.
+_URI_COMPONENT_SAFE = "-_.!~*'()"
+
+# Rendered pages expire and render again, so they get quick settings; the
+# page shell, built once at import, passes the slowest, smallest ones.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+NO_IMAGE = "/img/placeholder.svg"
+PLAY_ICON = '<svg class="w-6 h-6 ml-1" fill="currentColor" viewBox="0 0 24 24"><path d="M8 5v14l11-7z"/></svg>'
+
+
+@dataclass(slots=True)
+class Page:
+    body: bytes
+    etag: str
+    gzip: bytes
+    br: bytes | None = None
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip) + len(self.br or b"")
+
+    def respond(self, request: Request, cache_control: str = "no-cache") -> Response:
+        """The best encoding the client accepts, or 304 when its ETag still matches."""
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding", "Cache-Control": cache_control}
+        if etag_matches(request.headers.get("if-none-match", ""), self.etag):
+            return Response(status_code=304, headers=headers)
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        body = self.body
+        if self.br is not None and "br" in accepted:
+            body, headers["Content-Encoding"] = self.br, "br"
+        elif "gzip" in accepted:
+            body, headers["Content-Encoding"] = self.gzip, "gzip"
+        return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+
+def build_page(html: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> Page:
+    body = html.encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    return Page(body, etag, gzip.compress(body, gzip_level, mtime=0),
+                brotli.compress(body, quality=brotli_quality) if brotli is not None else None)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def fill(shell: str, app_html: str, preload: dict | None) -> str:
+    data = json.dumps(preload, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    return shell.replace(APP_PLACEHOLDER, app_html, 1).replace(PRELOAD_PLACEHOLDER, data, 1)
+
+
+# ---- markup (mirrors dramaCard/grid/goHome/renderDrama in index.html)
+
+def _attr(value: str) -> str:
+    return escape(value, quote=True)
+
+
+def thumb_url(cover: str, size: str) -> str:
+    """Same URL as the page's ``thumb()``, so server and client renders share cache entries."""
+    return f"/img/{size}?src={quote(cover, safe=_URI_COMPONENT_SAFE)}" if cover else NO_IMAGE
+
+
+def drama_card(d: Drama, rank: int | None = None) -> str:
+    badge = ""
+    if rank is not None:
+        color = "bg-yellow-500" if rank < 3 else "bg-gray-900/80"
+        badge = (f'<div class="absolute top-1 left-1 z-10 w-6 h-6 {color} rounded flex items-center '
+                 f'justify-center text-xs font-bold">{rank + 1}</div>')
+    title = escape(d.title or "Untitled")
+    return (
+        f'<div data-id="{_attr(d.book_id)}" onclick="openDrama(this.dataset.id)" class="cursor-pointer group">'
+        f'<div class="relative rounded-lg overflow-hidden bg-gray-800">{badge}'
+        f'<img src="{_attr(thumb_url(d.cover, "grid"))}" alt="{title}" loading="lazy" class="w-full aspect-[2/3] '
+        f'object-cover group-hover:scale-105 transition-transform duration-300" onerror="this.src=NO_IMAGE">'
+        '<div class="absolute inset-0 bg-gradient-to-t from-black/80 to-transparent opacity-0 '
+        'group-hover:opacity-100 transition-opacity flex items-center justify-center">'
+        f'<div class="w-12 h-12 rounded-full bg-purple-500 flex items-center justify-center">{PLAY_ICON}</div>'
+        '</div>'
+        '<div class="absolute bottom-0 left-0 right-0 p-2 bg-gradient-to-t from-black to-transparent">'
+        f'<h3 class="text-sm font-medium line-clamp-2">{title}</h3>'
+        f'<p class="text-xs text-gray-400">{d.chapter_count} Episode</p>'
+        '</div></div></div>'
+    )
+
+
+def grid(items: list[Drama], with_rank: bool = False) -> str:
+    if not items:
+        return '<p class="text-gray-500 text-center py-10">Tidak ada data</p>'
+    cards = "".join(drama_card(d, i if with_rank else None) for i, d in enumerate(items))
+    return f'<div class="grid grid-cols-3 sm:grid-cols-4 md:grid-cols-5 lg:grid-cols-6 gap-3">{cards}</div>'
+
+
+def _section(title: str, element_id: str, body: str) -> str:
+    return (f'<section><h2 class="text-lg font-bold mb-3 flex items-center gap-2">{title}</h2>'
+            f'<div id="{element_id}">{body}</div></section>')
+
+
+def home_html(recommended: list[Drama], popular: list[Drama], latest: list[Drama]) -> str:
+    return ('<div class="space-y-8">'
+            + _section("⭐ Rekomendasi", "secRecommend", grid(recommended[:12]))
+            + _section("🔥 Populer", "secPopular", grid(popular[:6], True))
+            + _section("🕐 Terbaru", "secNew", grid(latest[:12]))
+            + "</div>")
+
+
+def drama_html(d: Drama) -> str:
+    title, cover = escape(d.title or "Untitled"), _attr(thumb_url(d.cover, "detail"))
+    count = len(d.chapters) if d.chapters is not None else 0
+    back = ('<button onclick="goHome()" class="text-purple-400 hover:underline mb-4 flex items-center gap-1">'
+            '<svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" '
+            'stroke-linejoin="round" stroke-width="2" d="M15 19l-7-7 7-7"/></svg>Kembali</button>')
+    if count:
+        actions = (
+            '<button onclick="playEp(0)" class="px-4 py-2 bg-purple-600 hover:bg-purple-700 rounded-lg font-medium '
+            'flex items-center gap-2"><svg class="w-4 h-4" fill="currentColor" viewBox="0 0 24 24">'
+            '<path d="M8 5v14l11-7z"/></svg>Tonton</button>'
+            '<button onclick="startDownload()" class="px-4 py-2 bg-green-600 hover:bg-green-700 rounded-lg '
+            'font-medium flex items-center gap-2"><svg class="w-4 h-4" fill="none" stroke="currentColor" '
+            'viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" '
+            'd="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4"/></svg>'
+            f'Download ZIP ({count} EP)</button>')
+        buttons = "".join(
+            f'<button onclick="playEp({i})" class="aspect-square rounded-lg bg-gray-700 hover:bg-purple-600 flex '
+            f'items-center justify-center text-sm font-medium transition">{i + 1}</button>' for i in range(count))
+        episodes = ('<div class="bg-gray-800 rounded-xl p-4"><h2 class="font-bold mb-3">Daftar Episode</h2>'
+                    f'<div class="grid grid-cols-8 sm:grid-cols-10 md:grid-cols-12 gap-2">{buttons}</div></div>')
+    else:
+        actions, episodes = '<p class="text-gray-500">Tidak ada episode</p>', ""
+    return (
+        back
+        + '<div class="bg-gray-800 rounded-xl p-4 mb-4"><div class="flex gap-4">'
+        f'<img src="{cover}" alt="{title}" class="w-32 rounded-lg object-cover" onerror="this.src=NO_IMAGE">'
+        '<div class="flex-1">'
+        f'<h1 class="text-xl font-bold mb-2">{title}</h1>'
+        f'<p class="text-sm text-gray-400 mb-3 line-clamp-2">{escape(d.introduction)}</p>'
+        f'<p class="text-sm text-gray-400 mb-4">📺 {count} Episode</p>'
+        f'<div class="flex flex-wrap gap-2">{actions}</div>'
+        '</div></div></div>'
+        + episodes
+    )
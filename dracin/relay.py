@@ -0,0 +1,495 @@
+"""Byte-range video relay for the player, backed by a shared disk cache.
+
+``/play/{bookId}/{chapterIndex}/video`` serves a progressive episode with
+HTTP Range support. The file is pulled from the CDN in fixed
+``RELAY_BLOCK_BYTES`` blocks, aligned so that every viewer asks for the
+same blocks, and each block is kept in a ``DiskCache`` under a key derived
+from the episode rather than the signed URL, which changes every few
+minutes. HLS episodes get a rewritten ``index.m3u8`` whose segments point
+back at ``seg/{n}`` and are cached the same way.
+
+When a viewer starts an episode, the first blocks or segments of the next
+one are fetched in the background so auto-advance starts warm.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import config
+from .diskcache import DiskCache
+from .downloads import EXPIRED_URL_STATUSES
+from .gateway import Gateway
+from .hls import HLSError, HLSFetcher, MediaPlaylist, Segment, is_hls_url
+from .resolver import VideoResolver
+from .singleflight import SingleFlight
+from .upstream import Upstream, UpstreamError
+
+log = logging.getLogger(__name__)
+
+RELAY_CACHE_CONTROL = "public, max-age=3600"
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+MAX_REMEMBERED = 4096  # episodes whose size / playlist is kept in memory
+
+
+class RelayError(Exception):
+    """The episode cannot be relayed; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 502):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True, slots=True)
+class EpisodeRef:
+    book_id: str
+    chapter_index: int
+    lang: str
+
+    @property
+    def key(self) -> str:
+        return hashlib.sha1(f"{self.book_id}/{self.chapter_index}/{self.lang}".encode()).hexdigest()
+
+
+@dataclass(slots=True)
+class Media:
+    """Size and type of a progressive episode file."""
+
+    size: int
+    content_type: str
+    ranges: bool = True  # False once the CDN answered a Range request with the whole file
+
+
+class _Arrivals:
+    """Blocks of one CDN download, handed to waiters as the body streams past them."""
+
+    def __init__(self):
+        self.passed = 0  # blocks before this one went by already
+        self._latest: tuple[int, bytes] | None = None  # arrived, maybe not stored yet
+        self._waiting: dict[int, asyncio.Future[bytes]] = {}
+
+    def want(self, n: int) -> asyncio.Future[bytes] | None:
+        """A future for block ``n``; ``None`` when this download is already past it."""
+        if n < self.passed:
+            return None
+        if self._latest is not None and self._latest[0] == n:
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(self._latest[1])
+            return fut
+        fut = self._waiting.get(n)
+        if fut is None:
+            fut = self._waiting[n] = asyncio.get_running_loop().create_future()
+        return fut
+
+    def arrived(self, n: int, data: bytes) -> None:
+        self._latest = (n, data)
+        fut = self._waiting.pop(n, None)
+        if fut is not None and not fut.done():
+            fut.set_result(data)
+
+    def stored(self, n: int) -> None:
+        """Block ``n`` is in the cache now, so later requests for it read it there."""
+        self.passed = n + 1
+        self._latest = None
+
+    def close(self, error: BaseException | None = None) -> int:
+        """Settle every block still waited for: ``error``, or empty when the body ended first."""
+        waiting, self._waiting = self._waiting, {}
+        self.passed = 1 << 62  # nothing more comes from this download
+        self._latest = None
+        for fut in waiting.values():
+            if fut.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                fut.cancel()
+            elif error is not None:
+                fut.set_exception(error)
+                fut.exception()  # its waiter may be gone; do not warn about it
+            else:
+                fut.set_result(b"")
+        return len(waiting)
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """First and last byte of a single ``bytes=`` range; ``None`` means the whole file.
+
+    Raises ``RelayError`` (416) when the range starts past the end.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # unknown units and multi-range requests get the whole file
+    first, sep, last = spec.strip().partition("-")
+    try:
+        if not sep:
+            return None
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RelayError("empty suffix range", 416)
+            return max(0, size - suffix), size - 1
+        start, end = int(first), int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RelayError("range starts past the end", 416)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def local_playlist(playlist: MediaPlaylist, query: str = "") -> str:
+    """The media playlist with every segment pointing back at this relay."""
+    target = math.ceil(max((s.duration for s in playlist.segments), default=0))
+    lines = ["#EXTM3U", f"#EXT-X-VERSION:{6 if playlist.init is not None else 3}",
+             f"#EXT-X-TARGETDURATION:{target}", "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    if playlist.init is not None:
+        lines.append(f'#EXT-X-MAP:URI="seg/init{query}"')
+    for n, seg in enumerate(playlist.segments):
+        lines += [f"#EXTINF:{seg.duration:.3f},", f"seg/{n}{query}"]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def segment_at(playlist: MediaPlaylist, part: str) -> Segment:
+    if part == "init" and playlist.init is not None:
+        return playlist.init
+    if part.isdigit() and int(part) < len(playlist.segments):
+        return playlist.segments[int(part)]
+    raise RelayError(f"no segment {part!r}", 404)
+
+
+class VideoRelay:
+    def __init__(self, upstream: Upstream, resolver: VideoResolver, gateway: Gateway,
+                 cache: DiskCache | None = None, block_bytes: int = config.RELAY_BLOCK_BYTES,
+                 readahead: int = config.RELAY_READAHEAD, prefetch_bytes: int = config.RELAY_PREFETCH_BYTES,
+                 prefetch_segments: int = config.RELAY_PREFETCH_SEGMENTS,
+                 prefetch_concurrency: int = config.RELAY_PREFETCH_CONCURRENCY):
+        self.upstream = upstream
+        self.resolver = resolver
+        self.gateway = gateway
+        self.cache = cache if cache is not None else DiskCache(config.RELAY_CACHE_DIR, config.RELAY_CACHE_BYTES)
+        # One attempt per segment: an expired link is re-resolved here, other errors are the player's to retry.
+        self.hls = HLSFetcher(upstream, attempts=1)
+        self.flight = SingleFlight()
+        self.block_bytes = block_bytes
+        self.readahead = readahead
+        self.prefetch_bytes = prefetch_bytes
+        self.prefetch_segments = prefetch_segments
+        self.hits = self.misses = self.prefetched = 0
+        self.bytes_served = self.bytes_fetched = 0
+        self._prefetch_slots = asyncio.Semaphore(prefetch_concurrency)
+        self._prefetching: dict[EpisodeRef, asyncio.Task] = {}
+        self._pulls: set[asyncio.Task] = set()
+        self._whole: dict[str, _Arrivals] = {}  # running full-file downloads by episode key
+        self._media: OrderedDict[str, Media] = OrderedDict()
+        self._playlists: OrderedDict[str, tuple[str, MediaPlaylist]] = OrderedDict()
+
+    async def source_url(self, ep: EpisodeRef) -> str:
+        url = await self.resolver.resolve(ep.book_id, ep.chapter_index, ep.lang)
+        if not url:
+            busy = self.upstream.guards["watch"].breaker.is_open
+            raise RelayError("video service busy" if busy else "video not found", 503 if busy else 404)
+        return url
+
+    def _expire(self, ep: EpisodeRef) -> None:
+        self.resolver.invalidate(ep.book_id, ep.chapter_index, ep.lang)
+        self._playlists.pop(ep.key, None)
+
+    @staticmethod
+    def _remember(store: OrderedDict, key: str, value) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > MAX_REMEMBERED:
+            store.popitem(last=False)
+
+    # ---- progressive files
+
+    async def media(self, ep: EpisodeRef) -> Media:
+        """Size and type of the episode, learned from its first block when not known yet."""
+        media = self._media.get(ep.key) or await self._load_media(ep.key)
+        if media is None:
+            await self.flight.do(f"block {ep.key}/0", lambda: self._fetch_block(ep, 0))
+            media = self._media.get(ep.key)
+            if media is None:
+                raise RelayError("CDN did not report the file size")
+        return media
+
+    async def _load_media(self, key: str) -> Media | None:
+        raw = await self.cache.aread(self.cache.path(key, "json"))
+        if raw is None:
+            return None
+        try:
+            media = Media(**json.loads(raw))
+        except (ValueError, TypeError):
+            return None
+        self._remember(self._media, key, media)
+        return media
+
+    async def _learn(self, key: str, size: int, content_type: str, ranges: bool) -> Media:
+        media = self._media.get(key)
+        if media is None or media.size != size or media.ranges != ranges:
+            media = Media(size, content_type, ranges)
+            self._remember(self._media, key, media)
+            meta = json.dumps({"size": size, "content_type": content_type, "ranges": ranges}).encode()
+            await self.cache.aput(self.cache.path(key, "json"), meta)
+        return media
+
+    def _block_path(self, ep: EpisodeRef, media: Media, n: int) -> str:
+        # The size is part of the key so a re-encoded episode never mixes with old blocks.
+        return self.cache.path(f"{ep.key}-{media.size}-{n}", "bin")
+
+    async def block(self, ep: EpisodeRef, media: Media, n: int) -> bytes:
+        path = self._block_path(ep, media, n)
+        data = await self.cache.aread(path)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        if not media.ranges:
+            return await self._whole_block(ep, n, path)
+        return await self.flight.do(f"block {ep.key}/{n}", lambda: self._fetch_block(ep, n))
+
+    async def _whole_block(self, ep: EpisodeRef, n: int, path: str) -> bytes:
+        """Block ``n`` when every request is a full-file GET.
+
+        Waits for the episode's one running download if it has not passed
+        block ``n`` yet, otherwise starts one that the following blocks can share.
+        """
+        running = self._whole.get(ep.key)
+        fut = running.want(n) if running is not None else None
+        if fut is None:
+            # A download may have stored block n while the caller was looking in the cache.
+            data = await self.cache.aread(path)
+            if data is not None:
+                return data
+            running = self._whole.get(ep.key)
+            fut = running.want(n) if running is not None else None
+        if fut is None:
+            arrivals = self._whole[ep.key] = _Arrivals()
+            fut = arrivals.want(n)
+            self._start_pull(ep, n, arrivals)
+        return await asyncio.shield(fut)
+
+    async def _fetch_block(self, ep: EpisodeRef, n: int) -> bytes:
+        """Block ``n`` as soon as it has arrived; a whole-file download keeps storing in the background."""
+        arrivals = _Arrivals()
+        fut = arrivals.want(n)
+        self._start_pull(ep, n, arrivals)
+        return await asyncio.shield(fut)
+
+    def _start_pull(self, ep: EpisodeRef, n: int, arrivals: _Arrivals) -> None:
+        # Not cancelled with the caller: other waiters may share it, and the blocks are worth keeping.
+        task = asyncio.create_task(self._pull(ep, n, arrivals))
+        self._pulls.add(task)
+        task.add_done_callback(self._pulls.discard)
+
+    async def _pull(self, ep: EpisodeRef, n: int, arrivals: _Arrivals) -> None:
+        try:
+            await self._download(ep, n, arrivals)
+        except asyncio.CancelledError as e:
+            arrivals.close(e)
+            raise
+        except Exception as e:
+            if not arrivals.close(e):
+                log.info("storing the rest of %s/%s failed: %s", ep.book_id, ep.chapter_index, e)
+        else:
+            arrivals.close()  # blocks past the end of the body
+        finally:
+            if self._whole.get(ep.key) is arrivals:
+                del self._whole[ep.key]
+
+    async def _download(self, ep: EpisodeRef, n: int, arrivals: _Arrivals) -> None:
+        start = n * self.block_bytes
+        headers = {"Range": f"bytes={start}-{start + self.block_bytes - 1}"}
+        for attempt in (1, 2):
+            url = await self.source_url(ep)
+            if is_hls_url(url):
+                raise RelayError("episode is HLS, use index.m3u8", 404)
+            try:
+                async with self.upstream.stream(url, headers=headers) as resp:
+                    if resp.status_code in EXPIRED_URL_STATUSES and attempt == 1:
+                        self._expire(ep)
+                        continue
+                    if resp.status_code == 416:
+                        raise RelayError("range past the end of the episode", 416)
+                    if resp.status_code not in (200, 206):
+                        raise RelayError(f"CDN answered HTTP {resp.status_code}")
+                    content_type = resp.headers.get("content-type", "").split(";")[0].strip() or "video/mp4"
+                    if resp.status_code == 206:
+                        total = resp.headers.get("content-range", "").rpartition("/")[2]
+                        if not total.isdigit():
+                            raise RelayError("CDN sent no total size")
+                        media = await self._learn(ep.key, int(total), content_type, ranges=True)
+                        data = await resp.aread()
+                        arrivals.arrived(n, data)
+                        await self._store(ep, media, n, data)
+                        return
+                    return await self._split_whole(ep, resp, content_type, arrivals)
+            except httpx.HTTPError as e:
+                raise RelayError(f"CDN transfer failed: {e!r}") from e
+        raise RelayError("video link keeps expiring")
+
+    async def _split_whole(self, ep: EpisodeRef, resp: httpx.Response, content_type: str,
+                           arrivals: _Arrivals) -> None:
+        """The CDN ignored Range: hand over blocks as they arrive and cache every block of the body.
+
+        The download is registered as the episode's running one, so requests
+        for later blocks wait for it instead of starting full-file GETs of their own.
+        """
+        length = resp.headers.get("content-length", "")
+        if not length.isdigit():
+            raise RelayError("CDN sent neither Content-Range nor Content-Length")
+        self._whole.setdefault(ep.key, arrivals)
+        media = await self._learn(ep.key, int(length), content_type, ranges=False)
+        buf, i = bytearray(), 0
+        async for chunk in resp.aiter_bytes():
+            buf += chunk
+            while len(buf) >= self.block_bytes:
+                piece = bytes(buf[:self.block_bytes])
+                del buf[:self.block_bytes]
+                arrivals.arrived(i, piece)
+                await self._store(ep, media, i, piece)
+                arrivals.stored(i)
+                i += 1
+        if buf:
+            arrivals.arrived(i, bytes(buf))
+            await self._store(ep, media, i, bytes(buf))
+
+    async def _store(self, ep: EpisodeRef, media: Media, n: int, data: bytes) -> None:
+        await self.cache.aput(self._block_path(ep, media, n), data)
+        self.bytes_fetched += len(data)
+
+    async def stream(self, ep: EpisodeRef, media: Media, first: int, last: int) -> AsyncIterator[bytes]:
+        """Bytes ``first..last`` (inclusive), with up to ``readahead`` blocks fetched ahead."""
+        size = self.block_bytes
+        numbers = list(range(first // size, last // size + 1))
+        window: list[asyncio.Task] = []
+        try:
+            for n in numbers[:self.readahead]:
+                window.append(asyncio.create_task(self.block(ep, media, n)))
+            for i, n in enumerate(numbers):
+                data = await window.pop(0)
+                ahead = i + self.readahead
+                if ahead < len(numbers):
+                    window.append(asyncio.create_task(self.block(ep, media, numbers[ahead])))
+                lo, hi = max(first - n * size, 0), min(last + 1 - n * size, size)
+                if len(data) < hi:
+                    raise RelayError(f"short block {n}: {len(data)} bytes")
+                self.bytes_served += hi - lo
+                yield data[lo:hi]
+        finally:
+            for task in window:
+                task.cancel()
+            await asyncio.gather(*window, return_exceptions=True)
+
+    # ---- HLS
+
+    async def playlist(self, ep: EpisodeRef) -> MediaPlaylist:
+        """The episode's media playlist, reused while the resolver hands out the same link."""
+        url = await self.source_url(ep)
+        if not is_hls_url(url):
+            raise RelayError("episode is not HLS, use video", 404)
+        cached = self._playlists.get(ep.key)
+        if cached is not None and cached[0] == url:
+            self._playlists.move_to_end(ep.key)
+            return cached[1]
+        playlist = await self.flight.do(f"playlist {url}", lambda: self._load_playlist(url))
+        self._remember(self._playlists, ep.key, (url, playlist))
+        return playlist
+
+    async def _load_playlist(self, url: str) -> MediaPlaylist:
+        try:
+            return await self.hls.load(url)
+        except (HLSError, httpx.HTTPError) as e:
+            raise RelayError(f"playlist: {e}") from e
+
+    def _segment_path(self, ep: EpisodeRef, playlist: MediaPlaylist, part: str) -> str:
+        # Keyed by the media playlist's path too, in case another variant gets picked later.
+        variant = hashlib.sha1(urlsplit(playlist.url).path.encode()).hexdigest()[:8]
+        return self.cache.path(f"{ep.key}-{variant}-{part}", playlist.extension)
+
+    async def segment(self, ep: EpisodeRef, part: str) -> tuple[bytes, str]:
+        """Segment ``part`` (a number or ``init``) and its content type."""
+        playlist = await self.playlist(ep)
+        segment_at(playlist, part)
+        content_type = "video/mp4" if playlist.init is not None else "video/mp2t"
+        path = self._segment_path(ep, playlist, part)
+        data = await self.cache.aread(path)
+        if data is not None:
+            self.hits += 1
+            return data, content_type
+        self.misses += 1
+        return await self.flight.do(f"segment {path}", lambda: self._fetch_segment(ep, part)), content_type
+
+    async def _fetch_segment(self, ep: EpisodeRef, part: str) -> bytes:
+        for attempt in (1, 2):
+            playlist = await self.playlist(ep)
+            try:
+                data = await self.hls.fetch_segment(segment_at(playlist, part))
+            except httpx.HTTPStatusError as e:
+                if attempt == 1 and e.response.status_code in EXPIRED_URL_STATUSES:
+                    self._expire(ep)  # segment links expire with the playlist's
+                    continue
+                raise RelayError(f"segment {part}: HTTP {e.response.status_code}") from e
+            except httpx.HTTPError as e:
+                raise RelayError(f"segment {part}: {e!r}") from e
+            await self.cache.aput(self._segment_path(ep, playlist, part), data)
+            self.bytes_fetched += len(data)
+            return data
+        raise RelayError("video link keeps expiring")
+
+    # ---- next-episode prefetch
+
+    def prefetch_next(self, ep: EpisodeRef) -> None:
+        """Warm the episode after ``ep`` in the background, once per episode at a time."""
+        if ep in self._prefetching:
+            return
+        task = asyncio.create_task(self._prefetch_next(ep))
+        self._prefetching[ep] = task
+        task.add_done_callback(lambda _: self._prefetching.pop(ep, None))
+
+    async def _prefetch_next(self, ep: EpisodeRef) -> None:
+        try:
+            drama = await self.gateway.chapters(ep.book_id, ep.lang)
+            indexes = list(drama.chapters) if drama is not None and drama.chapters else []
+            if ep.chapter_index not in indexes or indexes[-1] == ep.chapter_index:
+                return
+            following = EpisodeRef(ep.book_id, indexes[indexes.index(ep.chapter_index) + 1], ep.lang)
+            async with self._prefetch_slots:
+                await self.warm(following)
+            self.prefetched += 1
+        except (RelayError, UpstreamError) as e:
+            log.info("prefetch after %s/%s failed: %s", ep.book_id, ep.chapter_index, e)
+
+    async def warm(self, ep: EpisodeRef) -> None:
+        """Pull the first ``prefetch_bytes`` or ``prefetch_segments`` of an episode into the cache."""
+        if is_hls_url(await self.source_url(ep)):
+            playlist = await self.playlist(ep)
+            parts = (["init"] if playlist.init is not None else [])
+            parts += [str(n) for n in range(min(self.prefetch_segments, len(playlist.segments)))]
+            for part in parts:
+                await self.segment(ep, part)
+            return
+        media = await self.media(ep)
+        blocks = min(math.ceil(self.prefetch_bytes / self.block_bytes), math.ceil(media.size / self.block_bytes))
+        for n in range(blocks):
+            await self.block(ep, media, n)
+
+    async def aclose(self) -> None:
+        tasks = [*self._prefetching.values(), *self._pulls]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "prefetched": self.prefetched,
+                "prefetching": len(self._prefetching), "bytes_served": self.bytes_served,
+                "bytes_fetched": self.bytes_fetched, **self.cache.snapshot()}
@@ -0,0 +1,169 @@
+"""Episode -> signed video URL resolution with an expiry-aware cache.
+
+restxdb exposes two ways to get a ``videoUrl``: ``GET /watch/{bookId}/{idx}``
+and ``POST /watch/player``. Which one works depends on the book, so the
+variant that succeeded last is remembered per book and tried first.
+Resolved URLs are shared with other instances through ``SharedState``.
+"""
+
+import asyncio
+import calendar
+import logging
+import time
+from collections import OrderedDict
+from typing import Iterable
+from urllib.parse import parse_qsl, urlsplit
+
+from . import config
+from .metrics import span
+from .shared import SharedState
+from .singleflight import SingleFlight
+from .upstream import Upstream, UpstreamError
+
+log = logging.getLogger(__name__)
+
+GET, POST = "get", "post"
+
+# Query parameters CDNs use for an absolute unix expiry.
+_EXPIRY_PARAMS = ("expires", "expire", "x-expires", "e", "deadline", "exp")
+
+
+def url_expiry(url: str) -> float | None:
+    """Best-effort absolute expiry (unix seconds) of a signed CDN URL."""
+    query = {k.lower(): v for k, v in parse_qsl(urlsplit(url).query)}
+    for name in _EXPIRY_PARAMS:
+        value = query.get(name, "")
+        if value.isdigit():
+            ts = int(value)
+            return ts / 1000 if ts > 10**12 else ts
+    amz_date, amz_expires = query.get("x-amz-date"), query.get("x-amz-expires", "")
+    if amz_date and amz_expires.isdigit():
+        try:
+            start = calendar.timegm(time.strptime(amz_date, "%Y%m%dT%H%M%SZ"))
+        except ValueError:
+            return None
+        return start + int(amz_expires)
+    # Tencent style: t=<hex expiry>
+    t = query.get("t", "")
+    if 8 <= len(t) <= 9:
+        try:
+            return int(t, 16)
+        except ValueError:
+            return None
+    # Alibaba style: auth_key=<issued>-<rand>-<uid>-<md5>, valid for a CDN-configured window.
+    auth_key = query.get("auth_key", "")
+    issued = auth_key.split("-", 1)[0]
+    if issued.isdigit():
+        return int(issued) + config.VIDEO_URL_DEFAULT_TTL
+    return None
+
+
+def _shared_key(key: tuple[str, int, str]) -> str:
+    book_id, chapter_index, lang = key
+    return f"{book_id}/{chapter_index}?lang={lang}"
+
+
+class VideoResolver:
+    def __init__(self, upstream: Upstream, flight: SingleFlight, lang: str = config.LANG,
+                 max_entries: int = config.VIDEO_URL_CACHE_SIZE, shared: SharedState | None = None,
+                 max_variants: int = config.VIDEO_VARIANT_CACHE_SIZE):
+        self.upstream = upstream
+        self.flight = flight
+        self.shared = shared if shared is not None else SharedState()
+        self.lang = lang
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self.hits = self.misses = 0
+        self._urls: OrderedDict[tuple[str, int, str], tuple[str, float]] = OrderedDict()
+        self._variant: OrderedDict[str, str] = OrderedDict()
+
+    async def cached(self, book_id: str, chapter_index: int, lang: str | None = None) -> str | None:
+        key = (str(book_id), int(chapter_index), lang or self.lang)
+        item = self._urls.get(key)
+        if item is None:
+            item = await self.shared.get_url(_shared_key(key))
+            if item is None:
+                return None
+            self._keep(key, *item)
+        url, expires_at = item
+        if time.time() >= expires_at:
+            del self._urls[key]
+            return None
+        self._urls.move_to_end(key)
+        return url
+
+    def _store(self, key: tuple[str, int, str], url: str) -> None:
+        expiry = url_expiry(url) or time.time() + config.VIDEO_URL_DEFAULT_TTL
+        self._keep(key, url, expiry - config.VIDEO_URL_EXPIRY_MARGIN)
+        self.shared.put_url(_shared_key(key), url, expiry - config.VIDEO_URL_EXPIRY_MARGIN)
+
+    def _keep(self, key: tuple[str, int, str], url: str, expires_at: float) -> None:
+        self._urls[key] = (url, expires_at)
+        self._urls.move_to_end(key)
+        while len(self._urls) > self.max_entries:
+            self._urls.popitem(last=False)
+
+    def invalidate(self, book_id: str, chapter_index: int, lang: str | None = None) -> None:
+        key = (str(book_id), int(chapter_index), lang or self.lang)
+        self._urls.pop(key, None)
+        self.shared.delete_url(_shared_key(key))
+
+    async def resolve(self, book_id: str, chapter_index: int, lang: str | None = None) -> str | None:
+        """Return the playable URL for one episode, or ``None`` if restxdb has none."""
+        book_id, chapter_index, lang = str(book_id), int(chapter_index), lang or self.lang
+        url = await self.cached(book_id, chapter_index, lang)
+        if url:
+            self.hits += 1
+            return url
+        self.misses += 1
+        with span("resolve", book=book_id, chapter=chapter_index):
+            return await self.flight.do(f"resolve {book_id}/{chapter_index}?lang={lang}",
+                                        lambda: self._fetch_once(book_id, chapter_index, lang))
+
+    async def _fetch_once(self, book_id: str, chapter_index: int, lang: str) -> str | None:
+        """``_fetch`` under the cross-instance lock, unless another instance resolved it meanwhile."""
+        async with self.shared.lock(f"resolve {_shared_key((book_id, chapter_index, lang))}"):
+            return await self.cached(book_id, chapter_index, lang) or await self._fetch(book_id, chapter_index, lang)
+
+    async def _fetch(self, book_id: str, chapter_index: int, lang: str) -> str | None:
+        first = self._variant.get(book_id, GET)
+        for variant in (first, POST if first == GET else GET):
+            try:
+                url = await self._call(variant, book_id, chapter_index, lang)
+            except UpstreamError as e:
+                log.info("watch %s %s/%s failed: %s", variant, book_id, chapter_index, e)
+                continue
+            if url:
+                self._variant[book_id] = variant
+                self._variant.move_to_end(book_id)
+                while len(self._variant) > self.max_variants:
+                    self._variant.popitem(last=False)
+                self._store((book_id, chapter_index, lang), url)
+                return url
+        return None
+
+    async def _call(self, variant: str, book_id: str, chapter_index: int, lang: str) -> str | None:
+        if variant == GET:
+            data = await self.upstream.get_json(f"/watch/{book_id}/{chapter_index}",
+                                                {"lang": lang, "source": "search_result"})
+        else:
+            data = await self.upstream.post_json(
+                "/watch/player", {"bookId": book_id, "chapterIndex": chapter_index, "lang": lang},
+                {"lang": lang})
+        inner = data.get("data") if isinstance(data, dict) else None
+        return inner.get("videoUrl") if isinstance(inner, dict) else None
+
+    async def resolve_many(self, book_id: str, chapter_indexes: Iterable[int], lang: str | None = None,
+                           concurrency: int = config.RESOLVE_CONCURRENCY) -> dict[int, str | None]:
+        """Resolve a whole chapter list in parallel, at most ``concurrency`` at a time."""
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(idx: int) -> tuple[int, str | None]:
+            async with sem:
+                return idx, await self.resolve(book_id, idx, lang)
+
+        return dict(await asyncio.gather(*(one(int(i)) for i in chapter_indexes)))
+
+    def snapshot(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._urls),
+                "books_with_variant": len(self._variant)}
@@ -0,0 +1,336 @@
+"""In-process search over every drama record seen in upstream responses.
+
+``Gateway`` feeds each ``foryou``/``rank``/``new``/``search``/``chapters``
+payload it loads into ``SearchIndex.ingest``; records become ``Drama``
+objects keyed on ``bookId``, merged with what is already known (so the
+index doubles as the in-memory catalog) and re-indexed only when their
+text changes. Per language there
+is a token trie for suggestions (each node holds the ids of titles with a
+token starting there, so a prefix lookup is one walk) and an inverted index
+over title and introduction tokens, walked by prefix through a sorted
+vocabulary, for search. Text is NFKD-folded with combining marks dropped
+and casefolded, so ``Cinta`` matches ``cínta``.
+
+A query is answered locally only when the index fills its whole first
+page; later pages then continue the same ranking, so one query never
+pages through a mix of local and upstream results.
+
+The records are saved to a snapshot file and, after a restart, indexed
+again by ``load()`` rather than during startup: on a worker thread into a
+separate index, which then takes in whatever was ingested meanwhile and
+replaces the live one. Lookups before that see only the ingested records,
+so handlers that want the saved ones await ``load()`` first.
+"""
+
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Iterable
+from urllib.parse import urlsplit
+
+from .models import Drama, dramas_in
+from .snapshot import Snapshot, write_snapshot
+
+log = logging.getLogger(__name__)
+
+# First path segment of upstream responses that carry drama records.
+INGEST_PATHS = frozenset({"foryou", "rank", "new", "search", "chapters"})
+
+# Results per page, as restxdb pages /search.
+SEARCH_PAGE_SIZE = 20
+
+TITLE_WEIGHT = 3.0
+INTRO_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase, accent-free form used for both indexing and queries."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokens(text: str) -> list[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.ids: set[str] = set()
+
+
+class PrefixTrie:
+    """Token trie; ``ids(prefix)`` is every id with a token starting with ``prefix``."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def add(self, token: str, item: str) -> None:
+        node = self.root
+        for ch in token:
+            node = node.children.setdefault(ch, _TrieNode())
+            node.ids.add(item)
+
+    def remove(self, token: str, item: str) -> None:
+        path, node = [], self.root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                return
+            path.append((ch, node))
+        for ch, node in path:
+            node.ids.discard(item)
+        # Prune branches that no longer lead anywhere, deepest first.
+        for depth in range(len(path) - 1, -1, -1):
+            ch, node = path[depth]
+            if node.ids:
+                break
+            parent = path[depth - 1][1] if depth else self.root
+            del parent.children[ch]
+
+    def ids(self, prefix: str) -> set[str]:
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+
+@dataclass(slots=True)
+class Doc:
+    drama: Drama
+    folded_title: str
+    title_tokens: frozenset[str]
+    intro_tokens: frozenset[str]
+    seen: int = 1
+
+
+class LanguageIndex:
+    def __init__(self):
+        self.docs: dict[str, Doc] = {}
+        self.trie = PrefixTrie()
+        self.postings: dict[str, set[str]] = {}
+        self._vocab: list[str] | None = None  # sorted postings keys, rebuilt lazily
+
+    def add(self, drama: Drama) -> bool:
+        """Insert or merge one drama; returns whether its text was (re)indexed."""
+        book_id = drama.book_id
+        doc = self.docs.get(book_id)
+        if doc is not None:
+            doc.drama.merge(drama)
+            drama = doc.drama
+        title_tokens = frozenset(tokens(drama.title))
+        intro_tokens = frozenset(tokens(drama.introduction))
+        if doc is not None:
+            doc.seen += 1
+            if doc.title_tokens == title_tokens and doc.intro_tokens == intro_tokens:
+                doc.folded_title = fold(drama.title)
+                return False
+            self._unindex(book_id, doc)
+            doc.folded_title, doc.title_tokens, doc.intro_tokens = fold(drama.title), title_tokens, intro_tokens
+        else:
+            doc = self.docs[book_id] = Doc(drama, fold(drama.title), title_tokens, intro_tokens)
+        for token in title_tokens:
+            self.trie.add(token, book_id)
+        for token in title_tokens | intro_tokens:
+            if token not in self.postings:
+                self.postings[token] = set()
+                self._vocab = None
+            self.postings[token].add(book_id)
+        return True
+
+    def _unindex(self, book_id: str, doc: Doc) -> None:
+        for token in doc.title_tokens:
+            self.trie.remove(token, book_id)
+        for token in doc.title_tokens | doc.intro_tokens:
+            ids = self.postings.get(token)
+            if ids is not None:
+                ids.discard(book_id)
+                if not ids:
+                    del self.postings[token]
+                    self._vocab = None
+
+    def _prefix_postings(self, prefix: str) -> set[str]:
+        """Ids with any title or intro token starting with ``prefix``."""
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        found: set[str] = set()
+        for i in range(bisect.bisect_left(self._vocab, prefix), len(self._vocab)):
+            token = self._vocab[i]
+            if not token.startswith(prefix):
+                break
+            found |= self.postings[token]
+        return found
+
+    def suggest(self, query: str, limit: int) -> list[str]:
+        words = tokens(query)
+        if not words:
+            return []
+        ids = set(self.trie.ids(words[-1]))
+        for word in words[:-1]:
+            ids &= self.trie.ids(word)
+        folded = fold(query).strip()
+        ranked = heapq.nsmallest(limit, (self.docs[i] for i in ids),
+                                 key=lambda d: (not d.folded_title.startswith(folded), -d.seen, len(d.folded_title)))
+        return [d.drama.title for d in ranked]
+
+    def search(self, query: str, limit: int) -> list[Drama]:
+        words = tokens(query)
+        if not words:
+            return []
+        ids: set[str] | None = None
+        for i, word in enumerate(words):
+            matches = self._prefix_postings(word) if i == len(words) - 1 else set(self.postings.get(word, ()))
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                return []
+        folded = fold(query).strip()
+
+        def score(doc: Doc) -> float:
+            total = 10.0 if folded in doc.folded_title else 0.0
+            for word in words:
+                if word in doc.title_tokens or any(t.startswith(word) for t in doc.title_tokens):
+                    total += TITLE_WEIGHT
+                elif word in doc.intro_tokens or any(t.startswith(word) for t in doc.intro_tokens):
+                    total += INTRO_WEIGHT
+            return total
+
+        ranked = heapq.nsmallest(limit, (self.docs[i] for i in ids),
+                                 key=lambda d: (-score(d), -d.seen, len(d.folded_title)))
+        return [d.drama for d in ranked]
+
+
+class SearchIndex:
+    def __init__(self, snapshot_path: str | None = None):
+        self.langs: dict[str, LanguageIndex] = {}
+        self.cover_hosts: set[str] = set()  # where covers live; the image proxy only fetches from these
+        self.local_hits = self.fallbacks = 0
+        self.snapshot_path = snapshot_path
+        self._pending = Snapshot(snapshot_path) if snapshot_path else None  # not indexed yet
+        self._loading: asyncio.Task | None = None
+
+    async def load(self) -> int:
+        """Index the saved snapshot if that has not happened yet; returns how many dramas it held.
+
+        Every caller waits for the same load.
+        """
+        if self._loading is None:
+            if self._pending is None:
+                return 0
+            self._loading = asyncio.create_task(self._load(self._pending))
+        return await asyncio.shield(self._loading)
+
+    def load_later(self, delay: float) -> None:
+        """``load`` after ``delay`` seconds unless a lookup needs it first."""
+        asyncio.get_running_loop().call_later(delay, lambda: self._loading or asyncio.ensure_future(self.load()))
+
+    async def _load(self, pending: Snapshot) -> int:
+        started = time.perf_counter()
+        try:
+            restored = await asyncio.to_thread(self._read, pending)
+        except (OSError, ValueError):
+            log.exception("reading the search snapshot %s failed", pending.path)
+            return 0
+        finally:
+            self._pending = None
+            pending.close()
+        loaded = len(restored)
+        # Back on the loop with no await until the swap: records ingested meanwhile are newer, so they go on top.
+        for lang, live in self.langs.items():
+            index = restored.langs.setdefault(lang, LanguageIndex())
+            for book_id, doc in live.docs.items():
+                index.add(doc.drama)
+                index.docs[book_id].seen += doc.seen - 1
+        self.langs = restored.langs
+        self.cover_hosts.update(restored.cover_hosts)  # the image proxy holds this set
+        if loaded:
+            log.info("search index: %d dramas from %s in %.3fs", loaded, pending.path, time.perf_counter() - started)
+        return loaded
+
+    @staticmethod
+    def _read(pending: Snapshot) -> "SearchIndex":
+        """A separate index of the saved records. Blocking: runs on a worker thread."""
+        restored = SearchIndex()
+        for key, data, (seen,) in pending.items():
+            lang = key.split(" ", 1)[0]
+            drama = Drama.from_record(json.loads(data))
+            if drama is not None:
+                restored.add([drama], lang)
+                restored.langs[lang].docs[drama.book_id].seen = seen
+        return restored
+
+    async def save(self) -> int:
+        """Write every indexed drama to ``snapshot_path``; returns how many."""
+        if self.snapshot_path is None:
+            return 0
+        await self.load()
+        records = [(f"{lang} {book_id}", json.dumps(doc.drama.to_record(), separators=(",", ":")).encode(), [doc.seen])
+                   for lang, index in self.langs.items() for book_id, doc in index.docs.items()]
+        return await asyncio.to_thread(write_snapshot, self.snapshot_path, records)
+
+    def add(self, dramas: Iterable[Drama], lang: str) -> int:
+        index = self.langs.setdefault(lang, LanguageIndex())
+        added = 0
+        for drama in dramas:
+            added += index.add(drama)
+            if drama.cover:
+                self.cover_hosts.add((urlsplit(drama.cover).hostname or "").lower())
+        return added
+
+    def drama(self, book_id: str, lang: str) -> Drama | None:
+        index = self.langs.get(lang)
+        doc = index.docs.get(str(book_id)) if index else None
+        return doc.drama if doc else None
+
+    def ingest(self, path: str, lang: str, content: bytes) -> int:
+        """Index the drama records in one upstream JSON response for ``path``."""
+        if path.strip("/").split("/", 1)[0] not in INGEST_PATHS:
+            return 0
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            return 0
+        return self.add(dramas_in(payload), lang)
+
+    def suggest(self, query: str, lang: str, limit: int = 10) -> list[str]:
+        """Local suggestions; empty means the caller should ask upstream."""
+        index = self.langs.get(lang)
+        return self._count(index.suggest(query, limit) if index else [])
+
+    def search(self, query: str, lang: str, page: int = 1, size: int = SEARCH_PAGE_SIZE) -> list[Drama] | None:
+        """Page ``page`` of the local results, or ``None`` when upstream should answer the query."""
+        index = self.langs.get(lang)
+        ranked = index.search(query, page * size) if index else []
+        if len(ranked) < size:
+            self.fallbacks += 1
+            return None
+        self.local_hits += 1
+        return ranked[(page - 1) * size:]
+
+    def _count(self, found: list) -> list:
+        if found:
+            self.local_hits += 1
+        else:
+            self.fallbacks += 1
+        return found
+
+    def __len__(self) -> int:
+        return sum(len(i.docs) for i in self.langs.values())
+
+    def snapshot(self) -> dict:
+        if self._pending is not None:
+            return {"loaded": False, "local_hits": self.local_hits, "fallbacks": self.fallbacks}
+        return {"dramas": {lang: len(i.docs) for lang, i in self.langs.items()},
+                "tokens": sum(len(i.postings) for i in self.langs.values()),
+                "local_hits": self.local_hits, "fallbacks": self.fallbacks}
@@ -0,0 +1,188 @@
+"""Outgoing Telegram request scheduler (a PTB ``BaseRateLimiter``).
+
+Every Bot API call except ``getUpdates`` waits here for a token from a
+global bucket (~30 msg/s, with a burst of only a few calls so no
+one-second window goes over the limit) and from its chat's bucket (~1 msg/s in private
+chats, 20/min in groups and channels). Waiters are granted strictly by
+lane, so interactive replies overtake queued bulk uploads. A 429 pauses
+the chat (or everything, for a global flood) for ``retry_after`` and the
+call is retried instead of failing the handler.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from . import config
+from .metrics import TELEGRAM_RETRY_AFTER, TELEGRAM_SEND_SECONDS
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+LANE_NAMES = ("interactive", "bulk")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 when it is)."""
+        self._refill(now)
+        return max(self.paused_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+    def idle(self, now: float) -> bool:
+        return self.wait_time(now) == 0 and self.tokens >= self.capacity
+
+
+class SendScheduler(BaseRateLimiter[dict]):
+    """Token-bucket rate limiter with priority lanes, chosen per call by ``rate_limit_args={"lane": BULK}``."""
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, global_rate: float = config.TG_GLOBAL_RATE, chat_rate: float = config.TG_CHAT_RATE,
+                 group_rate: float = config.TG_GROUP_RATE, max_retries: int = config.TG_MAX_RETRIES,
+                 clock: Callable[[], float] = time.monotonic, global_burst: float = config.TG_GLOBAL_BURST):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sent = self.throttled = 0
+        self._global = TokenBucket(global_rate, max(1.0, global_burst), clock())
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, int | str | None, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+
+    async def initialize(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for *_, fut in self._waiters:
+            fut.cancel()
+        self._waiters.clear()
+
+    async def process_request(self, callback: Callable[..., Coroutine[Any, Any, Any]], args: Any,
+                              kwargs: dict[str, Any], endpoint: str, data: dict[str, Any],
+                              rate_limit_args: dict | None) -> Any:
+        lane = (rate_limit_args or {}).get("lane", INTERACTIVE)
+        chat_id = data.get("chat_id")
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(lane, chat_id)
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - started, endpoint, LANE_NAMES[lane])
+                return result
+            except RetryAfter as e:
+                TELEGRAM_RETRY_AFTER.inc(endpoint)
+                if attempt == self.max_retries:
+                    raise
+                self.throttled += 1
+                delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                log.warning("%s to %s flood-limited, retrying in %ss", endpoint, chat_id, delay)
+                self._pause(chat_id, float(delay))
+        raise AssertionError("unreachable")
+
+    def snapshot(self) -> dict:
+        lanes = [0, 0]
+        for lane, *_ in self._waiters:
+            lanes[lane] += 1
+        return {"sent": self.sent, "throttled": self.throttled, "interactive_waiting": lanes[INTERACTIVE],
+                "bulk_waiting": lanes[BULK], "chats": len(self._chats)}
+
+    # ---- scheduling
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            # Negative ids and @usernames are groups or channels.
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate if private else self.group_rate, 1, now)
+        return bucket
+
+    def _pause(self, chat_id: int | str | None, delay: float) -> None:
+        until = self.clock() + delay
+        if chat_id is None:
+            self._global.pause(until)
+        else:
+            self._chat_bucket(chat_id, self.clock()).pause(until)
+        self._wake.set()
+
+    async def _acquire(self, lane: int, chat_id: int | str | None) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            await self.initialize()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((lane, next(self._seq), chat_id, fut))
+        self._wake.set()
+        await fut
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wake.clear()
+            self._waiters = [w for w in self._waiters if not w[3].done()]
+            if not self._waiters:
+                await self._wake.wait()
+                continue
+            now = self.clock()
+            wait = self._global.wait_time(now)
+            if wait <= 0:
+                wait = float("inf")
+                for entry in sorted(self._waiters):
+                    chat_id = entry[2]
+                    chat_wait = 0.0 if chat_id is None else self._chat_bucket(chat_id, now).wait_time(now)
+                    if chat_wait <= 0:
+                        self._grant(entry, now)
+                        wait = 0.0
+                        break
+                    wait = min(wait, chat_wait)
+                if wait <= 0:
+                    continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant(self, entry: tuple, now: float) -> None:
+        self._waiters.remove(entry)
+        self._global.take(now)
+        if entry[2] is not None:
+            self._chat_bucket(entry[2], now).take(now)
+        entry[3].set_result(None)
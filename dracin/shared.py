@@ -0,0 +1,292 @@
+"""State shared between service instances.
+
+``SHARED_BACKEND=local`` (the default) keeps everything in the process:
+the in-memory caches and single-flight already cover one instance, so the
+methods below are no-ops or trivially succeed. ``SHARED_BACKEND=sqlite``
+opens ``SHARED_DB`` in WAL mode, and every instance whose ``DATA_DIR`` is
+on the same storage shares:
+
+* catalog responses, as a second level behind each instance's ``TTLCache``
+  (expiries are wall-clock, so they mean the same in every process);
+* resolved video URLs;
+* leases, i.e. named ownership that expires unless renewed. ``lock()``
+  turns one into a cross-instance single-flight, ``acquire()`` elects the
+  instance that runs singleton work (the catalog warmer, Telegram polling)
+  and ``claim_once()`` drops Telegram updates another instance already took.
+
+Reads and lease operations are coroutines; writes whose result nobody
+waits for (``put_*``, ``delete_url``, ``release``) are fire-and-forget. The
+SQLite backend runs every statement on one dedicated thread that owns the
+connection, so the event loop never waits on the disk or a busy database,
+and statements run in the order they were issued.
+
+Download jobs and the file_id index still live in their own SQLite files
+under ``DATA_DIR``; ``JobStore`` claims jobs with leases of its own.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+INSTANCE_ID = config.INSTANCE_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key          TEXT PRIMARY KEY,
+    status       INTEGER NOT NULL,
+    content_type TEXT NOT NULL,
+    content      BLOB NOT NULL,
+    fresh_until  REAL NOT NULL,
+    stale_until  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS video_urls (
+    key        TEXT PRIMARY KEY,
+    url        TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# (status, content, content_type, fresh_until, stale_until), expiries in unix seconds.
+SharedResponse = tuple[int, bytes, str, float, float]
+
+
+@dataclass(slots=True)
+class SharedStats:
+    response_hits: int = 0
+    response_misses: int = 0
+    url_hits: int = 0
+    lock_waits: int = 0
+    duplicate_claims: int = 0
+
+
+class SharedState:
+    """In-process backend for a single instance."""
+
+    backend = "local"
+
+    def __init__(self, instance_id: str = INSTANCE_ID):
+        self.instance_id = instance_id
+        self.stats = SharedStats()
+        self._held: dict[str, float] = {}
+
+    async def get_response(self, key: str) -> SharedResponse | None:
+        return None
+
+    def put_response(self, key: str, status: int, content: bytes, content_type: str,
+                     fresh_until: float, stale_until: float) -> None:
+        pass
+
+    async def get_url(self, key: str) -> tuple[str, float] | None:
+        """``(url, expires_at)`` if still valid."""
+        return None
+
+    def put_url(self, key: str, url: str, expires_at: float) -> None:
+        pass
+
+    def delete_url(self, key: str) -> None:
+        pass
+
+    async def acquire(self, name: str, ttl: float) -> bool:
+        """Take or renew lease ``name`` for ``ttl`` seconds; ``False`` while another instance holds it."""
+        self._held[name] = time.time() + ttl
+        return True
+
+    def release(self, name: str) -> None:
+        self._held.pop(name, None)
+
+    def holds(self, name: str) -> bool:
+        return self._held.get(name, 0.0) > time.time()
+
+    async def claim_once(self, name: str, ttl: float) -> bool:
+        """``True`` for the first instance to claim ``name`` in the next ``ttl`` seconds."""
+        return True
+
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str, ttl: float = config.SHARED_LOCK_SECONDS) -> AsyncIterator[None]:
+        """Run the block on one instance at a time; the caller re-checks shared state inside it."""
+        yield
+
+    def start(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        self._held.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"backend": self.backend, "instance": self.instance_id, **asdict(self.stats),
+                "leases": sorted(name for name in self._held if self.holds(name))}
+
+
+class SQLiteState(SharedState):
+    """Shared backend: one SQLite file in WAL mode, opened by every instance."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = config.SHARED_DB, instance_id: str = INSTANCE_ID):
+        super().__init__(instance_id)
+        self.path = path
+        self.responses = 0  # row count as of the last prune
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One thread owns the connection: statements run off the loop and in submission order.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-db")
+        self._db: sqlite3.Connection = self._executor.submit(self._connect).result()
+        self._maintainer: asyncio.Task | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, timeout=config.SQLITE_BUSY_TIMEOUT)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        self.responses = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return db
+
+    async def _changes(self, sql: str, args: tuple = ()) -> int:
+        """Run a write and return how many rows it changed."""
+        def run() -> int:
+            return self._db.execute(sql, args).rowcount
+        return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+
+    async def _fetchone(self, sql: str, args: tuple = ()) -> tuple | None:
+        def run() -> tuple | None:
+            return self._db.execute(sql, args).fetchone()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+
+    def _submit(self, sql: str, args: tuple = ()) -> None:
+        """Queue a write without waiting for it; failures are logged."""
+        self._executor.submit(self._db.execute, sql, args).add_done_callback(self._report)
+
+    @staticmethod
+    def _report(done: Future) -> None:
+        if not done.cancelled() and done.exception() is not None:
+            log.error("shared state write failed: %r", done.exception())
+
+    async def get_response(self, key: str) -> SharedResponse | None:
+        row = await self._fetchone("SELECT status, content, content_type, fresh_until, stale_until FROM responses "
+                                   "WHERE key = ?", (key,))
+        if row is None:
+            self.stats.response_misses += 1
+            return None
+        self.stats.response_hits += 1
+        return row
+
+    def put_response(self, key: str, status: int, content: bytes, content_type: str,
+                     fresh_until: float, stale_until: float) -> None:
+        self._submit("INSERT OR REPLACE INTO responses (key, status, content_type, content, fresh_until, stale_until) "
+                   "VALUES (?, ?, ?, ?, ?, ?)", (key, status, content_type, content, fresh_until, stale_until))
+
+    async def get_url(self, key: str) -> tuple[str, float] | None:
+        row = await self._fetchone("SELECT url, expires_at FROM video_urls WHERE key = ? AND expires_at > ?",
+                                   (key, time.time()))
+        if row is not None:
+            self.stats.url_hits += 1
+        return row
+
+    def put_url(self, key: str, url: str, expires_at: float) -> None:
+        self._submit("INSERT OR REPLACE INTO video_urls (key, url, expires_at) VALUES (?, ?, ?)",
+                     (key, url, expires_at))
+
+    def delete_url(self, key: str) -> None:
+        self._submit("DELETE FROM video_urls WHERE key = ?", (key,))
+
+    async def acquire(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        taken = await self._changes(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE "
+            "SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+            (name, self.instance_id, now + ttl, now)) == 1
+        if taken:
+            self._held[name] = now + ttl
+        else:
+            self._held.pop(name, None)
+        return taken
+
+    def release(self, name: str) -> None:
+        self._held.pop(name, None)
+        self._submit("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.instance_id))
+
+    async def claim_once(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        claimed = await self._changes(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE "
+            "SET owner = excluded.owner, expires_at = excluded.expires_at WHERE leases.expires_at <= ?",
+            (name, self.instance_id, now + ttl, now)) == 1
+        if not claimed:
+            self.stats.duplicate_claims += 1
+        return claimed
+
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str, ttl: float = config.SHARED_LOCK_SECONDS) -> AsyncIterator[None]:
+        name = f"lock {name}"
+        delay = config.SHARED_POLL_INTERVAL
+        if not await self.acquire(name, ttl):
+            self.stats.lock_waits += 1
+            while not await self.acquire(name, ttl):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+        try:
+            yield
+        finally:
+            # Awaited, unlike release(): other instances are polling for this lease.
+            self._held.pop(name, None)
+            await self._changes("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.instance_id))
+
+    def start(self) -> None:
+        if self._maintainer is None:
+            self._maintainer = asyncio.create_task(self._maintain())
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(config.SHARED_PRUNE_INTERVAL)
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.prune)
+            except sqlite3.Error:
+                log.exception("pruning %s failed", self.path)
+
+    def prune(self, now: float | None = None) -> None:
+        """Drop expired leases and URLs, and responses past ``SHARED_KEEP_EXPIRED``.
+
+        Blocking: runs on the database thread.
+        """
+        now = time.time() if now is None else now
+        self._db.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        self._db.execute("DELETE FROM video_urls WHERE expires_at <= ?", (now,))
+        self._db.execute("DELETE FROM responses WHERE stale_until <= ?", (now - config.SHARED_KEEP_EXPIRED,))
+        self.responses = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    async def aclose(self) -> None:
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            await asyncio.gather(self._maintainer, return_exceptions=True)
+            self._maintainer = None
+        for name in list(self._held):
+            self.release(name)
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._db.close)
+        self._executor.shutdown()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**super().snapshot(), "responses": self.responses}
+
+
+def open_shared(backend: str = config.SHARED_BACKEND) -> SharedState:
+    if backend == "local":
+        return SharedState()
+    if backend == "sqlite":
+        return SQLiteState()
+    raise ValueError(f"unknown SHARED_BACKEND {backend!r} (expected 'local' or 'sqlite')")
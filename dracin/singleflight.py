@@ -0,0 +1,64 @@
+"""Single-flight: concurrent callers with the same key share one upstream call."""
+
+import asyncio
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+from .cache import cache_key
+
+T = TypeVar("T")
+
+
+def flight_key(method: str, path: str, params: Any = (), body: bytes | None = None) -> str:
+    """Key on method, normalized path + query and, for POSTs, the canonical JSON body."""
+    key = f"{method.upper()} {cache_key(path, params)}"
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+        key += " " + hashlib.blake2b(body, digest_size=12).hexdigest()
+    return key
+
+
+@dataclass(slots=True)
+class FlightStats:
+    leaders: int = 0
+    shared: int = 0
+
+
+class SingleFlight:
+    """Collapse identical in-flight calls onto one task.
+
+    The call runs in its own task, so a caller that disconnects (and gets
+    cancelled) does not cancel the work the other waiters depend on.
+    """
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._calls: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            self.stats.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.stats.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**asdict(self.stats), "in_flight": len(self._calls)}
@@ -0,0 +1,107 @@
+"""Snapshot files for warm restarts, read back through ``mmap``.
+
+The catalog cache and the search index are written out every
+``SNAPSHOT_INTERVAL`` and on shutdown, then reloaded after a restart so the
+first visitors after a deploy do not wait on a cold restxdb. A file is
+
+    MAGIC | u32 index length | index JSON | record bytes...
+
+where the index maps each key to ``[offset, length, *meta]``. ``Snapshot``
+maps the file on first use and parses only the index; a record's bytes
+are copied out of the mapping when it is asked for, so opening a large
+snapshot is one small JSON parse and records nobody asks for are never
+read from disk.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Any, Iterable, Iterator
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"DRSNAP1\n"
+_HEADER = struct.Struct("<I")
+
+
+def write_snapshot(path: str, records: Iterable[tuple[str, bytes, list]]) -> int:
+    """Atomically replace ``path`` with ``(key, data, meta)`` records; returns how many were written."""
+    index: dict[str, list] = {}
+    blobs: list[bytes] = []
+    offset = 0
+    for key, data, meta in records:
+        index[key] = [offset, len(data), *meta]
+        blobs.append(data)
+        offset += len(data)
+    header = json.dumps(index, separators=(",", ":")).encode()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + _HEADER.pack(len(header)) + header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+    return len(index)
+
+
+class Snapshot:
+    """Read-only view of one snapshot file; a missing or damaged file reads as empty."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: mmap.mmap | None = None
+        self._index: dict[str, list] | None = None
+        self._base = 0
+
+    def _open(self) -> dict[str, list]:
+        if self._index is not None:
+            return self._index
+        self._index = {}
+        try:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            return self._index
+        except OSError as e:
+            log.warning("cannot map snapshot %s: %r", self.path, e)
+            return self._index
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError("bad magic")
+            (length,) = _HEADER.unpack_from(self._map, len(MAGIC))
+            self._base = len(MAGIC) + _HEADER.size + length
+            self._index = json.loads(self._map[len(MAGIC) + _HEADER.size:self._base])
+        except (ValueError, struct.error) as e:
+            log.warning("ignoring damaged snapshot %s: %r", self.path, e)
+            self.close()
+        return self._index
+
+    def get(self, key: str) -> tuple[bytes, list] | None:
+        """``(data, meta)`` for ``key``, or ``None``."""
+        item = self._open().get(key)
+        if item is None:
+            return None
+        offset, length, *meta = item
+        start = self._base + offset
+        return self._map[start:start + length], meta
+
+    def items(self) -> Iterator[tuple[str, bytes, list]]:
+        for key in list(self._open()):
+            found = self.get(key)
+            if found is not None:
+                yield key, *found
+
+    def __len__(self) -> int:
+        return len(self._open())
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._index = {}
+
+    def snapshot(self) -> dict[str, Any]:
+        loaded = self._index is not None
+        return {"path": self.path, "loaded": loaded, "records": len(self._index) if loaded else None}
@@ -0,0 +1,47 @@
+"""Cold-start timing.
+
+``bot.py`` imports this module first, so ``STARTED`` is taken before
+the heavy imports. Phases are marked once, as seconds since then:
+``imported`` (the app module is loaded), ``ready`` (the lifespan finished
+and the server accepts requests), ``first_request`` (the first HTTP
+response) and ``first_update`` (the first Telegram update whose handlers
+have run, i.e. it has been answered). ``interpreter`` is how long the
+process ran before ``STARTED`` (Linux only).
+"""
+
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+STARTED = time.perf_counter()
+PHASES: dict[str, float] = {}
+
+
+def _process_age() -> float | None:
+    """Seconds since this process was created, from ``/proc``."""
+    try:
+        with open("/proc/self/stat") as f:
+            started_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - started_ticks / os.sysconf("SC_CLK_TCK")
+
+
+_age = _process_age()
+if _age is not None:
+    PHASES["interpreter"] = max(0.0, round(_age - (time.perf_counter() - STARTED), 3))
+
+
+def mark(phase: str) -> None:
+    """Record ``phase`` the first time it is reached."""
+    if phase not in PHASES:
+        PHASES[phase] = round(time.perf_counter() - STARTED, 3)
+        log.info("startup: %s after %.3fs", phase, PHASES[phase])
+
+
+def snapshot() -> dict[str, float]:
+    return dict(PHASES)
@@ -0,0 +1,458 @@
+"""Telegram bot: delivers episodes, reusing uploads through the ``FileIndex``.
+
+With a ``webhook_url``, Telegram posts updates to the web app, which
+hands them to ``feed``; ``start`` (connecting to the Bot API and
+registering the webhook) runs in the background, so a cold instance
+accepts updates before it can answer them. Otherwise the bot
+long-polls: ``getUpdates`` allows one poller per token, so with several
+instances only the holder of the ``telegram-poller`` lease polls. Every
+update is claimed in the shared state first, so an update that reaches
+two instances, or is redelivered, is handled once.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Any, Awaitable, Callable
+
+from telegram import Message, Update
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import (Application, ApplicationHandlerStop, CommandHandler, ContextTypes, MessageHandler,
+                          TypeHandler, filters)
+
+from . import config, startup
+from .downloads import DownloadPipeline, Episode, FileSink, drama_title, episodes_from_chapters
+from .fileindex import FileIndex, IndexedFile, caption_tag, parse_caption, quality_from_url
+from .gateway import Gateway
+from .models import Drama
+from .resolver import VideoResolver
+from .sendqueue import BULK, INTERACTIVE, SendScheduler
+from .shared import SharedState
+from .singleflight import SingleFlight
+from .upstream import UpstreamError
+
+log = logging.getLogger(__name__)
+
+HELP = (
+    "🎬 DramaBox Bot\n\n"
+    "/cari <judul> - cari drama\n"
+    "/drama <bookId> - info dan daftar episode\n"
+    "/ep <bookId> <episode> - kirim satu episode\n"
+    "/semua <bookId> - kirim semua episode\n"
+)
+
+SEARCH_RESULTS = 10
+
+# Bot API upload limit for bots on the public Telegram server.
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# /reindex reports progress every this many channel messages.
+REINDEX_REPORT_EVERY = 500
+
+POLLER_LEASE = "telegram-poller"
+# How long a handled update id is remembered; Telegram stops redelivering well before this.
+UPDATE_CLAIM_SECONDS = 3600.0
+
+
+class EpisodeUnavailable(Exception):
+    """The episode cannot be fetched or is too large to upload."""
+
+
+def parse_chat(value: str) -> int | str | None:
+    value = value.strip()
+    if not value:
+        return None
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def webhook_secret(token: str) -> str:
+    """Secret for the webhook header; the same on every instance without extra configuration."""
+    return hashlib.sha256(f"webhook {token}".encode()).hexdigest()[:32]
+
+
+class DramaBot:
+    def __init__(self, token: str, gateway: Gateway, resolver: VideoResolver, pipeline: DownloadPipeline,
+                 index: FileIndex, channel: str = config.DATABASE_CHANNEL, admins: set[int] = config.ADMIN_IDS,
+                 lang: str = config.LANG, shared: SharedState | None = None,
+                 webhook_url: str = "", secret: str = config.WEBHOOK_SECRET):
+        self.gateway = gateway
+        self.resolver = resolver
+        self.pipeline = pipeline
+        self.index = index
+        self.channel = parse_chat(channel)
+        self.admins = admins
+        self.lang = lang
+        self.shared = shared if shared is not None else SharedState()
+        self.webhook_url = webhook_url
+        self.secret = secret or webhook_secret(token)
+        self.flight = SingleFlight()
+        self.scheduler = SendScheduler()
+        self._bulk: dict[int, asyncio.Task] = {}
+        self._launcher: asyncio.Task | None = None
+        self._reindex: asyncio.Task | None = None
+        self._poller: asyncio.Task | None = None
+        self.app = (Application.builder().token(token).base_url(config.TELEGRAM_API_URL)
+                    .concurrent_updates(config.TG_CONCURRENT_UPDATES).rate_limiter(self.scheduler)
+                    .read_timeout(30).write_timeout(30).media_write_timeout(300).build())
+        self.app.add_handler(TypeHandler(Update, self.claim_update), group=-1)
+        self.app.add_handler(CommandHandler(["start", "help"], self.cmd_start))
+        self.app.add_handler(CommandHandler("cari", self.cmd_search))
+        self.app.add_handler(CommandHandler("drama", self.cmd_drama))
+        self.app.add_handler(CommandHandler("ep", self.cmd_episode))
+        self.app.add_handler(CommandHandler("semua", self.cmd_all))
+        self.app.add_handler(CommandHandler("reindex", self.cmd_reindex))
+        if self.channel is not None:
+            chat_filter = (filters.Chat(chat_id=self.channel) if isinstance(self.channel, int)
+                           else filters.Chat(username=self.channel.lstrip("@")))
+            self.app.add_handler(MessageHandler(filters.UpdateType.CHANNEL_POSTS & chat_filter,
+                                                self.on_channel_post))
+        self.app.add_handler(TypeHandler(Update, self.answered), group=1)
+
+    @property
+    def bot(self):
+        return self.app.bot
+
+    def launch(self) -> None:
+        """Run ``start`` in the background, retrying with backoff while the Bot API is unreachable."""
+
+        async def run() -> None:
+            delay = 1.0
+            while True:
+                try:
+                    return await self.start()
+                except TelegramError:
+                    log.exception("starting the Telegram bot failed, retrying in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+        self._launcher = asyncio.create_task(run())
+
+    async def start(self) -> None:
+        await self.app.initialize()
+        if not self.app.running:
+            await self.app.start()
+        if self.webhook_url:
+            await self.bot.set_webhook(self.webhook_url, secret_token=self.secret, allowed_updates=Update.ALL_TYPES)
+            log.info("receiving Telegram updates at %s", self.webhook_url)
+        elif self._poller is None:
+            self._poller = asyncio.create_task(self._poll())
+
+    def feed(self, data: Any) -> bool:
+        """Queue one webhook update; ``False`` when the bot cannot take it now and Telegram should retry.
+
+        That is before ``start`` has run and while ``WEBHOOK_BACKLOG`` updates are already waiting.
+        Malformed updates are logged and dropped, since redelivering them would not help.
+        """
+        if not self.app.running or self.app.update_queue.qsize() >= config.WEBHOOK_BACKLOG:
+            return False
+        try:
+            update = Update.de_json(data, self.bot) if isinstance(data, dict) else None
+        except Exception as e:  # PTB raises whatever the missing or mistyped field causes
+            log.warning("dropping malformed Telegram update %.200r: %r", data, e)
+            return True
+        if update is None:
+            log.warning("dropping malformed Telegram update %.200r", data)
+            return True
+        self.app.update_queue.put_nowait(update)
+        return True
+
+    async def _poll(self) -> None:
+        """Long-poll while this instance holds the poller lease; re-checked every third of it."""
+        while True:
+            try:
+                leader = await self.shared.acquire(POLLER_LEASE, config.LEASE_SECONDS)
+            except Exception:
+                # Keep polling (or not) as before; the lease is looked at again next round.
+                log.exception("checking the Telegram poller lease failed")
+                await asyncio.sleep(config.LEASE_SECONDS / 3)
+                continue
+            try:
+                if leader and not self.app.updater.running:
+                    log.info("polling Telegram updates as %s", self.shared.instance_id)
+                    await self.app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                elif not leader and self.app.updater.running:
+                    log.warning("lost the Telegram poller lease to another instance")
+                    await self.app.updater.stop()
+            except TelegramError:
+                log.exception("starting Telegram polling failed")
+            await asyncio.sleep(config.LEASE_SECONDS / 3)
+
+    async def claim_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not await self.shared.claim_once(f"update {update.update_id}", UPDATE_CLAIM_SECONDS):
+            raise ApplicationHandlerStop
+
+    async def answered(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        startup.mark("first_update")
+
+    async def stop(self) -> None:
+        for task in self._bulk.values():
+            task.cancel()
+        await asyncio.gather(*self._bulk.values(), return_exceptions=True)
+        for task in (self._launcher, self._poller, self._reindex):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self.app.updater.running:
+            await self.app.updater.stop()
+        self.shared.release(POLLER_LEASE)
+        if self.app.running:
+            await self.app.stop()
+        await self.app.shutdown()
+
+    # ---- handlers
+
+    async def cmd_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await update.effective_message.reply_text(HELP)
+
+    async def cmd_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = " ".join(context.args or []).strip()
+        if not query:
+            await update.effective_message.reply_text("Format: /cari <judul>")
+            return
+        try:
+            found = await self.gateway.search(query, self.lang)
+        except UpstreamError:
+            await update.effective_message.reply_text("❌ Pencarian gagal, coba lagi.")
+            return
+        if not found:
+            await update.effective_message.reply_text("Tidak ditemukan.")
+            return
+        lines = [f"• {drama_title(d)} - /drama {d.book_id}" for d in found[:SEARCH_RESULTS]]
+        await update.effective_message.reply_text("\n".join(lines))
+
+    async def cmd_drama(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        args = context.args or []
+        if len(args) != 1:
+            await update.effective_message.reply_text("Format: /drama <bookId>")
+            return
+        drama = await self._drama(args[0], self.lang)
+        count = len(episodes_from_chapters(drama))
+        if not count:
+            await update.effective_message.reply_text("❌ Drama tidak ditemukan.")
+            return
+        intro = drama.introduction.strip()
+        if len(intro) > 300:
+            intro = intro[:297] + "..."
+        await update.effective_message.reply_text(
+            f"🎬 {drama_title(drama)}\n{intro}\n\n📺 {count} episode: /ep {args[0]} 1 sampai /ep {args[0]} {count}"
+            f"\n📦 Semua episode: /semua {args[0]}")
+
+    async def cmd_episode(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        args = context.args or []
+        if len(args) != 2 or not args[1].isdigit() or int(args[1]) < 1:
+            await update.effective_message.reply_text("Format: /ep <bookId> <episode>")
+            return
+        await self.deliver_episode(update.effective_chat.id, args[0], int(args[1]) - 1)
+
+    async def cmd_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Send a whole series in the background so the handler slot is freed immediately."""
+        args = context.args or []
+        if len(args) != 1:
+            await update.effective_message.reply_text("Format: /semua <bookId>")
+            return
+        chat_id = update.effective_chat.id
+        running = self._bulk.get(chat_id)
+        if running is not None and not running.done():
+            await update.effective_message.reply_text("⏳ Pengiriman sebelumnya masih berjalan.")
+            return
+        task = asyncio.create_task(self.send_all(chat_id, args[0]))
+        task.add_done_callback(lambda t: self._bulk.pop(chat_id, None) if self._bulk.get(chat_id) is t else None)
+        self._bulk[chat_id] = task
+
+    async def on_channel_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Index episodes posted to the database channel by anyone, not just this bot."""
+        self._index_message(update.channel_post)
+
+    async def cmd_reindex(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Admin: rebuild the index by walking every message in the database channel."""
+        chat_id = update.effective_chat.id
+        if update.effective_user is None or update.effective_user.id not in self.admins:
+            return
+        if self.channel is None:
+            await update.effective_message.reply_text("DATABASE_CHANNEL belum diatur.")
+            return
+        if self._reindex is not None and not self._reindex.done():
+            await update.effective_message.reply_text("⏳ Reindex masih berjalan.")
+            return
+        # Hours for a big channel at the bulk rate, so it must not hold this handler slot.
+        self._reindex = self.app.create_task(self._run_reindex(chat_id), update=update)
+
+    async def _run_reindex(self, chat_id: int) -> None:
+        async def report(done: int, total: int, found: int) -> None:
+            await self.bot.send_message(chat_id, f"⏳ Reindex: {done}/{total} pesan, {found} episode.")
+
+        try:
+            found = await self.rebuild_index(chat_id, report)
+        except TelegramError as e:
+            log.exception("reindexing %s failed", self.channel)
+            await self.bot.send_message(chat_id, f"❌ Reindex gagal: {e}")
+            return
+        await self.bot.send_message(chat_id, f"✅ Reindex selesai: {found} episode, total {len(self.index)}.")
+
+    # ---- delivery
+
+    async def _drama(self, book_id: str, lang: str) -> Drama | None:
+        try:
+            return await self.gateway.chapters(book_id, lang)
+        except UpstreamError:
+            return None
+
+    async def deliver_episode(self, chat_id: int, book_id: str, position: int, lang: str | None = None) -> None:
+        lang = lang or self.lang
+        drama = await self._drama(book_id, lang)
+        episodes = episodes_from_chapters(drama)
+        if not 0 <= position < len(episodes):
+            await self.bot.send_message(chat_id, "❌ Episode tidak ditemukan.")
+            return
+        caption = f"{drama_title(drama)} - Episode {position + 1}"
+        await self._deliver(chat_id, book_id, episodes[position], lang, caption)
+
+    async def send_all(self, chat_id: int, book_id: str, lang: str | None = None) -> None:
+        """Every episode in order, on the bulk lane.
+
+        Up to ``TG_BULK_PREFETCH`` episodes are downloaded and uploaded to the
+        database channel ahead of the one being sent. Without a channel the
+        upload is the delivery, so episodes go one at a time to keep order.
+        """
+        lang = lang or self.lang
+        drama = await self._drama(book_id, lang)
+        episodes = episodes_from_chapters(drama)
+        if not episodes:
+            await self.bot.send_message(chat_id, "❌ Drama tidak ditemukan.")
+            return
+        title = drama_title(drama)
+        await self.bot.send_message(chat_id, f"📦 Mengirim {len(episodes)} episode {title}...")
+        slots = asyncio.Semaphore(config.TG_BULK_PREFETCH if self.channel is not None else 1)
+
+        async def prepare(ep: Episode, caption: str) -> tuple[IndexedFile, bool]:
+            async with slots:
+                return await self.episode_file(book_id, ep, lang, caption, chat_id, BULK)
+
+        captions = [f"{title} - Episode {ep.position + 1}" for ep in episodes]
+        ready = [asyncio.ensure_future(prepare(ep, caption)) for ep, caption in zip(episodes, captions)]
+        try:
+            for ep, caption, fut in zip(episodes, captions, ready):
+                await self._deliver(chat_id, book_id, ep, lang, caption, BULK, fut)
+        finally:
+            for fut in ready:
+                fut.cancel()
+            await asyncio.gather(*ready, return_exceptions=True)
+        await self.bot.send_message(chat_id, f"✅ {title}: selesai.", rate_limit_args={"lane": BULK})
+
+    async def _deliver(self, chat_id: int, book_id: str, ep: Episode, lang: str, caption: str,
+                       lane: int = INTERACTIVE, ready: asyncio.Future | None = None) -> None:
+        """Send one episode; ``ready`` is an ``episode_file`` call already in flight."""
+        error = None
+        for _ in range(2):
+            try:
+                file, sent = await (ready if ready is not None else
+                                    self.episode_file(book_id, ep, lang, caption, chat_id, lane))
+            except EpisodeUnavailable as e:
+                await self.bot.send_message(chat_id, f"❌ {caption}: {e}", rate_limit_args={"lane": lane})
+                return
+            ready = None
+            if sent:
+                return
+            try:
+                await self.bot.send_video(chat_id, file.file_id, caption=caption, supports_streaming=True,
+                                          rate_limit_args={"lane": lane})
+                return
+            except BadRequest as e:
+                # file_id from an old bot token or a deleted upload: forget it and upload again.
+                log.warning("stale file_id for %s/%s: %s", book_id, ep.chapter_index, e)
+                self.index.forget(file.file_id)
+                error = e
+        log.error("giving up on %s/%s for chat %s: %s", book_id, ep.chapter_index, chat_id, error)
+        await self.bot.send_message(chat_id, f"❌ {caption}: video gagal dikirim, coba lagi nanti.",
+                                    rate_limit_args={"lane": lane})
+
+    async def episode_file(self, book_id: str, ep: Episode, lang: str, caption: str,
+                           chat_id: int, lane: int = INTERACTIVE) -> tuple[IndexedFile, bool]:
+        """The episode's Telegram file, uploading it first on an index miss.
+
+        Returns ``(file, sent)`` where ``sent`` means the upload itself already
+        went to ``chat_id`` (no database channel configured).
+        """
+        hit = await self.index.get(book_id, ep.chapter_index, lang)
+        if hit is not None:
+            return hit, False
+        target = self.channel if self.channel is not None else chat_id
+        file = await self.flight.do(f"upload {book_id}/{ep.chapter_index}?lang={lang}&to={target}",
+                                    lambda: self._upload(book_id, ep, lang, caption, target, lane))
+        return file, target == chat_id
+
+    async def _upload(self, book_id: str, ep: Episode, lang: str, caption: str,
+                      target: int | str, lane: int = INTERACTIVE) -> IndexedFile:
+        url = await self.resolver.resolve(book_id, ep.chapter_index, lang)
+        if not url:
+            raise EpisodeUnavailable("Link video tidak tersedia.")
+        os.makedirs(config.DOWNLOAD_DIR, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="tg-", dir=config.DOWNLOAD_DIR) as tmp:
+            sink = FileSink(tmp)
+            progress = await self.pipeline.run(book_id, [ep], sink, lang=lang)
+            state = progress.episode(ep.position)
+            if state.status != "done":
+                raise EpisodeUnavailable(f"Download gagal: {state.error or 'unknown'}")
+            path = sink.path(ep)
+            if os.path.getsize(path) > MAX_UPLOAD_BYTES:
+                raise EpisodeUnavailable("File terlalu besar untuk Telegram (>50MB).")
+            quality = quality_from_url(url)
+            full_caption = f"{caption}\n{caption_tag(book_id, ep.chapter_index, lang, quality)}"
+            with open(path, "rb") as f:
+                if ep.filename.endswith(".mp4"):
+                    msg = await self.bot.send_video(target, f, caption=full_caption, filename=ep.filename,
+                                                    supports_streaming=True, rate_limit_args={"lane": lane})
+                else:
+                    msg = await self.bot.send_document(target, f, caption=full_caption, filename=ep.filename,
+                                                       rate_limit_args={"lane": lane})
+        file = self._index_message(msg)
+        if file is None:
+            raise EpisodeUnavailable("Upload ke Telegram gagal.")
+        return file
+
+    # ---- index maintenance
+
+    def _index_message(self, msg: Message | None, channel_message_id: int | None = None) -> IndexedFile | None:
+        """Record a tagged video/document; ``channel_message_id`` defaults to ``msg``'s own id in the channel."""
+        if msg is None:
+            return None
+        media = msg.video or msg.document
+        key = parse_caption(msg.caption)
+        if media is None or key is None:
+            return None
+        if channel_message_id is None and self.channel is not None and (
+                msg.chat.id == self.channel or f"@{msg.chat.username}" == self.channel):
+            channel_message_id = msg.message_id
+        file = IndexedFile(*key, media.file_id, media.file_unique_id, channel_message_id, media.file_size)
+        self.index.put(file)
+        return file
+
+    async def rebuild_index(self, scratch_chat: int,
+                            report: Callable[[int, int, int], Awaitable[None]] | None = None) -> int:
+        """Forward each channel message to ``scratch_chat`` to read its caption, then delete the copy.
+
+        The Bot API has no channel history call; forwarding by message id is
+        the only way a bot can look at old posts. It all runs on the bulk lane.
+        ``report(done, total, found)`` is awaited every ``REINDEX_REPORT_EVERY``
+        messages.
+        """
+        bulk = {"lane": BULK}
+        probe = await self.bot.send_message(self.channel, "reindex", disable_notification=True,
+                                            rate_limit_args=bulk)
+        last_id = probe.message_id
+        await self.bot.delete_message(self.channel, last_id, rate_limit_args=bulk)
+        found = 0
+        for message_id in range(1, last_id):
+            try:
+                fwd = await self.bot.forward_message(scratch_chat, self.channel, message_id,
+                                                     disable_notification=True, rate_limit_args=bulk)
+            except TelegramError:
+                continue  # deleted or service message
+            if self._index_message(fwd, message_id):
+                found += 1
+            await self.bot.delete_message(scratch_chat, fwd.message_id, rate_limit_args=bulk)
+            if report is not None and message_id % REINDEX_REPORT_EVERY == 0:
+                await report(message_id, last_id - 1, found)
+        return found
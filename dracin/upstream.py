@@ -0,0 +1,137 @@
+"""Shared async HTTP client for restxdb and the video CDNs.
+
+One ``httpx.AsyncClient`` lives for the whole process so TLS handshakes and
+HTTP/2 connections are paid once per connection, not once per request.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, AsyncIterator, Mapping
+
+import httpx
+
+from . import config
+from .breaker import ENDPOINT_CLASSES, CircuitOpen, EndpointGuard, endpoint_class
+from .metrics import UPSTREAM_SECONDS, span
+
+log = logging.getLogger(__name__)
+
+# restxdb endpoints with their own latency series; anything else is reported as "other".
+METRIC_ENDPOINTS = frozenset(("foryou", "rank", "new", "search", "suggest", "chapters", "watch"))
+
+USER_AGENT = "Mozilla/5.0 (Linux; Android 12) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Mobile Safari/537.36"
+
+
+class UpstreamError(Exception):
+    """Raised when restxdb cannot be reached or answers with a non-JSON body."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+def endpoint_label(path: str) -> str:
+    first = path.strip("/").split("/", 1)[0]
+    return first if first in METRIC_ENDPOINTS else "other"
+
+
+def build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            config.HTTP_READ_TIMEOUT,
+            connect=config.HTTP_CONNECT_TIMEOUT,
+            pool=config.HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+class Upstream:
+    """Pooled gateway to restxdb with a concurrency cap per remote host."""
+
+    def __init__(self, base_url: str = config.API_BASE, client: httpx.AsyncClient | None = None,
+                 max_per_host: int = config.HTTP_MAX_PER_HOST):
+        self.base_url = base_url.rstrip("/")
+        self.client = client or build_client()
+        self._max_per_host = max_per_host
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self.guards = {name: EndpointGuard(name) for name in ENDPOINT_CLASSES}
+
+    def slot(self, url: str | httpx.URL) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        sem = self._slots.get(host)
+        if sem is None:
+            sem = self._slots[host] = asyncio.Semaphore(self._max_per_host)
+        return sem
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def request(self, method: str, path: str, *, params: Mapping[str, Any] | None = None,
+                      content: bytes | None = None, json: Any = None,
+                      headers: Mapping[str, str] | None = None) -> httpx.Response:
+        """One restxdb call through its endpoint class's breaker and concurrency limit."""
+        url = self.url(path)
+
+        async def send() -> httpx.Response:
+            async with self.slot(url):
+                return await self.client.request(method, url, params=params, content=content,
+                                                 json=json, headers=headers)
+
+        endpoint = endpoint_label(path)
+        started = time.perf_counter()
+        try:
+            with span(f"restxdb {method} /{endpoint}"):
+                response = await self.guards[endpoint_class(path)].call(send)
+        except CircuitOpen:
+            raise  # failed fast; counted by the breaker, not a latency sample
+        except httpx.HTTPError:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint, method, "error")
+            raise
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint, method, f"{response.status_code // 100}xx")
+        return response
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url: str, headers: Mapping[str, str] | None = None) -> AsyncIterator[httpx.Response]:
+        """Stream an absolute URL (CDN video) holding that host's slot until closed."""
+        with span("cdn GET", host=httpx.URL(url).host):
+            async with self.slot(url):
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    yield response
+
+    async def get_json(self, path: str, params: Mapping[str, Any] | None = None) -> Any:
+        return self._decode(await self._call("GET", path, params=params))
+
+    async def post_json(self, path: str, payload: Any, params: Mapping[str, Any] | None = None) -> Any:
+        return self._decode(await self._call("POST", path, params=params, json=payload))
+
+    async def _call(self, method: str, path: str, **kwargs) -> httpx.Response:
+        try:
+            return await self.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise UpstreamError(f"{method} {path}: {e!r}") from e
+
+    @staticmethod
+    def _decode(response: httpx.Response) -> Any:
+        if response.status_code >= 500:
+            raise UpstreamError(f"{response.request.url.path}: HTTP {response.status_code}",
+                                response.status_code)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise UpstreamError(f"{response.request.url.path}: invalid JSON", response.status_code) from e
+
+    def snapshot(self) -> dict:
+        return {name: guard.snapshot() for name, guard in self.guards.items()}
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
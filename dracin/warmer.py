@@ -0,0 +1,195 @@
+"""Background catalog warmer.
+
+Traffic follows the rank and foryou lists, so every ``WARM_INTERVAL``
+(jittered) this walks ``rank``/``foryou``/``new`` page by page through the
+gateway, then pre-warms ``/chapters`` and the first ``WARM_EPISODES``
+video URLs of the top ``WARM_TOP_DRAMAS`` dramas. Everything goes through
+the same cache, single-flight and resolver as user requests, so a warm
+entry is exactly the one a visitor would hit; the interval is shorter than
+the catalog TTL plus its stale window, so visitors never pay a cold miss.
+
+All calls share a ``WARM_CONCURRENCY`` budget with a small random gap
+between them. Errors or cold-start latency from restxdb end the pass
+early, and each consecutive bad pass doubles the wait before the next one.
+
+With several instances only the holder of the ``warmer`` lease runs
+passes; the others skip theirs and take over once the lease expires.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable
+
+from . import config
+from .gateway import Gateway
+from .models import dramas_in
+from .resolver import VideoResolver
+from .shared import SharedState
+from .upstream import UpstreamError
+
+log = logging.getLogger(__name__)
+
+# (list, extra params) in priority order. ``new`` page 1 uses the page's own pageSize so keys match.
+CATALOG_LISTS: tuple[tuple[str, dict[str, str]], ...] = (("rank", {}), ("foryou", {}), ("new", {"pageSize": "12"}))
+
+# Strikes within one pass (errors or slow answers) that end it early.
+MAX_STRIKES = 3
+
+LEASE = "warmer"
+
+
+@dataclass(slots=True)
+class WarmStats:
+    passes: int = 0
+    aborted: int = 0
+    pages: int = 0
+    dramas: int = 0
+    episodes: int = 0
+    errors: int = 0
+    slow: int = 0
+    skipped: int = 0  # passes left to the instance holding the lease
+    last_pass_seconds: float = 0.0
+
+
+class _Abort(Exception):
+    """Too many strikes in this pass; restxdb needs a break."""
+
+
+class CatalogWarmer:
+    def __init__(self, gateway: Gateway, resolver: VideoResolver, lang: str = config.LANG,
+                 interval: float = config.WARM_INTERVAL, pages: int = config.WARM_PAGES,
+                 top: int = config.WARM_TOP_DRAMAS, episodes: int = config.WARM_EPISODES,
+                 concurrency: int = config.WARM_CONCURRENCY, slow: float = config.WARM_SLOW_SECONDS,
+                 shared: SharedState | None = None):
+        self.gateway = gateway
+        self.resolver = resolver
+        self.lang = lang
+        self.interval = interval
+        self.pages = pages
+        self.top = top
+        self.episodes = episodes
+        self.slow = slow
+        self.shared = shared if shared is not None else SharedState()
+        self.stats = WarmStats()
+        self.failures = 0  # consecutive bad passes
+        self._budget = asyncio.Semaphore(concurrency)
+        self._strikes = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self.shared.release(LEASE)
+
+    def next_delay(self) -> float:
+        """Interval with ±20% jitter, doubled per consecutive bad pass (up to 8x)."""
+        return self.interval * min(8, 2 ** self.failures) * random.uniform(0.8, 1.2)
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(random.uniform(1.0, 5.0))  # let startup finish first
+        while True:
+            # Held through the pass and the wait after it, so the leader keeps it while it is alive.
+            if await self._lead(2 * self.interval + config.LEASE_SECONDS):
+                try:
+                    ok = await self.run_once()
+                except Exception:
+                    log.exception("catalog warm pass crashed")
+                    ok = False
+                self.failures = 0 if ok else self.failures + 1
+                delay = self.next_delay()
+                await self._lead(delay + config.LEASE_SECONDS)
+            else:
+                self.stats.skipped += 1
+                delay = self.next_delay()
+            await asyncio.sleep(delay)
+
+    async def _lead(self, seconds: float) -> bool:
+        """Take or extend the warm lease; a shared-state error counts as not leading."""
+        try:
+            return await self.shared.acquire(LEASE, seconds)
+        except Exception:
+            log.exception("taking the catalog warm lease failed")
+            return False
+
+    async def run_once(self) -> bool:
+        """One warm pass; returns ``False`` when it was cut short by upstream trouble."""
+        started = time.monotonic()
+        self._strikes = 0
+        self.stats.passes += 1
+        ok = True
+        try:
+            ranked = await self._walk_lists()
+            async with asyncio.TaskGroup() as tg:
+                for book_id in ranked[:self.top]:
+                    tg.create_task(self._warm_drama(book_id))
+        except (_Abort, ExceptionGroup) as e:
+            if isinstance(e, ExceptionGroup) and e.subgroup(_Abort) is None:
+                raise
+            ok = False
+            self.stats.aborted += 1
+            log.info("catalog warm pass stopped early after %d strikes", self._strikes)
+        self.stats.last_pass_seconds = round(time.monotonic() - started, 3)
+        return ok
+
+    async def _walk_lists(self) -> list[str]:
+        """Book ids in list priority order (rank first), deduplicated."""
+        ranked: dict[str, None] = {}
+        for name, extra in CATALOG_LISTS:
+            for page in range(1, self.pages + 1):
+                params = {"lang": self.lang, **(extra if page == 1 else {})}
+                data = await self._call(lambda: self.gateway.get_json(f"/{name}/{page}", params))
+                found = list(dramas_in(data)) if data is not None else []
+                if not found:
+                    break
+                self.stats.pages += 1
+                ranked.update((d.book_id, None) for d in found)
+        return list(ranked)
+
+    async def _warm_drama(self, book_id: str) -> None:
+        drama = await self._call(lambda: self.gateway.chapters(book_id, self.lang))
+        if drama is None or not drama.chapters:
+            return
+        self.stats.dramas += 1
+        for chapter_index in list(drama.chapters)[:self.episodes]:
+            url = await self._call(lambda: self.resolver.resolve(book_id, chapter_index, self.lang))
+            if url:
+                self.stats.episodes += 1
+            else:
+                self._strike()
+
+    async def _call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run one upstream call inside the budget, with a jittered gap and strike accounting."""
+        if self._strikes >= MAX_STRIKES:
+            raise _Abort
+        async with self._budget:
+            await asyncio.sleep(random.uniform(0.05, 0.25))
+            started = time.monotonic()
+            try:
+                result = await fn()
+            except UpstreamError as e:
+                self.stats.errors += 1
+                log.info("warm call failed: %s", e)
+                self._strike()
+                return None
+            if time.monotonic() - started > self.slow:
+                self.stats.slow += 1
+                self._strike()
+            return result
+
+    def _strike(self) -> None:
+        self._strikes += 1
+        if self._strikes >= MAX_STRIKES:
+            raise _Abort
+
+    def snapshot(self) -> dict:
+        return {**asdict(self.stats), "consecutive_failures": self.failures, "enabled": self._task is not None,
+                "leader": self.shared.holds(LEASE)}
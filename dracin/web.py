@@ -0,0 +1,558 @@
+"""ASGI app: the web UI plus the ``/api/*`` gateway to restxdb."""
+
+import asyncio
+import contextlib
+import hmac
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Awaitable, Callable
+from urllib.parse import quote
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from . import config, metrics, startup
+from .cache import TTLCache
+from .downloads import DownloadManager, DownloadPipeline, ZipSink, drama_title, safe_title
+from .fileindex import FileIndex
+from .gateway import Gateway
+from .images import IMMUTABLE, PLACEHOLDER_SVG, ImageProxy, ImageUnavailable
+from .jobs import JobStore
+from .models import dramas_in
+from .pages import Page, build_page, drama_html, etag_matches, fill, home_html
+from .relay import (PLAYLIST_CONTENT_TYPE, RELAY_CACHE_CONTROL, EpisodeRef, RelayError, VideoRelay, local_playlist,
+                    parse_range)
+from .resolver import VideoResolver
+from .search import SearchIndex
+from .shared import open_shared
+from .singleflight import SingleFlight
+from .upstream import Upstream, UpstreamError
+from .warmer import CatalogWarmer
+
+log = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).parent / "static"
+INDEX_HTML = (STATIC_DIR / "index.html").read_text(encoding="utf-8")
+# The page with nothing pre-rendered; the browser builds #app itself.
+SHELL_PAGE = build_page(fill(INDEX_HTML, "", None), 9, 11)
+
+# Headers copied from the browser request to restxdb.
+FORWARD_REQUEST_HEADERS = ("content-type", "accept", "accept-language")
+
+WEBHOOK_PATH = "/telegram/webhook"
+
+JOB_ID_RE = re.compile(r"[A-Za-z0-9_-]{6,32}")
+
+SSE_MIN_INTERVAL = 0.5
+SSE_KEEPALIVE = 15.0
+
+
+async def _page(request: Request, key: str, render: Callable[[], Awaitable[Page]],
+                fallback: Callable[[], Page]) -> Response:
+    """A cached pre-rendered page, or the client-rendered ``fallback`` when upstream has no data."""
+    state = request.app.state
+
+    async def load() -> tuple[Page, int]:
+        page = await render()
+        return page, page.size
+
+    try:
+        page = await state.cache.fetch(key, lambda: state.flight.do(key, load), config.PAGE_TTL, config.PAGE_STALE_TTL)
+    except UpstreamError as e:
+        log.info("pre-rendering %s failed: %s", key, e)
+        page = await asyncio.to_thread(fallback)  # may compress a page of its own
+    return page.respond(request)
+
+
+async def index(request: Request) -> Response:
+    gateway: Gateway = request.app.state.gateway
+    lang = config.LANG
+
+    async def render() -> Page:
+        recommended, popular, latest = await asyncio.gather(
+            gateway.get_json("/foryou/1", {"lang": lang}),
+            gateway.get_json("/rank/1", {"lang": lang}),
+            gateway.get_json("/new/1", {"lang": lang, "pageSize": "12"}))
+        html = home_html(list(dramas_in(recommended)), list(dramas_in(popular)), list(dramas_in(latest)))
+        return await asyncio.to_thread(build_page, fill(INDEX_HTML, html, {"view": "home"}))
+
+    return await _page(request, f"page:/?lang={lang}", render, lambda: SHELL_PAGE)
+
+
+async def drama_page(request: Request) -> Response:
+    gateway: Gateway = request.app.state.gateway
+    book_id, lang = request.path_params["book_id"], config.LANG
+
+    async def render() -> Page:
+        drama = await gateway.chapters(book_id, lang)
+        if drama is None:
+            raise UpstreamError(f"drama {book_id} not found", 404)
+        preload = {"view": "drama", "drama": drama.to_record(chapters=True)}
+        return await asyncio.to_thread(build_page, fill(INDEX_HTML, drama_html(drama), preload))
+
+    return await _page(request, f"page:/drama/{book_id}?lang={lang}", render,
+                       lambda: build_page(fill(INDEX_HTML, "", {"view": "drama", "id": book_id})))
+
+
+async def api_proxy(request: Request) -> Response:
+    return await _proxy(request, "/" + request.path_params["path"])
+
+
+async def _proxy(request: Request, path: str) -> Response:
+    gateway: Gateway = request.app.state.gateway
+    headers = {k: v for k, v in request.headers.items() if k in FORWARD_REQUEST_HEADERS}
+    body = await request.body() if request.method == "POST" else None
+    try:
+        result = await gateway.forward(request.method, path, request.query_params.multi_items(), body, headers)
+    except httpx.HTTPError as e:
+        log.warning("proxy %s %s failed: %r", request.method, path, e)
+        return JSONResponse({"success": False, "message": "upstream unavailable"}, status_code=502)
+    return Response(result.content, status_code=result.status, media_type=result.content_type)
+
+
+async def suggest(request: Request) -> Response:
+    """``handleSearch`` suggestions from the local index, upstream only on a miss."""
+    query = request.path_params["query"]
+    lang = request.query_params.get("lang", config.LANG)
+    await request.app.state.search.load()
+    found = request.app.state.search.suggest(query, lang)
+    if found:
+        return JSONResponse({"success": True, "data": found})
+    return await _proxy(request, f"/suggest/{quote(query, safe='')}")
+
+
+async def search(request: Request) -> Response:
+    """``doSearch`` results; the local index answers every page of a query it can fill a page for."""
+    query, page = request.path_params["query"], request.path_params["page"]
+    lang = request.query_params.get("lang", config.LANG)
+    await request.app.state.search.load()
+    found = request.app.state.search.search(query, lang, page) if page >= 1 else None
+    if found is not None:
+        return JSONResponse({"success": True, "data": {"list": [d.to_record() for d in found]}})
+    return await _proxy(request, f"/search/{quote(query, safe='')}/{page}")
+
+
+async def image(request: Request) -> Response:
+    """``/img/{size}?src=<cover>``: a cached thumbnail, or the placeholder when it cannot be made."""
+    await request.app.state.search.load()  # the saved dramas tell which cover hosts are allowed
+    try:
+        thumb = await request.app.state.images.thumbnail(request.query_params.get("src", ""),
+                                                         request.path_params["size"],
+                                                         request.headers.get("accept", ""))
+    except ImageUnavailable as e:
+        log.info("image %s: %s", request.url.query, e)
+        return Response(PLACEHOLDER_SVG, media_type="image/svg+xml", headers={"Cache-Control": "public, max-age=300"})
+    headers = {"ETag": thumb.etag, "Cache-Control": IMMUTABLE, "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match", ""), thumb.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(thumb.body, media_type=thumb.content_type, headers=headers)
+
+
+async def placeholder(request: Request) -> Response:
+    return Response(PLACEHOLDER_SVG, media_type="image/svg+xml", headers={"Cache-Control": IMMUTABLE})
+
+
+async def resolve_one(request: Request) -> Response:
+    resolver: VideoResolver = request.app.state.resolver
+    book_id, idx = request.path_params["book_id"], request.path_params["chapter_index"]
+    url = await resolver.resolve(book_id, idx, request.query_params.get("lang"))
+    if not url and request.app.state.upstream.guards["watch"].breaker.is_open:
+        return JSONResponse({"success": False, "message": "video service busy, retry shortly"}, status_code=503,
+                            headers={"Retry-After": str(int(config.BREAKER_COOLDOWN))})
+    if not url:
+        return JSONResponse({"success": False, "message": "video not found"}, status_code=404)
+    return JSONResponse({"success": True, "data": {"videoUrl": url}})
+
+
+def _episode(request: Request) -> EpisodeRef:
+    return EpisodeRef(request.path_params["book_id"], request.path_params["chapter_index"],
+                      request.query_params.get("lang") or config.LANG)
+
+
+def _relay_error(e: RelayError) -> Response:
+    headers = {"Retry-After": str(int(config.BREAKER_COOLDOWN))} if e.status == 503 else None
+    return JSONResponse({"success": False, "message": str(e)}, status_code=e.status, headers=headers)
+
+
+async def play_video(request: Request) -> Response:
+    """A progressive episode through the relay, with Range support."""
+    relay: VideoRelay = request.app.state.relay
+    ep = _episode(request)
+    try:
+        media = await relay.media(ep)
+    except RelayError as e:
+        return _relay_error(e)
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": RELAY_CACHE_CONTROL}
+    try:
+        span = parse_range(request.headers.get("range", ""), media.size)
+    except RelayError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{media.size}"})
+    first, last = span or (0, media.size - 1)
+    if first == 0:
+        relay.prefetch_next(ep)  # playback is starting
+    if span is not None:
+        headers["Content-Range"] = f"bytes {first}-{last}/{media.size}"
+    headers["Content-Length"] = str(last - first + 1)
+    return StreamingResponse(relay.stream(ep, media, first, last), status_code=206 if span else 200,
+                             media_type=media.content_type, headers=headers)
+
+
+async def play_playlist(request: Request) -> Response:
+    """An HLS episode's media playlist, rewritten to fetch segments through the relay."""
+    relay: VideoRelay = request.app.state.relay
+    ep = _episode(request)
+    try:
+        playlist = await relay.playlist(ep)
+    except RelayError as e:
+        return _relay_error(e)
+    relay.prefetch_next(ep)
+    text = local_playlist(playlist, f"?lang={quote(ep.lang, safe='')}")
+    return Response(text, media_type=PLAYLIST_CONTENT_TYPE, headers={"Cache-Control": "no-cache"})
+
+
+async def play_segment(request: Request) -> Response:
+    try:
+        data, content_type = await request.app.state.relay.segment(_episode(request), request.path_params["part"])
+    except RelayError as e:
+        return _relay_error(e)
+    return Response(data, media_type=content_type, headers={"Cache-Control": RELAY_CACHE_CONTROL})
+
+
+async def resolve_batch(request: Request) -> Response:
+    """``/resolve/{book_id}?chapters=0,1,2`` -> ``{"data": {"0": url, ...}}``."""
+    resolver: VideoResolver = request.app.state.resolver
+    try:
+        chapters = [int(x) for x in request.query_params.get("chapters", "").split(",") if x.strip()]
+    except ValueError:
+        return JSONResponse({"success": False, "message": "chapters must be integers"}, status_code=400)
+    urls = await resolver.resolve_many(request.path_params["book_id"], chapters, request.query_params.get("lang"))
+    return JSONResponse({"success": True, "data": {str(k): v for k, v in urls.items()}})
+
+
+async def download_start(request: Request) -> Response:
+    try:
+        payload = await request.json()
+        book_id = str(payload["bookId"])
+    except (ValueError, KeyError, TypeError):
+        return JSONResponse({"success": False, "message": "bookId is required"}, status_code=400)
+    job = request.app.state.downloads.enqueue(book_id, payload.get("lang"))
+    return JSONResponse({"success": True, "data": job.snapshot()}, status_code=202)
+
+
+async def download_status(request: Request) -> Response:
+    downloads: DownloadManager = request.app.state.downloads
+    job = await downloads.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"success": False, "message": "job not found"}, status_code=404)
+    if request.method == "DELETE":
+        await downloads.cancel(job.id)
+    return JSONResponse({"success": True, "data": job.snapshot()})
+
+
+async def download_events(request: Request) -> Response:
+    """Server-sent events with the job snapshot each time it changes."""
+    job = await request.app.state.downloads.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"success": False, "message": "job not found"}, status_code=404)
+
+    async def events():
+        seen = -1
+        while True:
+            if job.version != seen:
+                seen = job.version
+                yield f"data: {json.dumps(job.snapshot())}\n\n"
+                if job.finished:
+                    return
+                await asyncio.sleep(SSE_MIN_INTERVAL)  # coalesce bursts of chunk checkpoints
+            elif not await job.wait_changed(SSE_KEEPALIVE):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def download_archive(request: Request) -> Response:
+    downloads: DownloadManager = request.app.state.downloads
+    job = await downloads.get(request.path_params["job_id"])
+    if job is None or not job.persistent or not job.progress.transfer.done:
+        return JSONResponse({"success": False, "message": "nothing downloaded yet"}, status_code=404)
+    filename = f"{safe_title(job.title)}_{job.progress.transfer.done}EP.zip"
+    return StreamingResponse(downloads.archive(job), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+async def download_zip(request: Request) -> Response:
+    """Stream ``/download/{book_id}.zip`` while the episodes are still downloading.
+
+    ``?job=<id>`` lets the page poll ``/downloads/<id>`` for progress.
+    """
+    downloads: DownloadManager = request.app.state.downloads
+    book_id, lang = request.path_params["book_id"], request.query_params.get("lang")
+    try:
+        drama = await request.app.state.gateway.chapters(book_id, lang)
+    except UpstreamError:
+        drama = None
+    if drama is None or not drama.chapters:
+        return JSONResponse({"success": False, "message": "drama not found"}, status_code=404)
+    job_id = request.query_params.get("job", "")
+    if not JOB_ID_RE.fullmatch(job_id) or await downloads.get(job_id):
+        job_id = None
+    sink = ZipSink()
+    job = downloads.stream(book_id, drama, sink, lang, job_id)
+
+    async def body():
+        try:
+            async for data in sink.stream():
+                yield data
+        finally:
+            await downloads.cancel(job.id)
+
+    filename = f"{safe_title(drama_title(drama))}.zip"
+    return StreamingResponse(body(), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def _admin_denied(request: Request) -> Response | None:
+    """The answer for a request without the admin token; ``None`` when it may see diagnostics."""
+    if not config.ADMIN_TOKEN:
+        return JSONResponse({"success": False, "message": "not enabled"}, status_code=404)
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), config.ADMIN_TOKEN):
+        return JSONResponse({"success": False, "message": "admin token required"}, status_code=401,
+                            headers={"WWW-Authenticate": "Bearer"})
+    return None
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if (denied := _admin_denied(request)) is not None:
+        return denied
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def traces(request: Request) -> Response:
+    """Recently sampled request traces, newest first (``?sort=slowest`` for the slowest first)."""
+    if (denied := _admin_denied(request)) is not None:
+        return denied
+    items = list(reversed(metrics.TRACES))
+    if request.query_params.get("sort") == "slowest":
+        items.sort(key=lambda t: t["duration_ms"], reverse=True)
+    return JSONResponse({"sample_rate": config.TRACE_SAMPLE_RATE, "traces": items})
+
+
+def register_collectors(state) -> None:
+    """Expose the counters each component already keeps for /stats as Prometheus metrics."""
+
+    def lookups():
+        catalog = state.cache.stats
+        yield ("catalog", "hit"), catalog.hits
+        yield ("catalog", "stale"), catalog.stale_hits
+        yield ("catalog", "last_known"), catalog.last_known_hits
+        yield ("catalog", "shared"), catalog.shared_hits
+        yield ("catalog", "miss"), catalog.misses
+        for name, component in (("video_url", state.resolver), ("telegram_file", state.fileindex),
+                                ("thumbnail", state.images), ("relay", state.relay)):
+            yield (name, "hit"), component.hits
+            yield (name, "miss"), component.misses
+        yield ("search", "hit"), state.search.local_hits
+        yield ("search", "miss"), state.search.fallbacks
+
+    def cache_bytes():
+        yield ("catalog",), state.cache.snapshot()["bytes"]
+        yield ("thumbnail",), state.images.cache.bytes
+        yield ("relay",), state.relay.cache.bytes
+
+    def upstream(key):
+        def collect():
+            for name, guard in state.upstream.guards.items():
+                yield (name,), {"limit": guard.limiter.limit, "in_flight": guard.limiter.in_flight,
+                                "open": float(guard.breaker.is_open), "trips": guard.breaker.trips,
+                                "rejected": guard.breaker.rejected}[key]
+        return collect
+
+    def downloads():
+        snapshot = state.downloads.snapshot()
+        for key in ("queued", "running"):
+            yield (key,), snapshot[key]
+
+    def download_stages():
+        snapshot = state.downloads.snapshot()
+        yield ("resolve",), snapshot["resolving"]
+        yield ("transfer",), snapshot["transferring"]
+
+    def telegram_queue():
+        if state.bot is not None:
+            snapshot = state.bot.scheduler.snapshot()
+            yield ("interactive",), snapshot["interactive_waiting"]
+            yield ("bulk",), snapshot["bulk_waiting"]
+
+    metrics.collected("dracin_cache_lookups_total", "Cache lookups by cache and result (hit ratio = hit / all).",
+                      "counter", ("cache", "result"), lookups)
+    metrics.collected("dracin_cache_bytes", "Bytes held by each size-bounded cache.", "gauge", ("cache",),
+                      cache_bytes)
+    metrics.collected("dracin_relay_bytes_total", "Video bytes the relay served to players and fetched from the CDN.",
+                      "counter", ("direction",),
+                      lambda: [(("served",), state.relay.bytes_served), (("fetched",), state.relay.bytes_fetched)])
+    metrics.collected("dracin_singleflight_calls_total", "Single-flight calls that led or shared an upstream call.",
+                      "counter", ("role",),
+                      lambda: [(("leader",), state.flight.stats.leaders), (("shared",), state.flight.stats.shared)])
+    metrics.collected("dracin_upstream_concurrency_limit", "Adaptive concurrency limit per restxdb endpoint class.",
+                      "gauge", ("class",), upstream("limit"))
+    metrics.collected("dracin_upstream_in_flight", "restxdb calls in flight per endpoint class.", "gauge",
+                      ("class",), upstream("in_flight"))
+    metrics.collected("dracin_upstream_circuit_open", "1 while the endpoint class's circuit breaker is not closed.",
+                      "gauge", ("class",), upstream("open"))
+    metrics.collected("dracin_upstream_circuit_trips_total", "Circuit breaker trips per endpoint class.", "counter",
+                      ("class",), upstream("trips"))
+    metrics.collected("dracin_upstream_rejected_total", "Calls failed fast by an open circuit.", "counter",
+                      ("class",), upstream("rejected"))
+    metrics.collected("dracin_download_jobs", "Download jobs waiting in the queue or running.", "gauge",
+                      ("state",), downloads)
+    metrics.collected("dracin_download_episodes_active", "Episodes being resolved or transferred.", "gauge",
+                      ("stage",), download_stages)
+    metrics.collected("dracin_telegram_queue_depth", "Bot API calls waiting in the send scheduler.", "gauge",
+                      ("lane",), telegram_queue)
+    metrics.collected("dracin_startup_seconds", "Seconds from process start to each startup phase.", "gauge",
+                      ("phase",), lambda: [((phase,), seconds) for phase, seconds in startup.snapshot().items()])
+
+
+async def save_snapshots(state) -> None:
+    """Write the catalog cache and the search index out for the next start."""
+    for name, save in (("catalog", state.cache.save_snapshot), ("search", state.search.save)):
+        try:
+            count = await save()
+        except OSError:
+            log.exception("saving the %s snapshot failed", name)
+        else:
+            log.debug("%s snapshot: %d records", name, count)
+
+
+async def snapshot_loop(state) -> None:
+    while True:
+        await asyncio.sleep(config.SNAPSHOT_INTERVAL)
+        await save_snapshots(state)
+
+
+async def telegram_webhook(request: Request) -> Response:
+    """Telegram update delivery; queued and acknowledged at once, or 503 so Telegram retries later."""
+    bot = request.app.state.bot
+    if bot is None or not bot.webhook_url:
+        return JSONResponse({"success": False, "message": "webhook not enabled"}, status_code=404)
+    if not hmac.compare_digest(request.headers.get("x-telegram-bot-api-secret-token", ""), bot.secret):
+        return JSONResponse({"success": False, "message": "bad secret"}, status_code=403)
+    try:
+        data = await request.json()
+    except ValueError:
+        return JSONResponse({"success": False, "message": "invalid JSON"}, status_code=400)
+    if not bot.feed(data):
+        return JSONResponse({"success": False, "message": "bot not ready"}, status_code=503,
+                            headers={"Retry-After": "5"})
+    return JSONResponse({"success": True})
+
+
+async def stats(request: Request) -> Response:
+    if (denied := _admin_denied(request)) is not None:
+        return denied
+    bot = request.app.state.bot
+    return JSONResponse({
+        "upstream": request.app.state.upstream.snapshot(),
+        "cache": request.app.state.cache.snapshot(),
+        "singleflight": request.app.state.flight.snapshot(),
+        "resolver": request.app.state.resolver.snapshot(),
+        "fileindex": request.app.state.fileindex.snapshot(),
+        "search": request.app.state.search.snapshot(),
+        "warmer": request.app.state.warmer.snapshot(),
+        "images": request.app.state.images.snapshot(),
+        "relay": request.app.state.relay.snapshot(),
+        "downloads": request.app.state.downloads.snapshot(),
+        "shared": request.app.state.shared.snapshot(),
+        "telegram": bot.scheduler.snapshot() if bot is not None else None,
+        "startup": startup.snapshot(),
+    })
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    app.state.shared = open_shared()
+    app.state.shared.start()
+    app.state.upstream = Upstream()
+    # Saved state is only mapped here; it is read when first needed, or LAZY_START_DELAY from now.
+    app.state.cache = TTLCache(shared=app.state.shared, snapshot_path=os.path.join(config.SNAPSHOT_DIR, "catalog.snap"))
+    app.state.flight = SingleFlight()
+    app.state.search = SearchIndex(os.path.join(config.SNAPSHOT_DIR, "search.snap"))
+    app.state.gateway = Gateway(app.state.upstream, app.state.cache, app.state.flight, app.state.search)
+    app.state.resolver = VideoResolver(app.state.upstream, app.state.flight, shared=app.state.shared)
+    app.state.jobs = JobStore()
+    app.state.fileindex = FileIndex()
+    app.state.images = ImageProxy(app.state.upstream, app.state.search.cover_hosts)
+    app.state.relay = VideoRelay(app.state.upstream, app.state.resolver, app.state.gateway)
+    app.state.pipeline = DownloadPipeline(app.state.resolver, app.state.upstream)
+    app.state.downloads = DownloadManager(app.state.gateway, app.state.pipeline, app.state.jobs)
+    app.state.downloads.start_later(config.LAZY_START_DELAY)
+    app.state.search.load_later(config.LAZY_START_DELAY)
+    app.state.warmer = CatalogWarmer(app.state.gateway, app.state.resolver, shared=app.state.shared)
+    app.state.warmer.start()
+    app.state.bot = None
+    if config.BOT_TOKEN:
+        from .tgbot import DramaBot
+
+        app.state.bot = DramaBot(config.BOT_TOKEN, app.state.gateway, app.state.resolver,
+                                 app.state.pipeline, app.state.fileindex, shared=app.state.shared,
+                                 webhook_url=config.WEBHOOK_URL + WEBHOOK_PATH if config.WEBHOOK_URL else "")
+        app.state.bot.launch()
+    register_collectors(app.state)
+    snapshots = asyncio.create_task(snapshot_loop(app.state)) if config.SNAPSHOT_INTERVAL > 0 else None
+    startup.mark("ready")
+    try:
+        yield
+    finally:
+        if snapshots is not None:
+            snapshots.cancel()
+            await asyncio.gather(snapshots, return_exceptions=True)
+        if app.state.bot is not None:
+            await app.state.bot.stop()
+        await save_snapshots(app.state)
+        await app.state.warmer.aclose()
+        await app.state.relay.aclose()
+        await app.state.downloads.aclose()
+        await app.state.upstream.aclose()
+        await app.state.jobs.aclose()
+        await app.state.fileindex.aclose()
+        await app.state.shared.aclose()
+
+
+def create_app() -> Starlette:
+    return Starlette(
+        routes=[
+            Route("/", index),
+            Route("/drama/{book_id}", drama_page),
+            Route("/img/placeholder.svg", placeholder),
+            Route("/img/{size}", image),
+            Route("/stats", stats),
+            Route("/metrics", metrics_endpoint),
+            Route("/traces", traces),
+            Route(WEBHOOK_PATH, telegram_webhook, methods=["POST"]),
+            Route("/resolve/{book_id}", resolve_batch),
+            Route("/resolve/{book_id}/{chapter_index:int}", resolve_one),
+            Route("/play/{book_id}/{chapter_index:int}/video", play_video),
+            Route("/play/{book_id}/{chapter_index:int}/index.m3u8", play_playlist),
+            Route("/play/{book_id}/{chapter_index:int}/seg/{part}", play_segment),
+            Route("/download/{book_id}.zip", download_zip),
+            Route("/downloads", download_start, methods=["POST"]),
+            Route("/downloads/{job_id}", download_status, methods=["GET", "DELETE"]),
+            Route("/downloads/{job_id}/events", download_events),
+            Route("/downloads/{job_id}/archive.zip", download_archive),
+            Route("/api/suggest/{query}", suggest),
+            Route("/api/search/{query}/{page:int}", search),
+            Route("/api/{path:path}", api_proxy, methods=["GET", "POST"]),
+        ],
+        middleware=[Middleware(metrics.MetricsMiddleware)],
+        lifespan=lifespan,
+    )
+
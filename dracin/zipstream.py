@@ -0,0 +1,97 @@
+"""Incremental ZIP writer for already-compressed video.
+
+Entries are STORE'd (MP4/TS data does not shrink under DEFLATE) and written
+with a data descriptor, so a header can go out before the entry's size and
+CRC are known. ZIP64 records are added only when the archive passes 4 GiB.
+"""
+
+import struct
+import time
+import zlib
+
+_LOCAL = struct.Struct("<IHHHHHIIIHH")
+_DESCRIPTOR = struct.Struct("<IIII")
+_CENTRAL = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END = struct.Struct("<IHHHHIIH")
+_END64 = struct.Struct("<IQHHIIQQQQ")
+_LOCATOR64 = struct.Struct("<IIQI")
+
+_FLAGS = 0x08 | 0x800  # data descriptor follows, UTF-8 names
+_MAX32 = 0xFFFFFFFF
+
+
+def _dos_time(ts: float) -> tuple[int, int]:
+    t = time.localtime(ts)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class ZipStream:
+    """Produce archive bytes entry by entry: ``start`` -> ``feed``... -> ``end``, then ``finish``."""
+
+    def __init__(self):
+        self.offset = 0
+        self._entries: list[tuple[bytes, int, int, int, int, int]] = []
+        self._current: tuple[bytes, int, int, int] | None = None
+        self._crc = 0
+        self._size = 0
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def start(self, name: str, mtime: float | None = None) -> bytes:
+        if self._current is not None:
+            raise RuntimeError("previous entry not ended")
+        encoded = name.encode("utf-8")
+        dostime, dosdate = _dos_time(mtime if mtime is not None else time.time())
+        self._current = (encoded, dostime, dosdate, self.offset)
+        self._crc = self._size = 0
+        return self._emit(_LOCAL.pack(0x04034B50, 20, _FLAGS, 0, dostime, dosdate, 0, 0, 0, len(encoded), 0)
+                          + encoded)
+
+    def feed(self, chunk: bytes) -> bytes:
+        self._crc = zlib.crc32(chunk, self._crc)
+        self._size += len(chunk)
+        if self._size > _MAX32:
+            raise ValueError("single ZIP entry larger than 4 GiB")
+        return self._emit(chunk)
+
+    def end(self) -> bytes:
+        if self._current is None:
+            raise RuntimeError("no entry started")
+        name, dostime, dosdate, header_offset = self._current
+        self._entries.append((name, dostime, dosdate, header_offset, self._crc, self._size))
+        self._current = None
+        return self._emit(_DESCRIPTOR.pack(0x08074B50, self._crc, self._size, self._size))
+
+    def finish(self) -> bytes:
+        if self._current is not None:
+            raise RuntimeError("entry still open")
+        cd_offset = self.offset
+        central = bytearray()
+        for name, dostime, dosdate, header_offset, crc, size in self._entries:
+            extra = b""
+            version = 20
+            if header_offset >= _MAX32:
+                extra = struct.pack("<HHQ", 0x0001, 8, header_offset)
+                header_offset, version = _MAX32, 45
+            central += _CENTRAL.pack(0x02014B50, (3 << 8) | version, version, _FLAGS, 0, dostime, dosdate,
+                                     crc, size, size, len(name), len(extra), 0, 0, 0, 0o100644 << 16,
+                                     header_offset)
+            central += name + extra
+        cd_size = len(central)
+        count = len(self._entries)
+        tail = bytearray(central)
+        if count > 0xFFFF or cd_offset >= _MAX32 or cd_size >= _MAX32:
+            end64_offset = cd_offset + cd_size
+            tail += _END64.pack(0x06064B50, _END64.size - 12, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+            tail += _LOCATOR64.pack(0x07064B50, 0, end64_offset, 1)
+            tail += _END.pack(0x06054B50, 0, 0, 0xFFFF, 0xFFFF, _MAX32, _MAX32, 0)
+        else:
+            tail += _END.pack(0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+        return self._emit(bytes(tail))
+
+    @property
+    def entry_count(self) -> int:
+        return len(self._entries)
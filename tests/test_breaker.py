@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from dracin.breaker import (CLOSED, HALF_OPEN, OPEN, AdaptiveConcurrency, CircuitBreaker, CircuitOpen, EndpointGuard,
+                            endpoint_class)
+
+
+def test_endpoint_classes():
+    assert endpoint_class("/watch/1/2") == "watch"
+    assert endpoint_class("suggest/abc") == "search"
+    assert endpoint_class("/chapters/1") == "catalog"
+
+
+def breaker(clock, **kw) -> CircuitBreaker:
+    kw = {"consecutive": 3, "window": 10, "error_rate": 0.5, "cooldown": 10, "max_cooldown": 25, **kw}
+    return CircuitBreaker("test", clock=clock, **kw)
+
+
+def test_opens_after_consecutive_failures_and_fails_fast(clock):
+    b = breaker(clock)
+    for _ in range(2):
+        b.allow()
+        b.record(False)
+    assert b.state == CLOSED
+    b.record(False)
+    assert b.state == OPEN and b.trips == 1
+    with pytest.raises(CircuitOpen):
+        b.allow()
+    assert b.rejected == 1
+
+
+def test_opens_on_error_rate_in_window(clock):
+    b = breaker(clock, consecutive=100)
+    for ok in (True, False) * 2 + (True,):
+        b.record(ok)
+    assert b.state == CLOSED  # 2/5 failed
+    b.record(False)
+    assert b.state == OPEN  # 3/6 failed
+
+
+def test_half_open_lets_one_probe_and_backs_off(clock):
+    b = breaker(clock)
+    for _ in range(3):
+        b.record(False)
+    clock.advance(10)
+    b.allow()
+    assert b.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        b.allow()  # only one probe at a time
+    b.record(False)
+    assert b.state == OPEN and b.snapshot()["cooldown"] == 20
+    clock.advance(19)
+    with pytest.raises(CircuitOpen):
+        b.allow()
+    clock.advance(1)
+    b.allow()
+    b.abandon()  # a cancelled probe frees the slot
+    b.allow()
+    b.record(True)
+    assert b.state == CLOSED and not b.is_open
+    for _ in range(3):
+        b.record(False)
+    assert b.snapshot()["cooldown"] == 10  # back to the base cool-down after closing
+
+
+def test_cooldown_is_capped(clock):
+    b = breaker(clock)
+    for _ in range(3):
+        b.record(False)
+    for _ in range(3):
+        clock.advance(100)
+        b.allow()
+        b.record(False)
+    assert b.snapshot()["cooldown"] == 25
+
+
+def test_aimd_limit():
+    limiter = AdaptiveConcurrency(initial=4, max_limit=5, tolerance=2.0, decrease=0.5)
+    for _ in range(4):
+        limiter.in_flight += 1
+        limiter.release(True, 0.1)
+    assert 4.9 < limiter.limit <= 5  # about +1 per limit's worth of successes, capped at max_limit
+    assert limiter.baseline == pytest.approx(0.1)
+    limiter.in_flight += 1
+    limiter.release(True, 1.0)  # ten times the baseline: treated like an error
+    assert limiter.limit < 3
+    before = limiter.limit
+    limiter.in_flight += 1
+    limiter.release(None)  # cancelled: no change
+    assert limiter.limit == before
+    for _ in range(10):
+        limiter.in_flight += 1
+        limiter.release(False)
+    assert limiter.limit == 1
+
+
+@pytest.mark.anyio
+async def test_limiter_queues_beyond_the_limit():
+    limiter = AdaptiveConcurrency(initial=1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    limiter.release(None)
+    await asyncio.wait_for(waiter, 1)
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.anyio
+async def test_guard_frees_the_slot_on_unexpected_errors(clock):
+    guard = EndpointGuard("test")
+    guard.breaker = breaker(clock)
+    limit = guard.limiter.limit
+
+    async def broken():
+        raise ValueError("bug in a wrapper")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await guard.call(broken)
+    assert guard.limiter.in_flight == 0 and guard.limiter.limit == limit
+    assert guard.breaker.state == CLOSED  # not counted against the endpoint
+
+    for _ in range(3):
+        guard.breaker.record(False)
+    clock.advance(10)
+    with pytest.raises(ValueError):
+        await guard.call(broken)  # the half-open probe
+    assert guard.breaker.state == HALF_OPEN
+    guard.breaker.allow()  # the probe slot was given back
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from dracin.cache import ENTRY_OVERHEAD, CachedResponse, TTLCache, cache_key, ttl_for
+
+
+def test_cache_key_ignores_parameter_order():
+    assert cache_key("/rank/1", {"lang": "in", "b": 2}) == cache_key("rank/1/", [("b", "2"), ("lang", "in")])
+    assert cache_key("/foryou/1") == "/foryou/1"
+
+
+def test_ttl_for_uses_first_path_segment():
+    assert ttl_for("/chapters/123") == (900, 6 * 3600)
+    assert ttl_for("/watch/123/1") is None
+
+
+@pytest.mark.anyio
+async def test_entry_goes_fresh_stale_expired(clock):
+    cache = TTLCache(clock=clock)
+    cache.set("k", "v", 10, ttl=60, stale_ttl=30)
+    assert cache.lookup("k")[0].value == "v" and cache.lookup("k")[1]
+    clock.advance(61)
+    entry, fresh = cache.lookup("k")
+    assert entry.value == "v" and not fresh
+    clock.advance(30)
+    assert cache.lookup("k") == (None, False)
+    assert await cache.last_known("k") == "v"  # kept for when upstream is down
+
+
+def test_lru_eviction_is_bounded_by_bytes(clock):
+    cache = TTLCache(max_bytes=3 * (100 + ENTRY_OVERHEAD), clock=clock)
+    for key in "abc":
+        cache.set(key, key, 100, ttl=60)
+    cache.get("a")  # most recently used now
+    cache.set("d", "d", 100, ttl=60)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == ["a", "c", "d"]
+    assert cache.size_bytes <= cache.max_bytes
+    assert cache.stats.evictions == 1
+
+
+def test_oversized_value_is_not_cached(clock):
+    cache = TTLCache(max_bytes=100, clock=clock)
+    cache.set("big", "x", 1000, ttl=60)
+    assert len(cache) == 0
+
+
+@pytest.mark.anyio
+async def test_fetch_serves_stale_and_revalidates_in_background(clock):
+    cache = TTLCache(clock=clock)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return CachedResponse(200, f"v{len(calls)}".encode()), 2
+
+    assert (await cache.fetch("k", loader, 60, 600)).content == b"v1"
+    assert (await cache.fetch("k", loader, 60, 600)).content == b"v1"
+    assert len(calls) == 1 and cache.stats.hits == 1
+    clock.advance(61)
+    assert (await cache.fetch("k", loader, 60, 600)).content == b"v1"  # stale copy, at once
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert cache.stats.refreshes == 1
+    assert (await cache.fetch("k", loader, 60, 600)).content == b"v2"
+
+
+@pytest.mark.anyio
+async def test_failed_refresh_keeps_stale_entry(clock):
+    cache = TTLCache(clock=clock)
+    cache.set("k", "old", 3, ttl=60, stale_ttl=600)
+    clock.advance(61)
+
+    async def failing():
+        raise RuntimeError("upstream down")
+
+    assert await cache.fetch("k", failing, 60, 600) == "old"
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert cache.stats.refresh_errors == 1
+    assert cache.get("k") == "old"
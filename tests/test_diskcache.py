@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from dracin.diskcache import DiskCache
+
+
+def test_put_read_and_evict_least_recent(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10)
+    a, b, c = (cache.path(k, "bin") for k in ("aa1", "bb2", "cc3"))
+    cache.put(a, b"aaaa")
+    cache.put(b, b"bbbb")
+    assert cache.read(a) == b"aaaa"  # a is now the most recent
+    cache.put(c, b"cccc")
+    assert cache.bytes == 12 and len(cache) == 3  # writes never evict inline
+    assert cache.evict() == 1
+    assert cache.read(b) is None and cache.read(a) == b"aaaa" and cache.read(c) == b"cccc"
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_rescan_keeps_mtime_order_and_drops_temp_files(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=100)
+    cache.put(cache.path("aa1", "bin"), b"x" * 5)
+    (tmp_path / "aa" / "aa2.bin.1.tmp").write_bytes(b"partial")
+    again = DiskCache(str(tmp_path), max_bytes=100)
+    assert again.snapshot() == {"scanned": False, "max_bytes": 100}
+    assert len(again) == 1 and again.bytes == 5
+    assert not (tmp_path / "aa" / "aa2.bin.1.tmp").exists()
+
+
+@pytest.mark.anyio
+async def test_async_put_evicts_in_the_background(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=8)
+    for n in range(4):
+        await cache.aput(cache.path(f"k{n}", "bin"), b"1234")
+    await asyncio.sleep(0)
+    while cache.snapshot()["evicting"]:
+        await asyncio.sleep(0.01)
+    assert cache.bytes <= 8
+    assert await cache.aread(cache.path("k3", "bin")) == b"1234"
+    assert not await cache.atouch(cache.path("k0", "bin"))
@@ -0,0 +1,71 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from dracin.downloads import DownloadJob, DownloadManager, DownloadProgress, Episode, FileSink
+from dracin.jobs import JobStore
+
+
+class FakePipeline:
+    """Finishes the episodes at the positions in ``ok`` and fails the rest."""
+
+    def __init__(self, ok: set[int]):
+        self.ok = ok
+
+    async def run(self, book_id, episodes, sink, progress, lang=None):
+        for ep in episodes:
+            state = progress.episode(ep.position)
+            if ep.position in self.ok:
+                async def body():
+                    yield f"episode {ep.position}".encode()
+                state.bytes = await sink(ep, body(), 0)
+                state.status = "done"
+                progress.transfer.done += 1
+            else:
+                state.status, state.error = "failed", "HTTP 403"
+                progress.transfer.failed += 1
+            progress.notify(ep.position)
+
+
+@pytest.fixture
+async def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    await store.aclose()
+
+
+async def run_job(tmp_path, store, ok: set[int], total: int = 3) -> tuple[DownloadManager, DownloadJob]:
+    manager = DownloadManager(None, FakePipeline(ok), store, root=str(tmp_path / "dl"))
+    job = DownloadJob("job1", "b1", "in", title="Drama")
+    job.episodes = [Episode(i, i + 1, f"Drama_EP{i + 1:02d}.mp4") for i in range(total)]
+    job.progress = DownloadProgress(total=total)
+    store.create_job(job.id, job.book_id, job.lang)
+    store.add_episodes(job.id, [(e.position, e.chapter_index, e.filename) for e in job.episodes])
+    await manager._run(job, FileSink(os.path.join(manager.root, job.id)))
+    return manager, job
+
+
+@pytest.mark.anyio
+async def test_job_is_done_only_when_every_episode_is(tmp_path, store):
+    _, job = await run_job(tmp_path, store, ok={0, 1, 2})
+    assert (job.status, job.error) == ("done", None)
+    assert (await store.job("job1"))["status"] == "done"
+
+
+@pytest.mark.anyio
+async def test_some_failed_episodes_make_a_partial_job(tmp_path, store):
+    manager, job = await run_job(tmp_path, store, ok={1})
+    assert (job.status, job.error) == ("partial", "2 of 3 episodes failed")
+    assert job.finished
+    out = b"".join([chunk async for chunk in manager.archive(job)])
+    with zipfile.ZipFile(io.BytesIO(out)) as zf:
+        assert zf.namelist() == ["Drama_EP02.mp4"]
+        assert zf.read("Drama_EP02.mp4") == b"episode 1"
+
+
+@pytest.mark.anyio
+async def test_no_finished_episode_fails_the_job(tmp_path, store):
+    _, job = await run_job(tmp_path, store, ok=set())
+    assert (job.status, job.error) == ("failed", "3 of 3 episodes failed")
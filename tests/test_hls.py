@@ -0,0 +1,118 @@
+import contextlib
+
+import httpx
+import pytest
+
+from dracin.hls import HLSError, HLSFetcher, MediaPlaylist, Segment, parse_playlist
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2"
+1080p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=9000000,RESOLUTION=3840x2160
+2160p/index.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:6
+#EXT-X-MAP:URI="init.mp4",BYTERANGE="720@0"
+#EXTINF:6.0,
+#EXT-X-BYTERANGE:1000@720
+media.mp4
+#EXTINF:4.5,
+#EXT-X-BYTERANGE:500
+media.mp4
+#EXTINF:2,
+https://other.example/seg3.m4s
+#EXT-X-ENDLIST
+"""
+
+
+def test_master_playlist_variants_and_pick():
+    variants = parse_playlist(MASTER, "https://cdn.example/ep1/master.m3u8")
+    assert [(v.uri, v.bandwidth, v.height) for v in variants] == [
+        ("https://cdn.example/ep1/360p/index.m3u8", 800000, 360),
+        ("https://cdn.example/ep1/1080p/index.m3u8", 5000000, 1080),
+        ("https://cdn.example/ep1/2160p/index.m3u8", 9000000, 2160),
+    ]
+    assert HLSFetcher(None, max_height=1080).pick(variants).height == 1080
+
+
+def test_media_playlist_segments_and_byteranges():
+    playlist = parse_playlist(MEDIA, "https://cdn.example/ep1/1080p/index.m3u8")
+    assert isinstance(playlist, MediaPlaylist)
+    assert playlist.init == Segment("https://cdn.example/ep1/1080p/init.mp4", byterange=(0, 720))
+    assert [(s.uri.rsplit("/", 1)[1], s.duration, s.byterange) for s in playlist.segments] == [
+        ("media.mp4", 6.0, (720, 1000)), ("media.mp4", 4.5, (1720, 500)), ("seg3.m4s", 2.0, None)]
+    assert playlist.extension == "mp4" and playlist.duration == 12.5
+    assert playlist.segments[1].headers() == {"Range": "bytes=1720-2219"}
+
+
+def test_encryption_is_detected():
+    text = "#EXTM3U\n#EXT-X-KEY:METHOD=AES-128,URI=\"k\"\n#EXTINF:2,\na.ts\n"
+    playlist = parse_playlist(text, "https://cdn.example/x.m3u8")
+    assert playlist.encrypted and playlist.extension == "ts"
+
+
+def test_not_a_playlist():
+    with pytest.raises(HLSError):
+        parse_playlist("<html>", "https://cdn.example/x.m3u8")
+
+
+class FileServer:
+    """Answers every request with ``body``, honouring Range only when ``ranges`` is set."""
+
+    def __init__(self, body: bytes, ranges: bool):
+        self.body, self.ranges = body, ranges
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url, headers=None):
+        request = httpx.Request("GET", url, headers=headers)
+        if self.ranges and headers and "Range" in headers:
+            first, last = map(int, headers["Range"].removeprefix("bytes=").split("-"))
+            yield httpx.Response(206, content=self.body[first:last + 1], request=request)
+        else:
+            yield httpx.Response(200, content=self.body, request=request)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("ranges", [True, False])
+async def test_byterange_segment_is_exactly_the_range(ranges):
+    body = bytes(range(256)) * 10
+    fetcher = HLSFetcher(FileServer(body, ranges))
+    assert await fetcher.fetch_segment(Segment("https://cdn.example/media.mp4", byterange=(100, 50))) == body[100:150]
+
+
+@pytest.mark.anyio
+async def test_byterange_past_the_end_is_an_error():
+    fetcher = HLSFetcher(FileServer(b"short", ranges=False))
+    with pytest.raises(HLSError):
+        await fetcher.fetch_segment(Segment("https://cdn.example/media.mp4", byterange=(0, 100)))
+
+
+@pytest.mark.anyio
+async def test_stream_yields_init_then_segments_in_order():
+    body = bytes(range(256)) * 10
+    playlist = parse_playlist(MEDIA, "https://cdn.example/ep1/index.m3u8")
+    fetcher = HLSFetcher(FileServer(body, ranges=True), concurrency=2)
+    parts = [data async for data in fetcher.stream(playlist)]
+    assert parts[:3] == [body[:720], body[720:1720], body[1720:2220]]
+    assert parts[3] == body
+
+
+@pytest.mark.parametrize("line", [
+    "#EXTINF:six,",
+    "#EXT-X-BYTERANGE:lots@0",
+    '#EXT-X-MAP:BYTERANGE="720@0"',
+    '#EXT-X-MAP:URI="init.mp4",BYTERANGE="x@0"',
+])
+def test_malformed_media_playlist_is_an_hls_error(line):
+    with pytest.raises(HLSError, match="malformed playlist"):
+        parse_playlist(f"#EXTM3U\n{line}\n#EXTINF:2,\na.ts\n", "https://cdn.example/x.m3u8")
+
+
+def test_malformed_master_playlist_is_an_hls_error():
+    with pytest.raises(HLSError, match="malformed playlist"):
+        parse_playlist("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=fast\nv.m3u8\n", "https://cdn.example/m.m3u8")
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+
+import httpx
+import pytest
+
+from dracin.diskcache import DiskCache
+from dracin.images import ImageProxy, ImageUnavailable
+
+Image = pytest.importorskip("PIL.Image")  # optional: without it originals are served
+
+
+def cover() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (600, 900), "red").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class Covers:
+    def __init__(self):
+        self.requests = 0
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url, headers=None):
+        self.requests += 1
+        yield httpx.Response(200, headers={"content-type": "image/jpeg"}, content=cover(),
+                             request=httpx.Request("GET", url))
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    return ImageProxy(Covers(), {"img.example"}, DiskCache(str(tmp_path), 1 << 20))
+
+
+@pytest.mark.anyio
+async def test_thumbnail_is_rendered_once_then_served_from_cache(proxy):
+    first = await proxy.thumbnail("https://img.example/a.jpg", "grid", "image/webp,*/*")
+    assert first.content_type == "image/webp" and first.body[:4] == b"RIFF"
+    again = await proxy.thumbnail("https://img.example/a.jpg", "grid", "image/webp")
+    jpeg = await proxy.thumbnail("https://img.example/a.jpg", "detail", "image/jpeg")
+    assert again.body == first.body and jpeg.body[:2] == b"\xff\xd8"
+    assert (proxy.upstream.requests, proxy.hits, proxy.misses) == (1, 2, 1)
+
+
+@pytest.mark.anyio
+async def test_evicted_thumbnail_is_rendered_again(proxy):
+    first = await proxy.thumbnail("https://img.example/a.jpg", "grid", "")
+    for dirpath, _, names in os.walk(proxy.cache.root):
+        for name in names:
+            os.unlink(os.path.join(dirpath, name))
+    again = await proxy.thumbnail("https://img.example/a.jpg", "grid", "")
+    assert again.body == first.body and proxy.upstream.requests == 2
+
+
+@pytest.mark.anyio
+async def test_only_known_hosts_are_fetched(proxy):
+    with pytest.raises(ImageUnavailable):
+        await proxy.thumbnail("https://evil.example/a.jpg", "grid", "")
+    assert proxy.upstream.requests == 0
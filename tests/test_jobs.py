@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from dracin.jobs import JobStore
+
+
+@pytest.fixture
+async def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    await store.aclose()
+
+
+@pytest.mark.anyio
+async def test_claim_is_exclusive_while_the_lease_lives(store):
+    store.create_job("j1", "b1", "in")
+    assert await store.claim("j1", "a", 60)
+    assert not await store.claim("j1", "b", 60)
+    assert await store.claim("j1", "a", 60)  # the owner may re-claim
+    assert [r["id"] for r in await store.claimable()] == []
+
+
+@pytest.mark.anyio
+async def test_expired_lease_can_be_taken_over_and_renewed(store):
+    store.create_job("j1", "b1", "in")
+    assert await store.claim("j1", "a", -1)
+    assert [r["id"] for r in await store.claimable()] == ["j1"]
+    assert await store.claim("j1", "b", 60)
+    before = (await store.job("j1"))["lease_until"]
+    time.sleep(0.01)
+    store.renew("b", 60)
+    assert (await store.job("j1"))["lease_until"] > before
+    store.renew("a", 60)  # no longer a's: untouched
+    assert (await store.job("j1"))["owner"] == "b"
+
+
+@pytest.mark.anyio
+async def test_release_one_or_all(store):
+    for job_id in ("j1", "j2"):
+        store.create_job(job_id, "b1", "in")
+        assert await store.claim(job_id, "a", 60)
+    store.release("b", "j1")  # not b's to release
+    assert (await store.job("j1"))["owner"] == "a"
+    store.release("a", "j1")
+    assert (await store.job("j1"))["owner"] is None and (await store.job("j2"))["owner"] == "a"
+    store.release("a")
+    assert (await store.job("j2"))["owner"] is None
+
+
+@pytest.mark.anyio
+async def test_finished_jobs_cannot_be_claimed_and_get_pruned(store):
+    store.create_job("j1", "b1", "in")
+    store.add_episodes("j1", [(0, 1, "ep1.mp4"), (1, 2, "ep2.mp4")])
+    store.update_job("j1", status="done")
+    assert not await store.claim("j1", "a", 60)
+    assert len(await store.episodes("j1")) == 2
+    assert await store.prune(time.time() + 1) == ["j1"]
+    assert await store.job("j1") is None and await store.episodes("j1") == []
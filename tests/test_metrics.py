@@ -0,0 +1,99 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from dracin import config, metrics, web
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty registry and trace buffer, so only the test's own metrics are rendered."""
+    monkeypatch.setattr(metrics, "REGISTRY", {})
+    monkeypatch.setattr(metrics, "TRACES", metrics.deque(maxlen=2))
+    return metrics.REGISTRY
+
+
+def test_counter_and_collected_text_format(registry):
+    sends = metrics.Counter("t_sends_total", "Sends.", ("method",))
+    sends.inc("sendVideo")
+    sends.inc("sendVideo", amount=2)
+    sends.inc('a"b\\c\nd')
+    metrics.collected("t_queue", "Queue depth.", "gauge", ("lane",), lambda: [(("bulk",), 1.5)])
+    metrics.collected("t_broken", "Raises.", "gauge", (), lambda: 1 / 0)
+    assert metrics.render().splitlines() == [
+        "# HELP t_sends_total Sends.",
+        "# TYPE t_sends_total counter",
+        't_sends_total{method="sendVideo"} 3',
+        't_sends_total{method="a\\"b\\\\c\\nd"} 1',
+        "# HELP t_queue Queue depth.",
+        "# TYPE t_queue gauge",
+        't_queue{lane="bulk"} 1.5',
+        "# HELP t_broken Raises.",  # a failing collector loses its samples, not the scrape
+        "# TYPE t_broken gauge",
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    seconds = metrics.Histogram("t_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        seconds.observe(value, "index")
+    assert metrics.render().splitlines()[2:] == [
+        't_seconds_bucket{route="index",le="0.1"} 2',
+        't_seconds_bucket{route="index",le="1"} 3',
+        't_seconds_bucket{route="index",le="+Inf"} 4',
+        't_seconds_sum{route="index"} 3.65',
+        't_seconds_count{route="index"} 4',
+    ]
+
+
+def test_trace_sampling_and_spans(registry, monkeypatch):
+    assert metrics.begin_trace("GET /", sample_rate=0) is None
+    monkeypatch.setattr(metrics.random, "random", lambda: 0.5)
+    assert metrics.begin_trace("GET /", sample_rate=0.5) is None
+    with metrics.span("outside"):  # no trace: a no-op
+        pass
+
+    token = metrics.begin_trace("GET /drama/1", sample_rate=0.6)
+    with metrics.span("upstream", endpoint="chapters"):
+        pass
+    with pytest.raises(ValueError), metrics.span("resolve"):
+        raise ValueError
+    trace, _ = token
+    metrics.end_trace(token, route="drama_page", status=200)
+    with metrics.span("late"):  # a background task that outlived the request
+        pass
+
+    [record] = metrics.TRACES
+    assert record["id"] == trace.id and (record["route"], record["status"]) == ("drama_page", 200)
+    assert [(s["name"], s.get("endpoint"), s.get("error")) for s in record["spans"]] == [
+        ("upstream", "chapters", None), ("resolve", None, "ValueError")]
+    assert metrics._current.get() is None
+
+    for _ in range(3):
+        metrics.end_trace(metrics.begin_trace("GET /", sample_rate=1.0))
+    assert len(metrics.TRACES) == 2  # only the newest TRACE_KEEP are kept
+
+
+@pytest.fixture
+def diagnostics():
+    app = Starlette(routes=[Route("/metrics", web.metrics_endpoint), Route("/traces", web.traces)])
+    return TestClient(app)
+
+
+def test_diagnostics_are_off_without_an_admin_token(registry, diagnostics, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    assert diagnostics.get("/metrics").status_code == 404
+    assert diagnostics.get("/traces", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+def test_diagnostics_need_the_admin_token(registry, diagnostics, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+    metrics.Counter("t_total", "T.").inc()
+    assert diagnostics.get("/metrics").status_code == 401
+    assert diagnostics.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert diagnostics.get("/traces", headers={"Authorization": "Basic s3cret"}).status_code == 401
+    resp = diagnostics.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200 and resp.headers["content-type"] == metrics.CONTENT_TYPE
+    assert "t_total 1" in resp.text
+    assert diagnostics.get("/traces", headers={"Authorization": "bearer s3cret"}).json()["traces"] == []
@@ -0,0 +1,66 @@
+import json
+from array import array
+
+import httpx
+import pytest
+
+from dracin.cache import TTLCache
+from dracin.gateway import Gateway
+from dracin.models import ChapterTable, Drama, dramas_in
+from dracin.singleflight import SingleFlight
+
+
+def test_chapter_table_round_trip_with_numeric_ids():
+    chapters = [{"chapterIndex": 0, "chapterId": "700001", "duration": 61.5},
+                {"index": 1, "id": 700002, "videoDuration": "90"},
+                {"chapterIndex": 2, "chapterId": "700003", "playTime": 0}]
+    table = ChapterTable.from_list(chapters)
+    assert isinstance(table.ids, array) and table.ids.typecode == "q"
+    assert len(table) == 3 and list(table) == [0, 1, 2]
+    assert table.to_list() == [{"chapterIndex": 0, "chapterId": "700001", "duration": 61.5},
+                               {"chapterIndex": 1, "chapterId": "700002", "duration": 90.0},
+                               {"chapterIndex": 2, "chapterId": "700003", "duration": 0.0}]
+    assert ChapterTable.from_list(table.to_list()).to_list() == table.to_list()
+
+
+def test_chapter_table_keeps_non_numeric_ids_and_fills_missing_indexes():
+    table = ChapterTable.from_list([{"chapterId": "ab-1"}, "junk", {"chapterId": "ab-3"}])
+    assert table.ids == ("ab-1", "", "ab-3")
+    assert list(table) == [0, 1, 2]
+    assert ChapterTable.from_list(None).to_list() == []
+
+
+def test_drama_resolves_aliases_and_round_trips():
+    drama = Drama.from_record({"id": 42, "name": "Istri CEO", "coverWap": "https://img/c.jpg", "seriesCount": "3",
+                               "tags": ["CEO", 5], "chapterList": [{"chapterId": "1"}, {"chapterId": "2"}]})
+    assert (drama.book_id, drama.title, drama.cover, drama.chapter_count, drama.tags) == (
+        "42", "Istri CEO", "https://img/c.jpg", 3, ("CEO",))
+    again = Drama.from_record(drama.to_record(chapters=True))
+    assert again.to_record(chapters=True) == drama.to_record(chapters=True)
+    assert Drama.from_record({"bookName": "no id"}) is None
+
+
+def test_dramas_in_envelopes():
+    assert [d.book_id for d in dramas_in({"data": {"list": [{"bookId": "1", "bookName": "A"}]}})] == ["1"]
+    assert [d.book_id for d in dramas_in({"data": [{"bookId": "2", "bookName": "B"}, {"bookId": "3"}]})] == ["2"]
+    assert list(dramas_in({"data": None})) == []
+
+
+class ChaptersUpstream:
+    def __init__(self, record: dict):
+        self.record, self.calls = record, 0
+
+    async def request(self, method, path, params=None, content=None, headers=None):
+        self.calls += 1
+        return httpx.Response(200, content=json.dumps({"data": self.record}).encode(),
+                              headers={"content-type": "application/json"})
+
+
+@pytest.mark.anyio
+async def test_gateway_chapters_defaults_the_id_and_parses_once():
+    upstream = ChaptersUpstream({"bookName": "Tanpa Id", "chapterList": [{"chapterId": "9"}]})
+    gateway = Gateway(upstream, TTLCache(), SingleFlight())
+    drama = await gateway.chapters("777", "in")
+    assert drama is not None and drama.book_id == "777" and len(drama.chapters) == 1
+    assert await gateway.chapters("777", "in") is drama  # same cached answer, same parsed object
+    assert upstream.calls == 1
@@ -0,0 +1,21 @@
+import gzip
+import html
+
+from dracin.models import Drama
+from dracin.pages import build_page, drama_card, fill
+
+
+def test_drama_card_passes_the_id_as_data_not_script():
+    book_id = "1');alert(1);('"
+    card = drama_card(Drama(book_id, title="<b>Judul</b>", cover="https://img.example/a b.jpg"))
+    assert 'onclick="openDrama(this.dataset.id)"' in card
+    assert f'data-id="{html.escape(book_id, quote=True)}"' in card
+    assert "alert(1);('" not in card and "<b>" not in card
+    assert "/img/grid?src=https%3A%2F%2Fimg.example%2Fa%20b.jpg" in card
+
+
+def test_fill_escapes_the_preload_and_build_page_compresses():
+    shell = '<main id="app"><!--APP--></main><script>const PRELOAD = /*PRELOAD*/null;</script>'
+    page = build_page(fill(shell, "<p>hi</p>", {"title": "</script><script>x"}))
+    assert b"<\\/script><script>x" in page.body and b"</script><script>x" not in page.body
+    assert gzip.decompress(page.gzip) == page.body
@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import os
+
+import httpx
+import pytest
+
+from dracin.diskcache import DiskCache
+from dracin.relay import EpisodeRef, RelayError, VideoRelay, parse_range
+
+BODY = bytes(range(10)) * 3  # 30 bytes: blocks of 8, 8, 8 and 6
+
+
+class Resolver:
+    async def resolve(self, book_id, chapter_index, lang):
+        return "https://cdn.example/ep.mp4"
+
+    def invalidate(self, *args):
+        pass
+
+
+class WholeFileCDN:
+    """Ignores Range and sends the body in 4-byte chunks, pausing after the first block."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.requests = 0
+
+    async def _body(self):
+        for i in range(0, len(BODY), 4):
+            if i == 8:
+                await self.release.wait()
+            yield BODY[i:i + 4]
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url, headers=None):
+        self.requests += 1
+        request = httpx.Request("GET", url, headers=headers)
+        yield httpx.Response(200, headers={"content-length": str(len(BODY)), "content-type": "video/mp4"},
+                             content=self._body(), request=request)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-", 30) == (0, 29)
+    assert parse_range("bytes=-5", 30) == (25, 29)
+    assert parse_range("bytes=10-99", 30) == (10, 29)
+    assert parse_range("bytes=0-1,4-5", 30) is None
+    with pytest.raises(RelayError):
+        parse_range("bytes=30-", 30)
+
+
+@pytest.mark.anyio
+async def test_first_block_is_served_while_the_rest_is_stored(tmp_path):
+    cdn = WholeFileCDN()
+    relay = VideoRelay(cdn, Resolver(), None, DiskCache(str(tmp_path), 1 << 20), block_bytes=8)
+    ep = EpisodeRef("b1", 1, "in")
+    media = await asyncio.wait_for(relay.media(ep), 1)  # returns before the body is released
+    assert media.size == len(BODY)
+    assert await relay.block(ep, media, 0) == BODY[:8]
+    cdn.release.set()
+    while relay._pulls:
+        await asyncio.sleep(0.01)
+    assert [await relay.block(ep, media, n) for n in range(4)] == [BODY[i:i + 8] for i in range(0, 30, 8)]
+    assert cdn.requests == 1 and relay.bytes_fetched == len(BODY)
+    out = b"".join([chunk async for chunk in relay.stream(ep, media, 5, 20)])
+    assert out == BODY[5:21]
+    await relay.aclose()
+
+
+@pytest.mark.anyio
+async def test_cold_blocks_share_one_whole_file_download(tmp_path):
+    cdn = WholeFileCDN()
+    relay = VideoRelay(cdn, Resolver(), None, DiskCache(str(tmp_path), 1 << 20), block_bytes=8, readahead=4)
+    ep = EpisodeRef("b1", 1, "in")
+    media = await relay.media(ep)
+    assert not media.ranges
+
+    async def read():
+        return b"".join([chunk async for chunk in relay.stream(ep, media, 0, 29)])
+
+    reading = asyncio.ensure_future(read())
+    await asyncio.sleep(0.05)  # blocks 1-3 are waiting on the paused download
+    cdn.release.set()
+    assert await reading == BODY
+    while relay._pulls:  # the last block is handed over before it is stored
+        await asyncio.sleep(0.01)
+    assert cdn.requests == 1 and relay.bytes_fetched == len(BODY)
+
+    for n in range(4):  # evicted: the next read starts one new download for all of them
+        os.unlink(relay._block_path(ep, media, n))
+    relay.cache = DiskCache(relay.cache.root, 1 << 20)
+    assert await read() == BODY
+    while relay._pulls:
+        await asyncio.sleep(0.01)
+    assert cdn.requests == 2 and relay.bytes_fetched == 2 * len(BODY)
+    await relay.aclose()
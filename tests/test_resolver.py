@@ -0,0 +1,57 @@
+import calendar
+import time
+
+import pytest
+
+from dracin import config
+from dracin.resolver import POST, VideoResolver, url_expiry
+from dracin.singleflight import SingleFlight
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://cdn.example/v.mp4?expires=1700000000&sig=x", 1700000000),
+    ("https://cdn.example/v.mp4?Expires=1700000000000", 1700000000),  # milliseconds
+    ("https://cdn.example/v.mp4?x-expires=1700000123", 1700000123),
+    ("https://cdn.example/v.mp4?e=1700000000&deadline=1", 1700000000),
+    ("https://cdn.example/v.mp4?t=6553f100&sign=abc", 0x6553F100),  # Tencent hex
+    ("https://cdn.example/v.mp4?auth_key=1700000000-0-0-abcdef", 1700000000 + config.VIDEO_URL_DEFAULT_TTL),
+    ("https://cdn.example/v.mp4", None),
+    ("https://cdn.example/v.mp4?t=zzzzzzzz", None),
+])
+def test_url_expiry_formats(url, expected):
+    assert url_expiry(url) == expected
+
+
+def test_url_expiry_amz_signature():
+    url = "https://s3.example/v.mp4?X-Amz-Date=20240101T000000Z&X-Amz-Expires=3600"
+    assert url_expiry(url) == calendar.timegm((2024, 1, 1, 0, 0, 0)) + 3600
+    assert url_expiry("https://s3.example/v.mp4?X-Amz-Date=garbage&X-Amz-Expires=3600") is None
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.calls = []
+
+    async def get_json(self, path, params=()):
+        self.calls.append(("get", path))
+        return {"data": {}}  # GET never has the URL here
+
+    async def post_json(self, path, body, params=()):
+        self.calls.append(("post", body["bookId"]))
+        return {"data": {"videoUrl": f"https://cdn.example/{body['bookId']}.mp4?expires={int(time.time()) + 3600}"}}
+
+
+@pytest.mark.anyio
+async def test_working_variant_is_remembered_and_bounded():
+    upstream = FakeUpstream()
+    resolver = VideoResolver(upstream, SingleFlight(), max_variants=2)
+    assert (await resolver.resolve("1", 0)).startswith("https://cdn.example/1.mp4")
+    assert upstream.calls == [("get", "/watch/1/0"), ("post", "1")]
+    upstream.calls.clear()
+    await resolver.resolve("1", 1)
+    assert upstream.calls == [("post", "1")]  # straight to the variant that worked
+    assert await resolver.resolve("1", 1) is not None and resolver.hits == 1
+    await resolver.resolve("2", 0)
+    await resolver.resolve("3", 0)
+    assert list(resolver._variant) == ["2", "3"]
+    assert resolver._variant["3"] == POST
@@ -0,0 +1,94 @@
+import asyncio
+
+from dracin.models import Drama
+from dracin.search import LanguageIndex, PrefixTrie, SearchIndex, fold, tokens
+
+
+def drama(book_id: str, title: str, intro: str = "") -> Drama:
+    return Drama(book_id, title, f"https://img.example/{book_id}.jpg", intro)
+
+
+def test_fold_drops_accents_and_case():
+    assert fold("Cínta ÉLITE") == "cinta elite"
+    assert tokens("Istri CEO: Balas-Dendam!") == ["istri", "ceo", "balas", "dendam"]
+
+
+def test_trie_remove_prunes_empty_branches():
+    trie = PrefixTrie()
+    trie.add("cinta", "1")
+    trie.add("cincin", "2")
+    assert trie.ids("cin") == {"1", "2"}
+    trie.remove("cincin", "2")
+    assert trie.ids("cin") == {"1"} and trie.ids("cinc") == set()
+    assert "c" not in trie.root.children["c"].children["i"].children["n"].children
+
+
+def test_prefix_search_matches_folded_tokens():
+    index = LanguageIndex()
+    index.add(drama("1", "Cínta Sang CEO", "Seorang istri rahasia"))
+    index.add(drama("2", "Pewaris Naga", "Cinta yang terlarang"))
+    index.add(drama("3", "Kaisar Abadi"))
+    assert [d.book_id for d in index.search("cint", 10)] == ["1", "2"]  # title match outranks intro match
+    assert [d.book_id for d in index.search("ISTRI rah", 10)] == ["1"]
+    assert index.search("zzz", 10) == []
+    assert index.suggest("na", 10) == ["Pewaris Naga"]
+
+
+def test_reindex_on_changed_title_only():
+    index = LanguageIndex()
+    assert index.add(drama("1", "Janji Musim"))
+    assert not index.add(drama("1", "Janji Musim"))
+    assert index.docs["1"].seen == 2
+    assert index.add(drama("1", "Janji Hati"))
+    assert index.search("musim", 10) == [] and index.suggest("hat", 10) == ["Janji Hati"]
+
+
+def test_local_pages_only_when_the_first_page_is_full():
+    index = SearchIndex()
+    index.add([drama(str(i), f"Cinta {i}") for i in range(5)], "in")
+    assert index.search("cinta", "in", 1, size=10) is None  # not a full page: ask upstream
+    assert index.fallbacks == 1
+    first, second, third = (index.search("cinta", "in", page, size=2) for page in (1, 2, 3))
+    ids = [d.book_id for d in first + second + third]
+    assert len(first) == len(second) == 2 and len(third) == 1
+    assert sorted(ids) == [str(i) for i in range(5)]  # no repeats, nothing skipped
+    assert index.search("cinta", "in", 4, size=2) == []
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "search.snap")
+    index = SearchIndex(path)
+    index.add([drama("1", "Cinta Abadi"), drama("2", "Naga")], "in")
+    index.add([drama("1", "Cinta Abadi")], "in")
+    assert asyncio.run(index.save()) == 2
+    restored = SearchIndex(path)
+    assert restored.snapshot()["loaded"] is False
+    assert asyncio.run(restored.load()) == 2
+    assert [d.book_id for d in restored.search("cinta", "in", size=1)] == ["1"]
+    assert restored.langs["in"].docs["1"].seen == 2
+    assert restored.drama("2", "in").title == "Naga"
+    assert "img.example" in restored.cover_hosts
+
+
+def test_records_ingested_while_loading_are_kept_on_top(tmp_path):
+    path = str(tmp_path / "search.snap")
+    saved = SearchIndex(path)
+    saved.add([drama("1", "Cinta Abadi"), drama("2", "Naga")], "in")
+    asyncio.run(saved.save())
+
+    async def scenario():
+        index = SearchIndex(path)
+        hosts = index.cover_hosts  # the image proxy's reference
+        index.add([Drama("1", "Cinta Abadi Season 2"), Drama("3", "Naga Emas")], "in")
+        first, second = asyncio.ensure_future(index.load()), asyncio.ensure_future(index.load())
+        index.add([drama("4", "Naga Perak", "")], "in")  # while the snapshot is read on a thread
+        assert await first == await second == 2  # one load, shared
+        assert index.cover_hosts is hosts and "img.example" in hosts
+        return index
+
+    index = asyncio.run(scenario())
+    assert index.snapshot()["dramas"] == {"in": 4}
+    assert index.drama("1", "in").title == "Cinta Abadi Season 2"
+    assert index.drama("1", "in").cover == "https://img.example/1.jpg"  # kept from the saved record
+    assert index.langs["in"].docs["1"].seen == 2
+    assert sorted(d.book_id for d in index.langs["in"].search("naga", 10)) == ["2", "3", "4"]
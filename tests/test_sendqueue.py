@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+
+from dracin.sendqueue import BULK, INTERACTIVE, SendScheduler, TokenBucket
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=2, now=0.0)
+    bucket.take(0.0)
+    bucket.take(0.0)
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.5) == 0
+    assert bucket.wait_time(100.0) == 0 and bucket.tokens == 2
+    bucket.pause(105.0)
+    assert bucket.wait_time(101.0) == pytest.approx(4.0)
+    assert not bucket.idle(101.0) and bucket.idle(105.0)
+
+
+async def send(scheduler: SendScheduler, chat_id, lane: int, log: list):
+    async def call():
+        log.append((chat_id, lane, time.monotonic()))
+
+    await scheduler.process_request(call, (), {}, "sendMessage", {"chat_id": chat_id}, {"lane": lane})
+
+
+@pytest.mark.anyio
+async def test_interactive_lane_overtakes_queued_bulk():
+    scheduler = SendScheduler(global_rate=50, chat_rate=1000, global_burst=1)
+    log = []
+    calls = [send(scheduler, 100 + i, BULK, log) for i in range(3)] + [send(scheduler, 1, INTERACTIVE, log)]
+    await asyncio.gather(*calls)
+    await scheduler.shutdown()
+    assert [lane for _, lane, _ in log] == [INTERACTIVE, BULK, BULK, BULK]
+
+
+@pytest.mark.anyio
+async def test_global_burst_is_small():
+    scheduler = SendScheduler(global_rate=20, chat_rate=1000, global_burst=1)
+    log = []
+    started = time.monotonic()
+    await asyncio.gather(*(send(scheduler, 100 + i, INTERACTIVE, log) for i in range(5)))
+    await scheduler.shutdown()
+    assert time.monotonic() - started >= 4 / 20 * 0.9  # one at once, then one per 1/rate
+
+
+@pytest.mark.anyio
+async def test_per_chat_bucket_does_not_hold_up_other_chats():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=5, group_rate=5, global_burst=10)
+    log = []
+    await asyncio.gather(send(scheduler, 1, INTERACTIVE, log), send(scheduler, 1, INTERACTIVE, log),
+                         send(scheduler, 2, INTERACTIVE, log))
+    await scheduler.shutdown()
+    assert [chat for chat, _, _ in log] == [1, 2, 1]
+    assert log[2][2] - log[0][2] >= 0.2 * 0.9  # the chat's second message waits for its bucket
+    assert scheduler.snapshot()["chats"] == 2
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from dracin.cache import CachedResponse, TTLCache
+from dracin.shared import SQLiteState
+
+
+@pytest.fixture
+async def pair(tmp_path):
+    path = str(tmp_path / "shared.db")
+    a, b = SQLiteState(path, "a"), SQLiteState(path, "b")
+    yield a, b
+    await a.aclose()
+    await b.aclose()
+
+
+@pytest.mark.anyio
+async def test_leases_are_exclusive_until_released(pair):
+    a, b = pair
+    assert await a.acquire("poller", 60)
+    assert not await b.acquire("poller", 60)
+    assert await a.acquire("poller", 60)  # renewing its own lease
+    a.release("poller")  # queued, but runs before b's next statement hits the file
+    assert await a.claim_once("flush", 60)  # waits for a's queue, release included
+    assert await b.acquire("poller", 60) and b.holds("poller") and not a.holds("poller")
+
+
+@pytest.mark.anyio
+async def test_claim_once_and_expired_leases(pair):
+    a, b = pair
+    assert await a.claim_once("update 1", 60)
+    assert not await b.claim_once("update 1", 60)
+    assert b.stats.duplicate_claims == 1
+    assert await a.acquire("short", -1)  # already expired
+    assert await b.acquire("short", 60)
+
+
+@pytest.mark.anyio
+async def test_urls_and_responses_cross_instances(pair):
+    a, b = pair
+    a.put_url("b1/1?lang=in", "https://cdn.example/1.mp4", time.time() + 60)
+    a.put_url("b1/2?lang=in", "https://cdn.example/2.mp4", time.time() - 1)
+    a.put_response("/k", 200, b"{}", "application/json", time.time() + 60, time.time() + 120)
+    await a.get_url("flush")  # a's queued writes are done once its read returns
+    assert (await b.get_url("b1/1?lang=in"))[0] == "https://cdn.example/1.mp4"
+    assert await b.get_url("b1/2?lang=in") is None
+    cache = TTLCache(shared=b)
+    assert (await cache.shared_fresh("/k")) == CachedResponse(200, b"{}", "application/json")
+    assert cache.lookup("/k")[1]  # adopted locally
+
+
+@pytest.mark.anyio
+async def test_lock_serializes_instances(pair):
+    a, b = pair
+    async with a.lock("resolve x"):
+        assert not await b.acquire("lock resolve x", 60)
+    assert await b.acquire("lock resolve x", 60)
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from dracin.singleflight import SingleFlight, flight_key
+
+
+def test_flight_key_canonicalizes_json_body():
+    a = flight_key("post", "/watch/player", (), b'{"b": 1, "a": 2}')
+    b = flight_key("POST", "watch/player", (), b'{"a":2,"b":1}')
+    assert a == b
+    assert a != flight_key("POST", "/watch/player", (), b'{"a":3,"b":1}')
+
+
+@pytest.mark.anyio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+    gate = asyncio.Event()
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await gate.wait()
+        return "done"
+
+    waiters = [asyncio.create_task(flight.do("k", fn)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert len(flight) == 1
+    gate.set()
+    assert await asyncio.gather(*waiters) == ["done"] * 5
+    assert calls == 1
+    assert (flight.stats.leaders, flight.stats.shared) == (1, 4)
+    assert len(flight) == 0
+
+
+@pytest.mark.anyio
+async def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise ValueError("nope")
+
+    results = await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return 1
+
+    assert await flight.do("k", ok) == 1
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+    gate = asyncio.Event()
+
+    async def fn():
+        await gate.wait()
+        return "value"
+
+    first = asyncio.create_task(flight.do("k", fn))
+    second = asyncio.create_task(flight.do("k", fn))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    gate.set()
+    assert await second == "value"
+    assert first.cancelled()
@@ -0,0 +1,154 @@
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import Application
+
+from dracin import config
+from dracin.downloads import DownloadProgress, Episode
+from dracin.fileindex import FileIndex, IndexedFile, caption_tag
+from dracin.tgbot import DramaBot, parse_chat
+
+UPDATE = {"update_id": 7, "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"},
+                                      "text": "/start"}}
+
+
+@pytest.fixture
+def bot():
+    return DramaBot("123:abc", None, None, None, None, channel="", admins=set())
+
+
+def test_parse_chat():
+    assert parse_chat(" -100123 ") == -100123
+    assert parse_chat("@drama") == "@drama"
+    assert parse_chat("") is None
+
+
+def test_webhook_updates_wait_until_started(bot):
+    assert not bot.feed(UPDATE)
+    assert bot.app.update_queue.qsize() == 0
+
+
+def test_webhook_queue_is_bounded_and_bad_updates_dropped(bot, monkeypatch):
+    monkeypatch.setattr(Application, "running", property(lambda self: True))
+    monkeypatch.setattr(config, "WEBHOOK_BACKLOG", 2)
+    assert bot.feed({"update_id": 8, "message": "not a message"})  # acknowledged, not queued
+    assert bot.feed([1, 2])
+    assert bot.app.update_queue.qsize() == 0
+    assert bot.feed(UPDATE) and bot.feed(UPDATE)
+    assert not bot.feed(UPDATE)
+    assert bot.app.update_queue.get_nowait().update_id == 7
+
+
+class FakeBot:
+    """Records Bot API calls; ``stale`` file_ids are refused like Telegram does."""
+
+    def __init__(self, channel: int):
+        self.channel = channel
+        self.calls: list[tuple] = []
+        self.uploads = 0
+        self.stale: set[str] = set()
+        self.history: dict[int, SimpleNamespace] = {}
+        self.next_message_id = 1
+
+    async def send_video(self, chat_id, video, caption=None, filename=None, **kwargs):
+        if isinstance(video, str):
+            self.calls.append(("send_video", chat_id, video))
+            if video in self.stale:
+                raise BadRequest("Wrong file identifier/http url specified")
+            return posted(chat_id, 1, caption, video)
+        self.uploads += 1
+        file_id = f"uploaded-{self.uploads}"
+        self.calls.append(("upload", chat_id, video.read()))
+        return posted(chat_id, 100 + self.uploads, caption, file_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("send_message", chat_id, text))
+        return SimpleNamespace(message_id=self.next_message_id)
+
+    async def forward_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        if message_id not in self.history:
+            raise TelegramError("Message to forward not found")
+        original = self.history[message_id]
+        return SimpleNamespace(**{**vars(original), "chat": SimpleNamespace(id=chat_id, username=None),
+                                  "message_id": 900 + message_id})
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        self.calls.append(("delete_message", chat_id, message_id))
+
+
+def posted(chat_id, message_id, caption, file_id):
+    video = SimpleNamespace(file_id=file_id, file_unique_id=f"u-{file_id}", file_size=9)
+    return SimpleNamespace(message_id=message_id, caption=caption, video=video, document=None,
+                           chat=SimpleNamespace(id=chat_id, username=None))
+
+
+class Resolver:
+    async def resolve(self, book_id, chapter_index, lang):
+        return "https://cdn.example/720p/ep.mp4"
+
+
+class Pipeline:
+    async def run(self, book_id, episodes, sink, progress=None, lang=None):
+        progress = progress or DownloadProgress(total=len(episodes))
+        for ep in episodes:
+            async def body():
+                yield b"mp4 bytes"
+            await sink(ep, body(), 0)
+            progress.episode(ep.position).status = "done"
+        return progress
+
+
+CHANNEL = -1001
+EP = Episode(0, 3, "Drama_EP01.mp4")
+
+
+@pytest.fixture
+async def indexed_bot(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DOWNLOAD_DIR", str(tmp_path / "dl"))
+    index = FileIndex(str(tmp_path / "files.db"))
+    bot = DramaBot("123:abc", None, Resolver(), Pipeline(), index, channel=str(CHANNEL), admins=set())
+    fake = FakeBot(CHANNEL)
+    monkeypatch.setattr(DramaBot, "bot", property(lambda self: fake))
+    yield bot, fake, index
+    await index.aclose()
+
+
+@pytest.mark.anyio
+async def test_index_miss_uploads_to_the_channel_then_hits(indexed_bot):
+    bot, fake, index = indexed_bot
+    await bot._deliver(5, "b1", EP, "in", "Drama - Episode 1")
+    assert fake.calls[:2] == [("upload", CHANNEL, b"mp4 bytes"), ("send_video", 5, "uploaded-1")]
+    stored = await index.get("b1", 3, "in")
+    assert (stored.file_id, stored.quality, stored.message_id) == ("uploaded-1", "720p", 101)
+    fake.calls.clear()
+    await bot._deliver(6, "b1", EP, "in", "Drama - Episode 1")
+    assert fake.calls == [("send_video", 6, "uploaded-1")]
+    assert index.misses == 1
+
+
+@pytest.mark.anyio
+async def test_stale_file_id_is_forgotten_and_uploaded_again(indexed_bot):
+    bot, fake, index = indexed_bot
+    index.put(IndexedFile("b1", 3, "in", "720p", "old-token-id", "u-old", 7, 9))
+    fake.stale.add("old-token-id")
+    await bot._deliver(5, "b1", EP, "in", "Drama - Episode 1")
+    assert [c[0] for c in fake.calls] == ["send_video", "upload", "send_video"]
+    assert fake.calls[-1] == ("send_video", 5, "uploaded-1")
+    assert (await index.get("b1", 3, "in")).file_id == "uploaded-1"
+
+
+@pytest.mark.anyio
+async def test_rebuild_index_reads_tagged_channel_posts(indexed_bot):
+    bot, fake, index = indexed_bot
+    fake.history = {
+        1: posted(CHANNEL, 1, f"Drama - Episode 1\n{caption_tag('b1', 3, 'in', '720p')}", "f1"),
+        2: posted(CHANNEL, 2, "just a chat message", "f2"),
+        4: posted(CHANNEL, 4, f"Drama - Episode 2\n{caption_tag('b1', 4, 'in', 'default')}", "f4"),
+    }  # 3 was deleted
+    fake.next_message_id = 5  # the probe
+    assert await bot.rebuild_index(77) == 2
+    assert (await index.get("b1", 3, "in")).message_id == 1
+    assert (await index.get("b1", 4, "in")).file_id == "f4" and index.entries == 2
+    deleted = [c for c in fake.calls if c[0] == "delete_message"]
+    assert deleted == [("delete_message", CHANNEL, 5)] + [("delete_message", 77, 900 + n) for n in (1, 2, 4)]
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from dracin import warmer
+from dracin.models import ChapterTable, Drama
+from dracin.shared import SharedState
+from dracin.upstream import UpstreamError
+from dracin.warmer import LEASE, CatalogWarmer
+
+
+class Catalog:
+    """Two dramas per list on page 1, nothing after; ``failing`` lists raise."""
+
+    def __init__(self, failing: set[str] = frozenset()):
+        self.failing = failing
+        self.calls: list[str] = []
+
+    async def get_json(self, path, params):
+        self.calls.append(path)
+        name, page = path.strip("/").split("/")
+        if name in self.failing:
+            raise UpstreamError(f"{path}: HTTP 502", 502)
+        if page != "1":
+            return {"data": []}
+        ids = {"rank": ("1", "2"), "foryou": ("2", "3"), "new": ("4", "5")}[name]
+        return {"data": [{"bookId": i, "bookName": f"Drama {i}"} for i in ids]}
+
+    async def chapters(self, book_id, lang):
+        self.calls.append(f"chapters {book_id}")
+        return Drama(book_id, chapters=ChapterTable.from_list([{"chapterId": str(n)} for n in range(5)]))
+
+
+class Resolver:
+    def __init__(self):
+        self.resolved: list[tuple[str, int]] = []
+
+    async def resolve(self, book_id, chapter_index, lang):
+        self.resolved.append((book_id, chapter_index))
+        return f"https://cdn.example/{book_id}/{chapter_index}.mp4"
+
+
+class Follower(SharedState):
+    """Another instance holds every lease."""
+
+    async def acquire(self, name, ttl):
+        return False
+
+
+class Unreachable(SharedState):
+    """The shared database is down."""
+
+    async def acquire(self, name, ttl):
+        raise OSError("database is locked")
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(warmer.random, "uniform", lambda lo, hi: 0.0)
+
+
+@pytest.mark.anyio
+async def test_run_once_walks_lists_then_warms_the_top_dramas():
+    catalog, resolver = Catalog(), Resolver()
+    w = CatalogWarmer(catalog, resolver, pages=2, top=3, episodes=2)
+    assert await w.run_once()
+    assert catalog.calls[:6] == ["/rank/1", "/rank/2", "/foryou/1", "/foryou/2", "/new/1", "/new/2"]
+    assert sorted(c for c in catalog.calls if c.startswith("chapters")) == ["chapters 1", "chapters 2", "chapters 3"]
+    assert sorted(resolver.resolved) == [(b, n) for b in "123" for n in (0, 1)]
+    assert (w.stats.pages, w.stats.dramas, w.stats.episodes, w.stats.aborted) == (3, 3, 6, 0)
+
+
+@pytest.mark.anyio
+async def test_upstream_errors_end_the_pass_early():
+    w = CatalogWarmer(Catalog(failing={"rank", "foryou", "new"}), Resolver(), pages=2, top=3)
+    assert not await w.run_once()
+    assert (w.stats.errors, w.stats.aborted, w.stats.dramas) == (3, 1, 0)
+
+
+def test_next_delay_doubles_per_bad_pass_up_to_8x(monkeypatch):
+    monkeypatch.setattr(warmer.random, "uniform", lambda lo, hi: hi)
+    w = CatalogWarmer(None, None, interval=100)
+    delays = []
+    for failures in range(6):
+        w.failures = failures
+        delays.append(w.next_delay())
+    assert delays == pytest.approx([120, 240, 480, 960, 960, 960])
+
+
+async def run_loop(w: CatalogWarmer, until) -> None:
+    w.start()
+    for _ in range(1000):
+        if until():
+            break
+        await asyncio.sleep(0)
+    await w.aclose()
+
+
+@pytest.mark.anyio
+async def test_only_the_lease_holder_runs_passes():
+    leader = CatalogWarmer(Catalog(), Resolver(), interval=60, pages=1, top=1, episodes=1)
+    await run_loop(leader, lambda: leader.stats.passes >= 2)
+    assert leader.stats.passes >= 2 and leader.stats.skipped == 0
+    assert not leader.shared.holds(LEASE)  # released on close
+
+    follower = CatalogWarmer(Catalog(), Resolver(), interval=60, shared=Follower())
+    await run_loop(follower, lambda: follower.stats.skipped >= 2)
+    assert follower.stats.skipped >= 2 and follower.stats.passes == 0
+
+
+@pytest.mark.anyio
+async def test_a_failing_lease_check_counts_as_not_leading():
+    w = CatalogWarmer(Catalog(), Resolver(), interval=60, shared=Unreachable())
+    await run_loop(w, lambda: w.stats.skipped >= 2)
+    assert w.stats.skipped >= 2 and w.stats.passes == 0
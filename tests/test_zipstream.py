@@ -0,0 +1,47 @@
+import io
+import struct
+import zipfile
+
+from dracin.zipstream import _MAX32, ZipStream
+
+
+def build(entries: dict[str, list[bytes]], zf: ZipStream | None = None) -> bytes:
+    zf = zf or ZipStream()
+    start = zf.offset
+    out = bytearray()
+    for name, chunks in entries.items():
+        out += zf.start(name, 1_700_000_000)
+        for chunk in chunks:
+            out += zf.feed(chunk)
+        out += zf.end()
+    out += zf.finish()
+    assert zf.offset == start + len(out)
+    return bytes(out)
+
+
+def test_archive_reads_back_with_utf8_names():
+    data = build({"EP 001 Cinta Rahasia.mp4": [b"a" * 1000, b"b" * 10], "Episode 2 — 情深.ts": [b"\x00\xff" * 50],
+                  "empty.mp4": []})
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.testzip() is None
+        assert z.namelist() == ["EP 001 Cinta Rahasia.mp4", "Episode 2 — 情深.ts", "empty.mp4"]
+        assert z.read("EP 001 Cinta Rahasia.mp4") == b"a" * 1000 + b"b" * 10
+        assert z.read("Episode 2 — 情深.ts") == b"\x00\xff" * 50
+        info = z.getinfo("Episode 2 — 情深.ts")
+        assert info.flag_bits & 0x800 and info.compress_type == zipfile.ZIP_STORED
+
+
+def test_more_than_65535_entries_use_zip64_end_records():
+    data = build({f"{i}.ts": [b"x"] for i in range(0x10000 + 1)})
+    assert struct.pack("<I", 0x06064B50) in data[-200:]
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert len(z.infolist()) == 0x10001
+        assert z.read("65536.ts") == b"x"
+
+
+def test_entry_past_4gib_gets_zip64_offset_extra():
+    zf = ZipStream()
+    zf.offset = _MAX32 + 100  # as if 4 GiB had already been sent
+    tail = build({"late.mp4": [b"data"]}, zf)
+    assert struct.pack("<HHQ", 0x0001, 8, _MAX32 + 100) in tail  # real offset in the extra field
+    assert struct.pack("<I", 0x07064B50) in tail  # ZIP64 locator, since the directory is past 4 GiB too